@@ -6,6 +6,8 @@ from alembic import context
 
 from app.core.database import Base
 from app.models.document import Document
+from app.models.revision import DocumentRevision
+from app.models.transform_job import TransformJob, TransformJobRange
 
 config = context.config
 
@@ -0,0 +1,30 @@
+"""content jsonb
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.alter_column('documents', 'content',
+        existing_type=sa.JSON(),
+        type_=postgresql.JSONB(),
+        postgresql_using='content::jsonb',
+        existing_nullable=True)
+
+def downgrade():
+    op.alter_column('documents', 'content',
+        existing_type=postgresql.JSONB(),
+        type_=sa.JSON(),
+        postgresql_using='content::json',
+        existing_nullable=True)
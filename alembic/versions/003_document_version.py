@@ -0,0 +1,48 @@
+"""document version and jsonb_set_deep
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+# jsonb_set создаёт только последний ключ пути, эта функция создаёт
+# и недостающие промежуточные объекты, как dpath.util.new
+JSONB_SET_DEEP = """
+CREATE OR REPLACE FUNCTION jsonb_set_deep(target jsonb, path text[], new_value jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql IMMUTABLE
+AS $$
+DECLARE
+    i integer;
+    node jsonb;
+BEGIN
+    IF target IS NULL OR jsonb_typeof(target) NOT IN ('object', 'array') THEN
+        target := '{}'::jsonb;
+    END IF;
+    FOR i IN 1 .. coalesce(array_length(path, 1), 0) - 1 LOOP
+        node := target #> path[1:i];
+        IF node IS NULL OR jsonb_typeof(node) NOT IN ('object', 'array') THEN
+            target := jsonb_set(target, path[1:i], '{}'::jsonb, true);
+        END IF;
+    END LOOP;
+    RETURN jsonb_set(target, path, new_value, true);
+END
+$$;
+"""
+
+def upgrade():
+    op.add_column('documents', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.execute(JSONB_SET_DEEP)
+
+def downgrade():
+    op.execute("DROP FUNCTION IF EXISTS jsonb_set_deep(jsonb, text[], jsonb)")
+    op.drop_column('documents', 'version')
@@ -0,0 +1,28 @@
+"""content fingerprint
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Текстовое представление jsonb каноническое, поэтому хэш не зависит
+    # от порядка ключей и пробелов во входном JSON
+    op.add_column('documents', sa.Column(
+        'content_hash',
+        sa.String(32),
+        sa.Computed('md5(content::text)', persisted=True),
+        nullable=True,
+    ))
+
+def downgrade():
+    op.drop_column('documents', 'content_hash')
@@ -0,0 +1,24 @@
+"""owner, id index for keyset listing
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # (owner, id) отдаёт страницу владельца уже упорядоченной по id
+    op.drop_index(op.f('ix_documents_owner'), table_name='documents')
+    op.create_index(op.f('ix_documents_owner'), 'documents', ['owner', 'id'], unique=False)
+
+def downgrade():
+    op.drop_index(op.f('ix_documents_owner'), table_name='documents')
+    op.create_index(op.f('ix_documents_owner'), 'documents', ['owner'], unique=False)
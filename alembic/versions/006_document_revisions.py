@@ -0,0 +1,41 @@
+"""document revisions
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('document_revisions',
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('snapshot', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('patch', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.CheckConstraint('(snapshot IS NULL) <> (patch IS NULL)', name='ck_document_revisions_snapshot_or_patch'),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('document_id', 'version')
+    )
+    # История уже изменённых документов начинается со снимка текущей версии.
+    # Ревизия 1 неизменённых документов запишется при их первом изменении
+    op.execute("""
+        INSERT INTO document_revisions (document_id, version, title, created_at, snapshot)
+        SELECT id, version, title, coalesce(updated_at, created_at),
+               coalesce(content, 'null'::jsonb)
+        FROM documents
+        WHERE version > 1
+    """)
+
+def downgrade():
+    op.drop_table('document_revisions')
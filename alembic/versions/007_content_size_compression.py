@@ -0,0 +1,44 @@
+"""content size and lz4 compression of large values
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+# Значения больше порога TOAST (~2 КБ) PostgreSQL сжимает и выносит
+# в отдельную TOAST-таблицу, читая их только при обращении к столбцу.
+# lz4 (PostgreSQL 14+, сборка с lz4) сжимает и распаковывает быстрее pglz.
+# Метод применяется к новым записям; на серверах без lz4 остаётся pglz
+SET_COMPRESSION = """
+DO $$
+BEGIN
+    EXECUTE 'ALTER TABLE documents ALTER COLUMN content SET COMPRESSION {method}';
+    EXECUTE 'ALTER TABLE document_revisions ALTER COLUMN snapshot SET COMPRESSION {method}';
+    EXECUTE 'ALTER TABLE document_revisions ALTER COLUMN patch SET COMPRESSION {method}';
+EXCEPTION WHEN feature_not_supported OR syntax_error THEN
+    RAISE NOTICE 'column compression {method} is not available';
+END
+$$;
+"""
+
+def upgrade():
+    op.add_column('documents', sa.Column(
+        'content_size',
+        sa.Integer(),
+        sa.Computed('octet_length(content::text)', persisted=True),
+        nullable=True,
+    ))
+    op.execute(SET_COMPRESSION.format(method='lz4'))
+
+def downgrade():
+    op.execute(SET_COMPRESSION.format(method='pglz'))
+    op.drop_column('documents', 'content_size')
@@ -0,0 +1,28 @@
+"""content gin index for search
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # jsonb_ops, а не jsonb_path_ops: кроме @> нужны ? и @? без значения.
+    # CONCURRENTLY не блокирует запись в documents, но не работает в транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_documents_content', 'documents', ['content'], unique=False,
+            postgresql_using='gin', postgresql_concurrently=True,
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_documents_content', table_name='documents', postgresql_concurrently=True)
@@ -0,0 +1,37 @@
+"""jsonb_path_probe for path write revisions
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+# Тип и длина (для списков) узлов по каждому префиксу пути, от корня:
+# по ним приложение строит JSON Patch изменения по пути, не читая content
+JSONB_PATH_PROBE = """
+CREATE OR REPLACE FUNCTION jsonb_path_probe(target jsonb, path text[])
+RETURNS jsonb
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT jsonb_agg(jsonb_build_array(
+        jsonb_typeof(node),
+        CASE WHEN jsonb_typeof(node) = 'array' THEN jsonb_array_length(node) END
+    ) ORDER BY i)
+    FROM generate_series(0, coalesce(array_length(path, 1), 0)) AS i,
+         LATERAL (SELECT target #> path[1:i] AS node) AS n
+$$;
+"""
+
+def upgrade():
+    op.execute(JSONB_PATH_PROBE)
+
+def downgrade():
+    op.execute("DROP FUNCTION IF EXISTS jsonb_path_probe(jsonb, text[])")
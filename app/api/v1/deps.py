@@ -2,17 +2,19 @@
 Зависимости для эндпоинтов.
 
 Содержит вспомогательные функции для аутентификации,
-получения документа с проверкой существования и прав доступа.
+проверки существования документа и прав доступа,
+а также разбора условных заголовков If-Match и If-None-Match.
 """
 
-from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from typing import Optional
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy.exc import DataError, DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.security import decode_token
-from app.crud.document import get_document
+from app.crud.document import get_document_meta
 from app.models.document import Document
 
-def get_current_user(token: str = Depends(decode_token)) -> str:
+async def get_current_user(token: str = Depends(decode_token)) -> str:
     """
     Получает текущего пользователя из JWT токена
 
@@ -27,31 +29,23 @@ def get_current_user(token: str = Depends(decode_token)) -> str:
     """
     return token
 
-def get_document_or_404(db: Session = Depends(get_db), doc_id: int = None) -> Document:
+async def get_admin_user(current_user: str = Depends(get_current_user)) -> str:
     """
-    Получает документ по ID
-
-    Args:
-        db: сессия БД
-        doc_id: ID документа
-
-    Returns:
-        Document: объект документа из БД
+    Пропускает только администратора
 
     Raises:
-        HTTPException 404: если документ с таким ID не найден
+        HTTPException 403: если пользователь не admin
     """
-    doc = get_document(db, doc_id)
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-    return doc
+    if current_user != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return current_user
 
 def check_owner(doc: Document, current_user: str) -> Document:
     """
     Проверяет, является ли текущий пользователь владельцем документа
 
     Args:
-        doc: объект документа
+        doc: объект документа или запись кэша - нужен только owner
         current_user: имя текущего пользователя
 
     Returns:
@@ -60,6 +54,116 @@ def check_owner(doc: Document, current_user: str) -> Document:
     Raises:
         HTTPException 403: если пользователь не владелец и не admin
     """
-    if doc.owner != current_user and current_user != "admin":
+    if not can_access(doc, current_user):
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return doc
\ No newline at end of file
+    return doc
+
+def can_access(doc: Document, current_user: str) -> bool:
+    """Проверка check_owner без исключения, для элементов пакетных запросов"""
+    return doc.owner == current_user or current_user == "admin"
+
+def owner_filter(current_user: str) -> Optional[str]:
+    """
+    Владелец, которым нужно ограничить запрос к БД
+
+    Returns:
+        Optional[str]: имя пользователя или None для администратора
+    """
+    return None if current_user == "admin" else current_user
+
+def version_etag(version: int) -> str:
+    """Строгий ETag версии документа"""
+    return f'"{version}"'
+
+def etag_matches(if_none_match: Optional[str], version: int) -> bool:
+    """
+    Совпадает ли версия документа с заголовком If-None-Match
+
+    Сравнение слабое, как требует RFC 9110: W/"3" совпадает с "3"
+
+    Args:
+        if_none_match: значение заголовка, например "3" или W/"3", "4" или *
+        version: текущая версия документа
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = version_etag(version)
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+def get_expected_versions(if_match: Optional[str] = Header(None)) -> Optional[list[int]]:
+    """
+    Разбирает заголовок If-Match
+
+    Args:
+        if_match: значение заголовка, например "3" или "3", "4"
+
+    Returns:
+        Optional[list[int]]: допустимые версии документа или None,
+        если заголовок не передан или равен *
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            # Слабые ETag не подходят для If-Match
+            continue
+        try:
+            versions.append(int(tag.strip('"')))
+        except ValueError:
+            continue
+    return versions
+
+async def check_document_access(db: AsyncSession, doc_id: int, current_user: str):
+    """
+    Проверяет существование документа и права на него без загрузки content
+
+    Запросы с фильтром по владельцу (owner_filter) не различают отсутствующий
+    и чужой документ, эта проверка выполняется только после их промаха
+
+    Returns:
+        Row с полями owner, version, title и created_at
+
+    Raises:
+        HTTPException 404: если документ не найден
+        HTTPException 403: если пользователь не владелец и не admin
+    """
+    meta = await get_document_meta(db, doc_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    check_owner(meta, current_user)
+    return meta
+
+async def raise_for_failed_write(db: AsyncSession, doc_id: int, current_user: str):
+    """
+    Определяет, почему условное изменение документа не затронуло ни одной строки
+
+    Raises:
+        HTTPException 404: если документ не найден
+        HTTPException 403: если пользователь не владелец и не admin
+        HTTPException 412: если версия документа не совпала с If-Match
+    """
+    meta = await check_document_access(db, doc_id, current_user)
+    raise HTTPException(
+        status_code=412,
+        detail="Document version mismatch",
+        headers={"ETag": version_etag(meta.version)},
+    )
+
+def is_data_error(error: DBAPIError) -> bool:
+    """
+    Ошибка в данных запроса (класс SQLSTATE 22), например неверный путь в JSONB
+
+    Адаптер asyncpg в SQLAlchemy не переводит такие ошибки в DataError,
+    поэтому класс определяется по SQLSTATE исходной ошибки
+    """
+    return isinstance(error, DataError) or str(getattr(error.orig, "sqlstate", "")).startswith("22")
\ No newline at end of file
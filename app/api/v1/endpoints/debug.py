@@ -0,0 +1,37 @@
+"""
+Просмотр профилей запросов
+
+Доступно только администратору. Профили собирает ProfilingMiddleware,
+в памяти процесса хранятся последние PROFILE_KEEP
+"""
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api.v1 import deps
+from app.core import profiling
+
+router = APIRouter()
+
+@router.get("/profiles")
+async def list_profiles(current_user: str = Depends(deps.get_admin_user)):
+    """
+    Возвращает краткие сведения о сохранённых профилях, от новых к старым
+
+    - id профиля совпадает с заголовком X-Profile-Id ответа
+    """
+    return [profile.summary() for profile in reversed(profiling.recent_profiles)]
+
+@router.get("/profiles/{profile_id}")
+async def read_profile(profile_id: str, current_user: str = Depends(deps.get_admin_user)):
+    """
+    Возвращает профиль запроса
+
+    - spans: интервалы обработчика, crud, сервисов и сериализации,
+      start_ms отсчитывается от начала запроса, depth - вложенность
+    - queries: SQL-запросы (не больше 50 самых долгих)
+    - cpu: вывод pstats, отсортированный по cumulative, если профиль CPU снимался
+    """
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.as_dict()
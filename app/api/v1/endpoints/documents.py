@@ -5,23 +5,35 @@
 сравнение двух документов, а также проверку прав доступа владельца
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Any, Union
+import asyncio
+import zlib
+from datetime import datetime, timezone
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional, Union
 
 from app import crud, schemas
 from app.api.v1 import deps
-from app.services import json_patch, json_diff
-from app.core.database import get_db
-from app.models.document import Document
+from app.services import json_patch, json_diff, json_query, ndjson
+from app.core.cache import CachedDocument, diff_cache, document_cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_db
+from app.core.events import Subscription, change_feed
+from app.core.profiling import ProfiledRoute
 from app.schemas.document import DocumentPart
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute, default_response_class=ORJSONResponse)
+
+_NOT_FOUND = object()
 
 @router.post("/", response_model=schemas.DocumentInDB)
-def create_document(
+async def create_document(
     doc: schemas.DocumentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(deps.get_current_user)
 ):
     """
@@ -31,13 +43,396 @@ def create_document(
     - **current_user**: владелец документа из JWT
     - Возвращает созданный документ
     """
-    return crud.create_document(db, doc, owner=current_user)
+    return await crud.create_document(db, doc, owner=current_user)
+
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def import_documents(
+    request: Request,
+    gzip: bool = Query(False, description="Тело сжато gzip (также по Content-Encoding: gzip)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(deps.get_current_user)
+):
+    """
+    Массово создаёт документы из NDJSON
+
+    - Тело запроса: по одному объекту DocumentCreate в строке, читается потоком
+    - Документы вставляются пачками по BULK_BATCH_SIZE, commit после каждой пачки
+    - Ошибочные строки не прерывают загрузку и перечисляются в errors
+      (не больше BULK_MAX_ERRORS). Если пачку отвергла БД (например, \\u0000
+      в строке JSONB), она вставляется половинами, и в errors попадают только
+      строки, которые не удалось вставить
+    - **current_user**: владелец всех созданных документов
+    """
+    compressed = gzip or request.headers.get("content-encoding", "").lower() == "gzip"
+    result = {"inserted": 0, "failed": 0, "errors": [], "errors_truncated": False}
+    batch = []
+
+    def record_error(line_no: int, error: str):
+        result["failed"] += 1
+        if len(result["errors"]) < settings.BULK_MAX_ERRORS:
+            result["errors"].append({"line": line_no, "error": error})
+        else:
+            result["errors_truncated"] = True
+
+    async def insert(rows: list):
+        """Вставляет строки пачкой, при ошибке БД - половинами до ошибочных строк"""
+        try:
+            await crud.create_documents(db, [doc for _, doc in rows], owner=current_user)
+            result["inserted"] += len(rows)
+        except DBAPIError as e:
+            await db.rollback()
+            if len(rows) == 1:
+                record_error(rows[0][0], f"Database error: {e.orig}")
+                return
+            middle = len(rows) // 2
+            await insert(rows[:middle])
+            await insert(rows[middle:])
+
+    async def flush():
+        await insert(batch)
+        batch.clear()
+
+    lines = ndjson.read_lines(
+        request.stream(), gzip=compressed, max_line_bytes=settings.BULK_MAX_LINE_BYTES
+    )
+    try:
+        async for line_no, line in lines:
+            if line is None:
+                record_error(line_no, "Line too long")
+                continue
+            if not line.strip():
+                continue
+            try:
+                batch.append((line_no, schemas.DocumentCreate.model_validate_json(line)))
+            except ValidationError as e:
+                record_error(line_no, "; ".join(
+                    f"{'.'.join(str(part) for part in err['loc']) or 'line'}: {err['msg']}"
+                    for err in e.errors()
+                ))
+            if len(batch) >= settings.BULK_BATCH_SIZE:
+                await flush()
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid gzip stream")
+    if batch:
+        await flush()
+    return result
+
+def list_owner(owner: Optional[str], current_user: str) -> Optional[str]:
+    """Владелец для выборки списка: чужой владелец или все - только администратору"""
+    if owner is not None and owner != current_user and current_user != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return owner if current_user == "admin" else current_user
+
+def list_fields(fields: Optional[str]) -> tuple[str, ...]:
+    if not fields:
+        return tuple(f for f in crud.LIST_FIELDS if f != "content")
+    selected = tuple(f.strip() for f in fields.split(",") if f.strip())
+    unknown = set(selected) - set(crud.LIST_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return selected
+
+def document_page(rows: list, selected: tuple[str, ...], limit: int) -> dict:
+    """Страница из limit + 1 строк: лишняя строка означает, что есть следующая"""
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    items = [
+        {f: getattr(row, f) for f in selected}
+        for row in rows[:limit]
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/", response_model=schemas.DocumentPage)
+async def list_documents(
+    cursor: Optional[int] = Query(None, description="next_cursor предыдущей страницы"),
+    limit: int = Query(50, ge=1, le=500),
+    owner: Optional[str] = Query(None, description="Владелец, фильтр доступен администратору"),
+    fields: Optional[str] = Query(
+        None, description="Поля через запятую, например id,title. По умолчанию все, кроме content"
+    ),
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(deps.get_current_user)
+):
+    """
+    Возвращает страницу документов, упорядоченных по id
+
+    - **cursor**: курсор следующей страницы, на первой странице не передаётся
+    - **limit**: размер страницы
+    - **owner**: администратор может выбрать документы любого владельца или всех,
+      остальные пользователи видят только свои документы
+    - **fields**: список полей; content выбирается только если указан явно
+    - Возвращает {"items": [...], "next_cursor": id или null}
+    """
+    owner = list_owner(owner, current_user)
+    selected = list_fields(fields)
+    rows = await crud.get_documents(db, after_id=cursor, limit=limit + 1, owner=owner, fields=selected)
+    return document_page(rows, selected, limit)
+
+@router.get("/search", response_model=schemas.DocumentPage)
+async def search_documents(
+    q: List[str] = Query(
+        ..., description="Условие по содержимому: path=value, path@>json или path?. Повторяется"
+    ),
+    cursor: Optional[int] = Query(None, description="next_cursor предыдущей страницы"),
+    limit: int = Query(50, ge=1, le=500),
+    owner: Optional[str] = Query(None, description="Владелец, фильтр доступен администратору"),
+    fields: Optional[str] = Query(
+        None, description="Поля через запятую, например id,title. По умолчанию все, кроме content"
+    ),
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(deps.get_current_user)
+):
+    """
+    Ищет документы по содержимому, возвращает страницу, упорядоченную по id
+
+    - **q**: условия, документ должен удовлетворять всем:
+      - address.city=Москва - значение по пути равно value; value разбирается
+        как JSON, иначе считается строкой (строку из цифр берут в кавычки: zip="101000")
+      - tags@>["x"] - значение по пути содержит JSON (как JSONB @>)
+      - address.zip? - путь существует
+    - Условия выполняются по индексу GIN на content, равенство по путям
+      из INDEXED_PATHS - по индексу по выражению. Ключи из цифр - индексы
+      списков (items.0.name), такие условия проверяются без индекса
+    - **cursor**, **limit**, **owner**, **fields** - как у списка документов
+    - Неразборчивое условие - 422
+    """
+    owner = list_owner(owner, current_user)
+    selected = list_fields(fields)
+    try:
+        predicates = [json_query.parse_predicate(expr) for expr in q]
+    except json_query.QueryError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    rows = await crud.get_documents(
+        db, after_id=cursor, limit=limit + 1, owner=owner, fields=selected, predicates=predicates
+    )
+    return document_page(rows, selected, limit)
+
+async def export_lines(owner: Optional[str], batch_size: int):
+    """Строки NDJSON экспорта; сессия открывается на время потока"""
+    async with AsyncSessionLocal() as db:
+        async for row in crud.stream_documents(db, owner=owner, batch_size=batch_size):
+            yield ndjson.splice_json({
+                "id": row.id,
+                "title": row.title,
+                "owner": row.owner,
+                "created_at": row.created_at,
+                "updated_at": row.updated_at,
+                "version": row.version,
+            }, "content", row.content)
+
+@router.post("/batch-get")
+async def batch_get_documents(
+    request: schemas.BatchGetRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(deps.get_current_user)
+):
+    """
+    Читает несколько документов одним запросом
+
+    - **items**: список {"id": ..., "paths": [...]}; без **paths** документ
+      возвращается целиком, с **paths** - только значения по путям
+    - Не больше BATCH_MAX_DOCUMENTS элементов и BATCH_MAX_PATHS путей в элементе
+    - Возвращает {"items": [...]} в порядке запроса, у каждого элемента свой status:
+        * 200 и document - документ целиком, как в GET /{doc_id}
+        * 200, version и paths - значения по путям; пути, которых нет
+          в документе, перечислены в missing
+        * 404 или 403 и detail - документ не найден или недоступен
+    - Все документы читаются одним запросом WHERE id = ANY(...) с условием
+      на владельца, части по путям извлекаются на стороне БД. Кэш документов
+      не используется
+    """
+    if len(request.items) > settings.BATCH_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=422, detail=f"At most {settings.BATCH_MAX_DOCUMENTS} items per request"
+        )
+    whole_ids = set()
+    paths: dict[int, dict[str, int]] = {}
+    for item in request.items:
+        if item.paths is None:
+            whole_ids.add(item.id)
+            continue
+        if len(item.paths) > settings.BATCH_MAX_PATHS:
+            raise HTTPException(
+                status_code=422, detail=f"At most {settings.BATCH_MAX_PATHS} paths per item"
+            )
+        # Пути одного документа из разных элементов извлекаются один раз
+        positions = paths.setdefault(item.id, {})
+        for path in item.paths:
+            positions.setdefault(path, len(positions))
+
+    owner = deps.owner_filter(current_user)
+    rows = await crud.get_documents_batch(
+        db, list(whole_ids), {doc_id: list(positions) for doc_id, positions in paths.items()}, owner=owner
+    )
+    missing = {item.id for item in request.items} - rows.keys()
+    # Запрос с фильтром по владельцу не отличает чужой документ от отсутствующего
+    denied = (await crud.get_documents_meta(db, list(missing))).keys() if missing and owner else set()
+
+    results = []
+    for item in request.items:
+        row = rows.get(item.id)
+        if row is None:
+            if item.id in denied:
+                results.append(item_error(item.id, 403, "Not enough permissions"))
+            else:
+                results.append(item_error(item.id, 404, "Document not found"))
+        elif item.paths is None:
+            results.append({"id": item.id, "status": 200, "document": orjson.Fragment(document_body(row))})
+        else:
+            values = {path: row.path_values[paths[item.id][path]] for path in item.paths}
+            results.append({
+                "id": item.id,
+                "status": 200,
+                "version": row.version,
+                "paths": {path: value[0] for path, value in values.items() if value is not None},
+                "missing": [path for path, value in values.items() if value is None],
+            })
+    return ORJSONResponse({"items": results})
+
+@router.get("/export")
+async def export_documents(
+    gzip: bool = Query(False, description="Сжать ответ gzip (Content-Encoding: gzip)"),
+    current_user: str = Depends(deps.get_current_user)
+):
+    """
+    Выгружает документы потоком NDJSON
+
+    - Пользователь получает свои документы, администратор - все
+    - Документы читаются из серверного курсора пачками по EXPORT_BATCH_SIZE,
+      поэтому ни приложение, ни БД не держат в памяти весь результат
+    """
+    lines = export_lines(deps.owner_filter(current_user), settings.EXPORT_BATCH_SIZE)
+    headers = {"Content-Encoding": "gzip"} if gzip else {}
+    return StreamingResponse(
+        ndjson.write_lines(lines, gzip=gzip),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
+
+async def event_lines(subscription: Subscription):
+    """Поток Server-Sent Events подписки; подписка снимается при отключении клиента"""
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=settings.CHANGE_FEED_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # Комментарий не даёт прокси закрыть простаивающее соединение
+                yield b": keepalive\n\n"
+                continue
+            yield b"event: " + event["type"].encode() + b"\ndata: " + orjson.dumps(event) + b"\n\n"
+            if subscription.closed and subscription.queue.empty():
+                return
+    finally:
+        change_feed.unsubscribe(subscription)
+
+@router.get("/events")
+async def document_events(
+    doc_id: Optional[int] = Query(None, description="Только события этого документа"),
+    owner: Optional[str] = Query(None, description="Только документы владельца, для администратора"),
+    patch: bool = Query(False, description="Передавать JSON Patch изменения в событиях"),
+    current_user: str = Depends(deps.get_current_user)
+):
+    """
+    Лента изменений документов в формате Server-Sent Events
+
+    - Пользователь получает события своих документов, администратор - всех
+      или владельца **owner**
+    - **doc_id** ограничивает ленту одним документом, на него нужны права
+    - События: created, updated (изменения по пути, JSON Patch, PUT), deleted
+      и merged (периодическое слияние). Поле data - JSON с id, owner, version,
+      title и, при **patch**=true, patch - JSON Patch от предыдущей версии.
+      Если патч больше лимита уведомления PostgreSQL, вместо него приходит
+      patch_omitted
+    - События приходят после фиксации изменения, от всех процессов сервиса
+    - Если клиент не успевает читать (очередь CHANGE_FEED_QUEUE_SIZE событий)
+      или пропало соединение с БД, приходит событие overflow или reset и поток
+      закрывается: после переподключения документы нужно перечитать
+    """
+    if current_user != "admin":
+        owner = current_user
+    if doc_id is not None:
+        # Сессия не должна оставаться открытой на всё время потока
+        async with AsyncSessionLocal() as db:
+            await deps.check_document_access(db, doc_id, current_user)
+    subscription = await change_feed.subscribe(owner=owner, doc_id=doc_id, include_patch=patch)
+    return StreamingResponse(
+        event_lines(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def document_body(row) -> bytes:
+    """Тело ответа с документом: content вставляется текстом JSON из БД"""
+    return ndjson.splice_json({
+        "id": row.id,
+        "title": row.title,
+        "owner": row.owner,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "version": row.version,
+        "content_size": row.content_size,
+    }, "content", row.content)
+
+def item_error(doc_id: int, status_code: int, detail: str) -> dict:
+    """Ошибка элемента пакетного запроса в том же виде, что и тело HTTPException"""
+    return {"id": doc_id, "status": status_code, "detail": detail}
+
+def read_headers(version: int) -> dict:
+    """Заголовки ответа с текущим документом или его частью"""
+    return {"ETag": deps.version_etag(version), "Cache-Control": settings.DOCUMENT_CACHE_CONTROL}
+
+def not_modified(version: int) -> Response:
+    return Response(status_code=304, headers=read_headers(version))
+
+async def read_revision(
+    db: AsyncSession,
+    doc_id: int,
+    current_user: str,
+    revision: Optional[int] = None,
+    as_of: Optional[datetime] = None,
+) -> schemas.DocumentInDB:
+    """Документ в состоянии ревизии revision или на момент as_of"""
+    meta = await deps.check_document_access(db, doc_id, current_user)
+
+    if revision is None:
+        if as_of.tzinfo is None:
+            as_of = as_of.replace(tzinfo=timezone.utc)
+        revision = await crud.get_revision_at(db, doc_id, as_of)
+        if revision is None and meta.version == 1 and meta.created_at <= as_of:
+            # Неизменённый документ не имеет сохранённых ревизий
+            revision = 1
+    if revision is None or revision > meta.version:
+        raise HTTPException(status_code=404, detail="Revision not found")
+
+    if revision == meta.version:
+        db_doc = await crud.get_document(db, doc_id)
+        if db_doc is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        return schemas.DocumentInDB.model_validate(db_doc)
+
+    data = await crud.get_document_revision(db, doc_id, revision)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return schemas.DocumentInDB(
+        id=doc_id,
+        owner=meta.owner,
+        title=data["title"],
+        content=data["content"],
+        created_at=meta.created_at,
+        updated_at=data["created_at"],
+        version=revision,
+    )
 
 @router.get("/{doc_id}", response_model=Union[schemas.DocumentInDB, DocumentPart])
-def read_document(
+async def read_document(
     doc_id: int,
     path: str = Query(None, description="Путь к части документа, например keyA.keyB"),
-    db: Session = Depends(get_db),
+    revision: Optional[int] = Query(None, ge=1, description="Номер ревизии (версии) документа"),
+    as_of: Optional[datetime] = Query(None, description="Состояние документа на момент времени, ISO 8601"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(deps.get_current_user)
 ):
     """
@@ -50,22 +445,105 @@ def read_document(
     - Если **path** не указан, возвращает полный документ
     - Требуется, чтобы текущий пользователь был владельцем документа или администратором.
     - В случае отсутствия документа или пути возвращает 404
+    - Документ читается через кэш Redis, если он настроен. Часть документа
+      всегда извлекается на стороне БД оператором #>, без загрузки всего content;
+      индексы списков понимаются так же, как в PostgreSQL (items.-1 - последний
+      элемент), а значение null по существующему пути возвращается, а не 404
+    - Полный документ отдаётся без разбора и проверки модели: content вставляется
+      в ответ текстом JSON из БД, а в кэше хранится готовое тело ответа
+    - Запрос в БД сразу содержит условие на владельца, поэтому чужой документ
+      не загружается
+    - **revision** или **as_of** возвращают документ в состоянии прошлой ревизии:
+      он восстанавливается из ближайшего снимка и не более
+      REVISION_SNAPSHOT_EVERY - 1 патчей. Если ревизия не сохранена, возвращает 404
+    - Текущий документ и его части отдаются с ETag версии документа
+      и Cache-Control (DOCUMENT_CACHE_CONTROL). Если **If-None-Match** совпадает
+      с версией, возвращает 304 без тела: версия берётся из заголовка записи кэша
+      или из БД без чтения content, для части документа - из того же запроса
     """
-    doc = deps.get_document_or_404(db, doc_id)
-    deps.check_owner(doc, current_user)
+    if revision is not None or as_of is not None:
+        doc = await read_revision(db, doc_id, current_user, revision=revision, as_of=as_of)
+        if not path:
+            return doc
+        value = json_patch.get_value_by_path(doc.content, path, _NOT_FOUND)
+        if value is _NOT_FOUND:
+            raise HTTPException(status_code=404, detail="Path not found")
+        return {"content": value}
 
     if path:
-        value = json_patch.get_value_by_path(doc.content, path)
-        if value is None:
+        row = await crud.get_document_path(
+            db, doc_id, json_patch.split_path(path), owner=deps.owner_filter(current_user)
+        )
+        if row is None:
+            await deps.check_document_access(db, doc_id, current_user)
+            raise HTTPException(status_code=404, detail="Document not found")
+        if deps.etag_matches(if_none_match, row.version):
+            return not_modified(row.version)
+        if not row.found:
             raise HTTPException(status_code=404, detail="Path not found")
-        return {"content": value}
-    return doc
+        return ORJSONResponse({"content": row.value}, headers=read_headers(row.version))
+
+    cached = await document_cache.get(doc_id) if if_none_match is not None else None
+    if cached is not None:
+        deps.check_owner(cached, current_user)
+        if deps.etag_matches(if_none_match, cached.version):
+            return not_modified(cached.version)
+    elif if_none_match is not None:
+        meta = await deps.check_document_access(db, doc_id, current_user)
+        if deps.etag_matches(if_none_match, meta.version):
+            return not_modified(meta.version)
+
+    async def load():
+        row = await crud.get_document_json(db, doc_id, owner=deps.owner_filter(current_user))
+        if row is None:
+            return None
+        return CachedDocument(row.owner, row.version, document_body(row))
+
+    if cached is None:
+        cached = await document_cache.get_or_load(doc_id, load)
+    if cached is None:
+        await deps.check_document_access(db, doc_id, current_user)
+        raise HTTPException(status_code=404, detail="Document not found")
+    deps.check_owner(cached, current_user)
+    return Response(cached.body, media_type="application/json", headers=read_headers(cached.version))
+
+@router.get("/{doc_id}/revisions", response_model=schemas.RevisionPage)
+async def list_revisions(
+    doc_id: int,
+    cursor: Optional[int] = Query(None, description="next_cursor предыдущей страницы"),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(deps.get_current_user)
+):
+    """
+    Возвращает страницу ревизий документа, от новых к старым
+
+    - **doc_id**: идентификатор документа
+    - **cursor**: курсор следующей страницы, на первой странице не передаётся
+    - Для каждой ревизии: номер, заголовок, время, хранится ли она снимком
+      и сколько байт занимает
+    - Документ, который ещё не менялся, имеет одну ревизию - текущую версию
+    - Требуется владелец или администратор
+    """
+    meta = await deps.check_document_access(db, doc_id, current_user)
+
+    if meta.version == 1:
+        items = [] if cursor is not None else [
+            {"version": 1, "title": meta.title, "created_at": meta.created_at, "snapshot": True}
+        ]
+        return {"items": items, "next_cursor": None}
+
+    rows = await crud.get_revisions(db, doc_id, before=cursor, limit=limit + 1)
+    next_cursor = rows[limit - 1].version if len(rows) > limit else None
+    return {"items": [dict(row._mapping) for row in rows[:limit]], "next_cursor": next_cursor}
 
 @router.put("/{doc_id}", response_model=schemas.DocumentInDB)
-def update_document(
+async def update_document(
     doc_id: int,
     doc_update: schemas.DocumentUpdate,
-    db: Session = Depends(get_db),
+    response: Response,
+    expected_versions: Optional[List[int]] = Depends(deps.get_expected_versions),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(deps.get_current_user)
 ):
     """
@@ -75,17 +553,70 @@ def update_document(
     - **doc_update**: новые поля
     - Возвращает обновлённый документ
     - Требуется владелец или администратор
+    - При заголовке If-Match с устаревшей версией возвращает 412
     """
-    doc = deps.get_document_or_404(db, doc_id)
-    deps.check_owner(doc, current_user)
-    updated = crud.update_document(db, doc_id, doc_update)
+    updated = await crud.update_document(
+        db, doc_id, doc_update,
+        owner=deps.owner_filter(current_user),
+        expected_versions=expected_versions,
+    )
+    if updated is None:
+        await deps.raise_for_failed_write(db, doc_id, current_user)
+    await document_cache.invalidate(doc_id)
+    response.headers["ETag"] = deps.version_etag(updated.version)
     return updated
 
+@router.patch("/{doc_id}", response_model=schemas.DocumentInDB)
+async def patch_document(
+    doc_id: int,
+    operations: List[schemas.JsonPatchOperation],
+    response: Response,
+    expected_versions: Optional[List[int]] = Depends(deps.get_expected_versions),
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(deps.get_current_user)
+):
+    """
+    Применяет к документу JSON Patch (RFC 6902)
+
+    - **doc_id**: идентификатор документа
+    - **operations**: массив операций add/remove/replace/move/copy/test
+      (Content-Type: application/json-patch+json)
+    - Операции применяются по порядку за один проход по content и один commit:
+      либо все, либо ни одной
+    - Если операция неприменима или test не прошёл, возвращает 409
+    - При заголовке If-Match с устаревшей версией возвращает 412
+    - Возвращает обновлённый документ
+    - Требуется владелец или администратор
+    """
+    patch = [operation.as_dict() for operation in operations]
+
+    def apply(content):
+        new_content = json_patch.apply_patch(content, patch)
+        if not isinstance(new_content, dict):
+            raise json_patch.PatchError("Document content must be an object")
+        return new_content
+
+    try:
+        doc = await crud.update_document_content(
+            db, doc_id, apply,
+            owner=deps.owner_filter(current_user),
+            expected_versions=expected_versions,
+        )
+    except json_patch.PatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if doc is None:
+        await deps.raise_for_failed_write(db, doc_id, current_user)
+    await document_cache.invalidate(doc_id)
+    response.headers["ETag"] = deps.version_etag(doc.version)
+    return doc
+
 @router.patch("/{doc_id}/path", response_model=schemas.DocumentInDB)
-def update_document_path(
+async def update_document_path(
     doc_id: int,
     operation: schemas.PathOperation,
-    db: Session = Depends(get_db),
+    response: Response,
+    expected_versions: Optional[List[int]] = Depends(deps.get_expected_versions),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(deps.get_current_user)
 ):
     """
@@ -96,22 +627,32 @@ def update_document_path(
     - Путь может вести к существующему или новому ключу
     - Возвращает обновлённый документ
     - Требуется владелец или администратор
+    - Изменение выполняется одним запросом в БД, при заголовке If-Match
+      с устаревшей версией возвращает 412
     """
-    doc = deps.get_document_or_404(db, doc_id)
-    deps.check_owner(doc, current_user)
-
-    new_content = doc.content.copy()
-    json_patch.set_value_by_path(new_content, operation.path, operation.value)
-
-    crud.update_document(db, doc_id, schemas.DocumentUpdate(content=new_content))
-    doc.content = new_content
+    try:
+        doc = await crud.set_document_path(
+            db, doc_id, json_patch.split_path(operation.path), operation.value,
+            owner=deps.owner_filter(current_user),
+            expected_versions=expected_versions,
+        )
+    except DBAPIError as e:
+        if not deps.is_data_error(e):
+            raise
+        raise HTTPException(status_code=422, detail="Invalid path")
+    if doc is None:
+        await deps.raise_for_failed_write(db, doc_id, current_user)
+    await document_cache.invalidate(doc_id)
+    response.headers["ETag"] = deps.version_etag(doc.version)
     return doc
 
 @router.delete("/{doc_id}/path")
-def delete_document_path(
+async def delete_document_path(
     doc_id: int,
+    response: Response,
     path: str = Query(..., description="Путь для удаления"),
-    db: Session = Depends(get_db),
+    expected_versions: Optional[List[int]] = Depends(deps.get_expected_versions),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(deps.get_current_user)
 ):
     """
@@ -123,19 +664,28 @@ def delete_document_path(
     - Возвращает статус {"status": "ok"}
     - Требуется владелец или администратор
     - Если путь не найден, операция всё равно считается успешной, но при этом ничего не удаляется
+    - При заголовке If-Match с устаревшей версией возвращает 412
     """
-    doc = deps.get_document_or_404(db, doc_id)
-    deps.check_owner(doc, current_user)
-
-    new_content = doc.content.copy()
-    json_patch.delete_value_by_path(new_content, path)
-    crud.update_document(db, doc_id, schemas.DocumentUpdate(content=new_content))
+    try:
+        version = await crud.delete_document_path(
+            db, doc_id, json_patch.split_path(path),
+            owner=deps.owner_filter(current_user),
+            expected_versions=expected_versions,
+        )
+    except DBAPIError as e:
+        if not deps.is_data_error(e):
+            raise
+        raise HTTPException(status_code=422, detail="Invalid path")
+    if version is None:
+        await deps.raise_for_failed_write(db, doc_id, current_user)
+    await document_cache.invalidate(doc_id)
+    response.headers["ETag"] = deps.version_etag(version)
     return {"status": "ok"}
 
 @router.delete("/{doc_id}")
-def delete_document(
+async def delete_document(
     doc_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(deps.get_current_user)
 ):
     """
@@ -145,16 +695,61 @@ def delete_document(
     - Возвращает статус {"status": "deleted"}
     - Требуется владелец или администратор
     """
-    doc = deps.get_document_or_404(db, doc_id)
-    deps.check_owner(doc, current_user)
-    crud.delete_document(db, doc_id)
+    deleted = await crud.delete_document(db, doc_id, owner=deps.owner_filter(current_user))
+    if not deleted:
+        await deps.check_document_access(db, doc_id, current_user)
+        raise HTTPException(status_code=404, detail="Document not found")
+    await document_cache.invalidate(doc_id)
     return {"status": "deleted"}
 
+async def compute_diffs(db: AsyncSession, base, others: list, format: str) -> dict:
+    """
+    Различия документа base с каждым из others
+
+    Документы с тем же отпечатком содержимого не загружаются, результаты
+    берутся из кэша сравнений по отпечаткам, content для промахов кэша
+    читается одним запросом
+
+    Args:
+        base, others: строки get_documents_meta
+        format: paths или patch
+
+    Returns:
+        dict: id документа -> различия; документов, удалённых после
+        чтения отпечатков, в словаре нет
+    """
+    diffs = {}
+    misses = {}
+    for other in others:
+        if other.content_hash == base.content_hash:
+            diffs[other.id] = [] if format == "patch" else {"added": {}, "removed": {}, "changed": {}}
+            continue
+        diff = await diff_cache.get((base.id, base.content_hash, other.id, other.content_hash, format))
+        if diff is None:
+            misses[other.id] = other
+        else:
+            diffs[other.id] = diff
+
+    if misses:
+        contents = await crud.get_documents_content(db, [base.id, *misses])
+        if base.id not in contents:
+            raise HTTPException(status_code=404, detail="Document not found")
+        for other in misses.values():
+            if other.id not in contents:
+                continue
+            diff = json_diff.deep_diff(contents[base.id], contents[other.id], format=format)
+            await diff_cache.set((base.id, base.content_hash, other.id, other.content_hash, format), diff)
+            diffs[other.id] = diff
+    return diffs
+
 @router.get("/compare/{id1}/{id2}")
-def compare_documents(
+async def compare_documents(
     id1: int,
     id2: int,
-    db: Session = Depends(get_db),
+    format: Literal["paths", "patch"] = Query(
+        "paths", description="paths - added/removed/changed, patch - операции JSON Patch (RFC 6902)"
+    ),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(deps.get_current_user)
 ):
     """
@@ -166,13 +761,62 @@ def compare_documents(
         * added: словарь новых ключей
         * removed: словарь удалённых ключей
         * changed: словарь изменённых ключей
+    - При **format**=patch возвращает список операций JSON Patch,
+      переводящих первый документ во второй
+    - Списки сравниваются поэлементно, путь элемента содержит его индекс
     - Для доступа к обоим документам пользователь должен быть их владельцем или администратором
+    - Документы с одинаковым отпечатком содержимого не загружаются, результаты
+      сравнения кэшируются по отпечаткам обоих документов
     """
-    doc1 = deps.get_document_or_404(db, id1)
-    doc2 = deps.get_document_or_404(db, id2)
+    metas = await crud.get_documents_meta(db, [id1, id2])
+    for doc_id in (id1, id2):
+        if doc_id not in metas:
+            raise HTTPException(status_code=404, detail="Document not found")
+        deps.check_owner(metas[doc_id], current_user)
 
-    deps.check_owner(doc1, current_user)
-    deps.check_owner(doc2, current_user)
+    diffs = await compute_diffs(db, metas[id1], [metas[id2]], format)
+    if id2 not in diffs:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return diffs[id2]
+
+@router.get("/compare/{base_id}")
+async def compare_with_many(
+    base_id: int,
+    others: List[int] = Query(..., alias="with", description="Документы для сравнения с base_id, повторяется"),
+    format: Literal["paths", "patch"] = Query(
+        "paths", description="paths - added/removed/changed, patch - операции JSON Patch (RFC 6902)"
+    ),
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(deps.get_current_user)
+):
+    """
+    Сравнивает документ base_id с несколькими документами за один вызов
+
+    - **with**: идентификаторы документов, не больше BATCH_MAX_DOCUMENTS
+    - Возвращает {"base": base_id, "items": [...]} в порядке **with**:
+      200 и diff - различия от base_id к документу в формате **format**,
+      как у сравнения двух документов; 404 или 403 и detail
+    - Если базовый документ не найден или недоступен, возвращает 404 или 403
+    - Отпечатки всех документов читаются одним запросом, content - ещё одним
+      и только для пар, которых нет в кэше сравнений
+    """
+    if len(others) > settings.BATCH_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=422, detail=f"At most {settings.BATCH_MAX_DOCUMENTS} documents per request"
+        )
+    metas = await crud.get_documents_meta(db, [base_id, *others])
+    if base_id not in metas:
+        raise HTTPException(status_code=404, detail="Document not found")
+    base = deps.check_owner(metas[base_id], current_user)
 
-    diff = json_diff.deep_diff(doc1.content, doc2.content)
-    return diff
\ No newline at end of file
+    allowed = [metas[doc_id] for doc_id in others if doc_id in metas and deps.can_access(metas[doc_id], current_user)]
+    diffs = await compute_diffs(db, base, allowed, format)
+    items = []
+    for doc_id in others:
+        if doc_id in diffs:
+            items.append({"id": doc_id, "status": 200, "diff": diffs[doc_id]})
+        elif doc_id in metas and not deps.can_access(metas[doc_id], current_user):
+            items.append(item_error(doc_id, 403, "Not enough permissions"))
+        else:
+            items.append(item_error(doc_id, 404, "Document not found"))
+    return {"base": base_id, "items": items}
\ No newline at end of file
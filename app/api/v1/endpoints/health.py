@@ -1,25 +1,119 @@
-from fastapi import APIRouter
-import psutil
+"""
+Проверки состояния сервиса
+
+live отвечает без обращения к БД и Redis. ready проверяет их доступность
+лёгкими запросами. Общая проверка возвращает приблизительное число
+документов из статистики планировщика (pg_class.reltuples), которое
+обновляется в фоне, а не считается при каждом запросе
+"""
+
+import asyncio
+import logging
 import os
-from app.core.database import SessionLocal
+from datetime import datetime, timezone
+from typing import Optional
+
+import psutil
+from fastapi import APIRouter, Response
+from sqlalchemy import func, select, text
+from app.core.cache import diff_cache, document_cache, redis_client
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.events import change_feed
+from app.core.security import token_cache
 from app.models.document import Document
+from app.services.periodic_task import periodic_stats
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.get("/")
-def health_check():
-    """Healthcheck. Вовзвращает кол-во документов, плюс оперативную память процесса приложения"""
-    db = SessionLocal()
-    try:
-        doc_count = db.query(Document).count()
-    finally:
-        db.close()
+document_count = {"value": None, "updated_at": None}
+count_refresher: Optional[asyncio.Task] = None
+
+async def refresh_document_count() -> None:
+    """Обновляет приблизительное число документов"""
+    async with AsyncSessionLocal() as db:
+        value = await db.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'documents'::regclass")
+        )
+        if value is None or value < 0:
+            # Таблица ещё ни разу не анализировалась - обычно она почти пуста
+            value = await db.scalar(select(func.count()).select_from(Document))
+    document_count["value"] = value
+    document_count["updated_at"] = datetime.now(timezone.utc).isoformat()
+
+async def refresh_document_count_loop() -> None:
+    while True:
+        try:
+            await refresh_document_count()
+        except Exception as e:
+            logger.warning("Document count refresh failed: %s", e)
+        await asyncio.sleep(settings.HEALTH_COUNT_REFRESH_SECONDS)
 
+def start_count_refresher() -> None:
+    global count_refresher
+    count_refresher = asyncio.create_task(refresh_document_count_loop())
+
+async def stop_count_refresher() -> None:
+    global count_refresher
+    if count_refresher is not None:
+        count_refresher.cancel()
+        try:
+            await count_refresher
+        except asyncio.CancelledError:
+            pass
+        count_refresher = None
+
+async def ping_database() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("SELECT 1"))
+
+@router.get("/")
+async def health_check():
+    """Healthcheck. Вовзвращает приблизительное кол-во документов, плюс оперативную память процесса приложения, счётчики кэша и периодической задачи"""
     process = psutil.Process(os.getpid())
     mem = process.memory_info().rss / 1024 / 1024
 
     return {
         "status": "ok",
-        "documents_count": doc_count,
-        "memory_mb": round(mem, 2)
-    }
\ No newline at end of file
+        "documents_count": document_count["value"],
+        "documents_count_updated_at": document_count["updated_at"],
+        "memory_mb": round(mem, 2),
+        "cache": document_cache.stats(),
+        "diff_cache": diff_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "change_feed": change_feed.stats(),
+        "periodic": periodic_stats
+    }
+
+@router.get("/live")
+async def liveness():
+    """Liveness. Процесс отвечает на запросы, внешние зависимости не проверяются"""
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def readiness(response: Response):
+    """
+    Readiness. Проверяет БД (SELECT 1) и Redis (PING), если он настроен
+
+    Каждая проверка ограничена HEALTH_CHECK_TIMEOUT секундами.
+    При недоступности любой зависимости возвращает 503
+    """
+    checks = {"database": ping_database()}
+    if redis_client is not None:
+        checks["redis"] = redis_client.ping()
+
+    results = {}
+    for name, check in checks.items():
+        try:
+            await asyncio.wait_for(check, settings.HEALTH_CHECK_TIMEOUT)
+            results[name] = "ok"
+        except Exception as e:
+            logger.warning("Readiness check %s failed: %s", name, e)
+            results[name] = "unavailable"
+
+    ready = all(result == "ok" for result in results.values())
+    if not ready:
+        response.status_code = 503
+    return {"status": "ok" if ready else "unavailable", "checks": results}
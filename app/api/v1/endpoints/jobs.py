@@ -0,0 +1,43 @@
+"""
+Прогресс заданий массового преобразования документов
+
+Доступно только администратору. Задания создаются и запускаются
+командой python -m app.services.transform_jobs, здесь - только чтение
+"""
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.api.v1 import deps
+from app.core.database import get_db
+
+router = APIRouter()
+
+@router.get("/")
+async def list_jobs(
+    limit: int = 50,
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(deps.get_admin_user),
+):
+    """Возвращает прогресс последних заданий, от новых к старым"""
+    return await crud.get_jobs_progress(db, limit)
+
+@router.get("/{job_id}")
+async def read_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(deps.get_admin_user),
+):
+    """
+    Возвращает прогресс задания
+
+    - processed / total: обработано документов из числа при создании задания
+    - changed: документов, content которых изменился
+    - docs_per_sec: скорость последнего запуска
+    - eta_seconds: оценка оставшегося времени, пока задание выполняется
+    """
+    progress = await crud.get_job_progress(db, job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return progress
@@ -1,12 +1,381 @@
-"""Клиент Redis"""
+"""Клиент Redis, кэш документов и кэш результатов сравнения"""
+
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, NamedTuple, Optional, Union
 
 import redis.asyncio as redis
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 redis_client = None
 
 if settings.REDIS_URL:
     redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
 
 async def get_redis():
-    return redis_client
\ No newline at end of file
+    return redis_client
+
+class CachedDocument(NamedTuple):
+    """Готовое тело ответа с документом, владелец и версия документа"""
+    owner: str
+    version: int
+    body: Union[bytes, str]
+
+class CacheLookup(NamedTuple):
+    """Результат одного MGET кэша документов"""
+    epoch: int
+    generation: Optional[str]
+    doc: Optional[CachedDocument]
+    uncacheable: bool
+    locked: bool
+
+class DocumentCache:
+    """
+    Read-through кэш документов поверх Redis
+
+    Запись хранится под ключом doc:{id}: строка JSON с номером эпохи (doc:epoch),
+    поколением документа (doc:{id}:gen), владельцем и версией, затем через перевод
+    строки - готовое тело ответа. При попадании тело отдаётся без разбора,
+    разбирается только короткий заголовок.
+    Точечные изменения увеличивают поколение документа и удаляют запись, массовые
+    (периодическая задача) увеличивают эпоху, что разом делает недействительными
+    все записи. Эпоха и поколение читаются до загрузки из БД, поэтому запись,
+    сохранённая после изменения по устаревшему чтению, при следующем обращении
+    считается промахом.
+    Документ больше max_payload_bytes не кэшируется: вместо него на короткое время
+    сохраняется заголовок-отметка, и следующие чтения идут в БД без блокировки.
+    Если клиент Redis не задан, кэш прозрачно пропускает все обращения в БД.
+    """
+
+    EPOCH_KEY = "doc:epoch"
+    LOCK_POLL_SECONDS = 0.025
+    UNCACHEABLE_TTL_SECONDS = 60
+
+    def __init__(
+        self,
+        client,
+        ttl: int = 300,
+        max_payload_bytes: int = 1024 * 1024,
+        lock_timeout_ms: int = 5000,
+        lock_wait_ms: int = 200,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.max_payload_bytes = max_payload_bytes
+        self.lock_timeout_ms = lock_timeout_ms
+        self.lock_wait_ms = lock_wait_ms
+        self.hits = 0
+        self.misses = 0
+        self.oversized = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(doc_id: int) -> str:
+        return f"doc:{doc_id}"
+
+    @staticmethod
+    def _lock_key(doc_id: int) -> str:
+        return f"doc:{doc_id}:lock"
+
+    @staticmethod
+    def _generation_key(doc_id: int) -> str:
+        return f"doc:{doc_id}:gen"
+
+    async def _lookup(self, doc_id: int) -> CacheLookup:
+        """Читает эпоху, поколение, запись и блокировку документа одним запросом MGET"""
+        epoch, generation, raw, lock = await self.client.mget(
+            self.EPOCH_KEY, self._generation_key(doc_id), self._key(doc_id), self._lock_key(doc_id)
+        )
+        epoch = int(epoch or 0)
+        result = CacheLookup(epoch, generation, None, False, lock is not None)
+        if raw is None:
+            return result
+        header, _, body = raw.partition("\n")
+        entry = json.loads(header)
+        # Запись, сохранённая до изменения документа или до смены эпохи, - промах
+        if entry.get("epoch") != epoch or entry.get("gen") != generation:
+            return result
+        if entry.get("uncacheable"):
+            return result._replace(uncacheable=True)
+        # Записи прежних форматов (без владельца или версии) считаются промахом
+        if "version" not in entry or not body:
+            return result
+        return result._replace(doc=CachedDocument(entry["owner"], entry["version"], body))
+
+    async def get(self, doc_id: int) -> Optional[CachedDocument]:
+        """Возвращает документ из кэша без обращения к БД"""
+        if self.client is None:
+            return None
+        try:
+            doc = (await self._lookup(doc_id)).doc
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Document cache lookup failed: %s", e)
+            return None
+        if doc is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return doc
+
+    async def get_or_load(
+        self,
+        doc_id: int,
+        loader: Callable[[], Awaitable[Optional[CachedDocument]]],
+    ) -> Optional[CachedDocument]:
+        """
+        Возвращает документ из кэша или загружает его через loader
+
+        При промахе ключ блокируется (SET NX), чтобы на горячий документ в БД
+        шёл только один запрос. Остальные ждут появления записи, пока блокировка
+        не снята, но не дольше lock_wait_ms, после чего читают БД сами. Если
+        документ отмечен как слишком большой, БД читается сразу, без блокировки.
+
+        Args:
+            doc_id: идентификатор документа
+            loader: корутина, возвращающая CachedDocument или None
+
+        Returns:
+            Optional[CachedDocument]: владелец, версия и тело ответа или None, если не найден
+        """
+        if self.client is None:
+            return await loader()
+
+        try:
+            lookup = await self._lookup(doc_id)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Document cache lookup failed: %s", e)
+            return await loader()
+
+        if lookup.doc is not None:
+            self.hits += 1
+            return lookup.doc
+        self.misses += 1
+        if lookup.uncacheable:
+            return await loader()
+
+        locked = False
+        try:
+            locked = bool(await self.client.set(
+                self._lock_key(doc_id), "1", nx=True, px=self.lock_timeout_ms
+            ))
+            if not locked:
+                waited = 0.0
+                while waited * 1000 < self.lock_wait_ms:
+                    await asyncio.sleep(self.LOCK_POLL_SECONDS)
+                    waited += self.LOCK_POLL_SECONDS
+                    current = await self._lookup(doc_id)
+                    if current.doc is not None:
+                        return current.doc
+                    # Блокировка снята без записи: документа нет, он слишком велик
+                    # или его читал не владелец - ждать больше нечего
+                    if current.uncacheable or not current.locked:
+                        break
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Document cache lock failed: %s", e)
+
+        try:
+            doc = await loader()
+            if doc is not None:
+                await self._store(doc_id, doc, lookup)
+            return doc
+        finally:
+            if locked:
+                try:
+                    await self.client.delete(self._lock_key(doc_id))
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning("Document cache unlock failed: %s", e)
+
+    async def _store(self, doc_id: int, doc: CachedDocument, lookup: CacheLookup) -> None:
+        """
+        Сохраняет запись с эпохой и поколением, прочитанными до загрузки документа
+
+        В той же транзакции срок жизни поколения продлевается до полного ttl,
+        и оно истекает не раньше записи. Иначе запись, сохранённая по чтению
+        до первого изменения (без поколения), снова совпала бы с ним, когда
+        ключ поколения истечёт
+        """
+        header = {"epoch": lookup.epoch, "gen": lookup.generation, "owner": doc.owner, "version": doc.version}
+        ttl = self.ttl
+        body = doc.body
+        # Строка не длиннее своего UTF-8, поэтому большое тело отсекается до кодирования
+        if isinstance(body, str) and len(body) <= self.max_payload_bytes:
+            body = body.encode()
+        if len(body) > self.max_payload_bytes:
+            self.oversized += 1
+            header["uncacheable"] = True
+            body = b""
+            ttl = min(ttl, self.UNCACHEABLE_TTL_SECONDS)
+        raw = json.dumps(header, ensure_ascii=False).encode() + b"\n" + body
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.set(self._key(doc_id), raw, ex=ttl)
+                pipe.expire(self._generation_key(doc_id), self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Document cache store failed: %s", e)
+
+    async def invalidate(self, doc_id: int) -> None:
+        """
+        Делает недействительной запись документа после его изменения или удаления
+
+        Поколение увеличивается вместе с удалением записи, поэтому запись,
+        которую параллельное чтение сохранит по данным до изменения, не будет
+        отдана. Ключ поколения живёт ttl и продлевается при каждом сохранении
+        записи (_store), поэтому не истекает раньше записей документа.
+        """
+        if self.client is None:
+            return
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.incr(self._generation_key(doc_id))
+                pipe.expire(self._generation_key(doc_id), self.ttl)
+                pipe.delete(self._key(doc_id))
+                await pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Document cache invalidate failed: %s", e)
+
+    async def invalidate_all(self) -> None:
+        """Делает недействительными все записи, увеличивая эпоху"""
+        if self.client is None:
+            return
+        try:
+            await self.client.incr(self.EPOCH_KEY)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Document cache epoch bump failed: %s", e)
+
+    def stats(self) -> dict[str, Any]:
+        """Счётчики попаданий и промахов процесса"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.client is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "oversized": self.oversized,
+            "errors": self.errors,
+        }
+
+class DiffCache:
+    """
+    Кэш результатов сравнения документов
+
+    Ключ содержит отпечатки содержимого обоих документов, поэтому записи
+    не нужно инвалидировать: после изменения документа меняется ключ.
+    Записи хранятся сериализованными в LRU памяти процесса, ограниченном
+    числом записей и суммарным размером, и, если задан клиент, в Redis
+    """
+
+    def __init__(
+        self,
+        client,
+        max_entries: int = 1024,
+        ttl: int = 3600,
+        max_payload_bytes: int = 1024 * 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.client = client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_payload_bytes = max_payload_bytes
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.bytes = 0
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.oversized = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(key: tuple) -> str:
+        return "diff:" + ":".join(str(part) for part in key)
+
+    def _remember(self, key: tuple, raw: bytes) -> None:
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= len(previous)
+        self.entries[key] = raw
+        self.bytes += len(raw)
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    async def get(self, key: tuple) -> Optional[Any]:
+        """Возвращает результат сравнения или None"""
+        raw = self.entries.get(key)
+        if raw is not None:
+            self.entries.move_to_end(key)
+            self.memory_hits += 1
+            return json.loads(raw)
+        if self.client is not None:
+            try:
+                raw = await self.client.get(self._key(key))
+            except Exception as e:
+                self.errors += 1
+                logger.warning("Diff cache lookup failed: %s", e)
+                raw = None
+            if raw is not None:
+                raw = raw.encode()
+                self._remember(key, raw)
+                self.redis_hits += 1
+                return json.loads(raw)
+        self.misses += 1
+        return None
+
+    async def set(self, key: tuple, value: Any) -> None:
+        raw = json.dumps(value, ensure_ascii=False).encode()
+        if len(raw) > self.max_payload_bytes:
+            self.oversized += 1
+            return
+        self._remember(key, raw)
+        if self.client is None:
+            return
+        try:
+            await self.client.set(self._key(key), raw, ex=self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Diff cache store failed: %s", e)
+
+    def stats(self) -> dict[str, Any]:
+        """Счётчики попаданий и промахов процесса"""
+        hits = self.memory_hits + self.redis_hits
+        lookups = hits + self.misses
+        return {
+            "redis": self.client is not None,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "oversized": self.oversized,
+            "errors": self.errors,
+        }
+
+document_cache = DocumentCache(
+    redis_client,
+    ttl=settings.CACHE_TTL_SECONDS,
+    max_payload_bytes=settings.CACHE_MAX_PAYLOAD_BYTES,
+    lock_timeout_ms=settings.CACHE_LOCK_TIMEOUT_MS,
+    lock_wait_ms=settings.CACHE_LOCK_WAIT_MS,
+)
+
+
+diff_cache = DiffCache(
+    redis_client if settings.DIFF_CACHE_REDIS else None,
+    max_entries=settings.DIFF_CACHE_SIZE,
+    ttl=settings.DIFF_CACHE_TTL_SECONDS,
+    max_payload_bytes=settings.CACHE_MAX_PAYLOAD_BYTES,
+    max_bytes=settings.DIFF_CACHE_MAX_BYTES,
+)
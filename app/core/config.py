@@ -6,11 +6,51 @@ from typing import Optional
 class Settings(BaseSettings):
     DATABASE_URL: str
     REDIS_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_TIMEOUT: int = 30
     SECRET_KEY: str
     PERIODIC_URL: str
     PERIODIC_INTERVAL: int = 30
+    PERIODIC_BATCH_SIZE: int = 1000
+    PERIODIC_TIMEOUT: float = 10
+    PERIODIC_LEASE_SECONDS: int = 120
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+    CACHE_TTL_SECONDS: int = 300
+    CACHE_MAX_PAYLOAD_BYTES: int = 1024 * 1024
+    CACHE_LOCK_TIMEOUT_MS: int = 5000
+    CACHE_LOCK_WAIT_MS: int = 200
+    DOCUMENT_CACHE_CONTROL: str = "private, no-cache"
+    DIFF_CACHE_SIZE: int = 1024
+    DIFF_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    BULK_BATCH_SIZE: int = 1000
+    BULK_MAX_LINE_BYTES: int = 16 * 1024 * 1024
+    BULK_MAX_ERRORS: int = 1000
+    EXPORT_BATCH_SIZE: int = 1000
+    BATCH_MAX_DOCUMENTS: int = 100
+    BATCH_MAX_PATHS: int = 50
+    DIFF_CACHE_REDIS: bool = True
+    DIFF_CACHE_TTL_SECONDS: int = 3600
+    REVISION_SNAPSHOT_EVERY: int = 32
+    # 0 - по числу ядер
+    TRANSFORM_WORKERS: int = 0
+    TRANSFORM_BATCH_SIZE: int = 500
+    TRANSFORM_RANGES_PER_WORKER: int = 4
+    TRANSFORM_PROGRESS_SECONDS: float = 10
+    CHANGE_FEED_QUEUE_SIZE: int = 1000
+    CHANGE_FEED_KEEPALIVE_SECONDS: float = 15
+    HEALTH_COUNT_REFRESH_SECONDS: int = 60
+    HEALTH_CHECK_TIMEOUT: float = 2
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_HEADER: str = "X-Profile"
+    PROFILE_CPU: bool = True
+    PROFILE_KEEP: int = 100
+    SLOW_QUERY_MS: float = 200
 
     class Config:
         env_file = ".env"
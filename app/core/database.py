@@ -1,18 +1,56 @@
-"""Сессия БД"""
+"""Сессии БД"""
 
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core.metrics import DB_POOL_CHECKOUT
+from app.core.profiling import instrument_engine
 
-engine = create_engine(settings.DATABASE_URL)
+def async_database_url(url: str) -> str:
+    """Подменяет синхронный драйвер PostgreSQL в DATABASE_URL на asyncpg"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+pool_options = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+)
+
+# Синхронный движок остаётся для фоновых и служебных скриптов
+engine = create_engine(settings.DATABASE_URL, **pool_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий выдачу соединения: ожидание свободного, создание и pre-ping"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_CHECKOUT.observe(time.perf_counter() - started)
+
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL), poolclass=TimedAsyncQueuePool, **pool_options
+)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
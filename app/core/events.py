@@ -0,0 +1,211 @@
+"""
+Лента изменений документов
+
+Изменяющие запросы crud отправляют событие через pg_notify в той же
+транзакции, что и само изменение, поэтому подписчики получают только
+зафиксированные изменения, а события от всех процессов сервиса видны всем.
+Каждый процесс держит одно соединение LISTEN, которое открывается
+при первом подписчике, и раздаёт события подпискам в памяти.
+
+Событие - объект JSON с полями type (created, updated, deleted, merged),
+id, owner, version и, где известно, title и patch (JSON Patch RFC 6902
+от предыдущей версии). Уведомление PostgreSQL ограничено 8000 байт:
+если патч не помещается, вместо него передаётся patch_omitted.
+
+Очередь подписки ограничена. Подписчик, не успевающий читать события,
+получает событие overflow и отключается - после переподключения ему нужно
+перечитать документы. При потере соединения LISTEN все подписки получают
+событие reset по той же причине
+"""
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+import asyncpg
+import orjson
+from sqlalchemy import Text, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import make_url
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "document_events"
+MAX_PAYLOAD_BYTES = 7999
+
+# Пачка уведомлений одним запросом, PostgreSQL доставит их после commit
+notify_events = text(
+    "SELECT pg_notify(:channel, payload) FROM unnest(:payloads) AS payload"
+).bindparams(bindparam("payloads", type_=ARRAY(Text)))
+
+def json_size_exceeds(value: Any, limit: int, max_nodes: int = 64) -> bool:
+    """
+    Проверяет, что JSON value заведомо длиннее limit байт, не сериализуя его
+
+    Оценка снизу по не более чем max_nodes узлам: большой объект или список
+    обнаруживается уже по числу элементов. False не гарантирует, что value
+    помещается в limit
+    """
+    size = 0
+    stack = [value]
+    while stack and max_nodes > 0:
+        max_nodes -= 1
+        value = stack.pop()
+        if isinstance(value, str):
+            size += len(value) + 2
+        elif isinstance(value, dict):
+            # Скобки, запятые и двоеточия; ключи и значения - не короче "" и 0
+            size += 2 * len(value) + 1
+            if size > limit:
+                return True
+            for key, item in value.items():
+                size += len(key) + 2
+                stack.append(item)
+        elif isinstance(value, list):
+            size += len(value) + 1
+            if size > limit:
+                return True
+            stack.extend(value)
+        else:
+            size += 1
+        if size > limit:
+            return True
+    return False
+
+def encode_event(
+    event_type: str,
+    doc_id: int,
+    owner: str,
+    version: Optional[int] = None,
+    title: Optional[str] = None,
+    patch: Optional[list] = None,
+) -> str:
+    """Текст уведомления о событии, не длиннее MAX_PAYLOAD_BYTES с патчем"""
+    event: dict[str, Any] = {"type": event_type, "id": doc_id, "owner": owner, "version": version}
+    if title is not None:
+        event["title"] = title
+    if patch is not None:
+        # Заведомо большой патч (например, content нового документа) не сериализуется
+        if not json_size_exceeds(patch, MAX_PAYLOAD_BYTES):
+            raw = orjson.dumps({**event, "patch": patch})
+            if len(raw) <= MAX_PAYLOAD_BYTES:
+                return raw.decode()
+        event["patch_omitted"] = True
+    return orjson.dumps(event).decode()
+
+class Subscription:
+    """Подписка на события одного владельца, одного документа или всех документов"""
+
+    def __init__(self, owner: Optional[str], doc_id: Optional[int], include_patch: bool, queue_size: int):
+        self.owner = owner
+        self.doc_id = doc_id
+        self.include_patch = include_patch
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def offer(self, event: dict) -> bool:
+        """Кладёт подходящее событие в очередь, возвращает False при переполнении"""
+        if self.closed:
+            return True
+        if self.owner is not None and event.get("owner") != self.owner:
+            return True
+        if self.doc_id is not None and event.get("id") != self.doc_id:
+            return True
+        if not self.include_patch and "patch" in event:
+            event = {key: value for key, value in event.items() if key != "patch"}
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.close("overflow")
+            return False
+        return True
+
+    def close(self, reason: str) -> None:
+        """Отбрасывает непрочитанные события и оставляет одно событие reason"""
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"type": reason})
+
+class ChangeFeed:
+    """Соединение LISTEN процесса и его подписки"""
+
+    def __init__(self, dsn: str, queue_size: int = 1000):
+        self.dsn = dsn
+        self.queue_size = queue_size
+        self.connection: Optional[asyncpg.Connection] = None
+        self.subscriptions: set[Subscription] = set()
+        self.lock = asyncio.Lock()
+        self.received = 0
+        self.overflows = 0
+        self.resets = 0
+
+    async def _listen(self) -> None:
+        async with self.lock:
+            if self.connection is not None and not self.connection.is_closed():
+                return
+            connection = await asyncpg.connect(self.dsn)
+            connection.add_termination_listener(self._on_termination)
+            await connection.add_listener(CHANNEL, self._on_notify)
+            self.connection = connection
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.received += 1
+        # Событие разбирается один раз и раздаётся всем подпискам процесса
+        event = orjson.loads(payload)
+        for subscription in list(self.subscriptions):
+            if not subscription.offer(event):
+                self.overflows += 1
+                self.subscriptions.discard(subscription)
+
+    def _on_termination(self, connection) -> None:
+        logger.warning("Change feed connection lost, resetting %d subscriptions", len(self.subscriptions))
+        self.connection = None
+        self.resets += 1
+        for subscription in self.subscriptions:
+            subscription.close("reset")
+        self.subscriptions.clear()
+
+    async def subscribe(
+        self, owner: Optional[str] = None, doc_id: Optional[int] = None, include_patch: bool = False
+    ) -> Subscription:
+        """
+        Создаёт подписку; при первой подписке процесса открывает соединение LISTEN
+
+        Args:
+            owner: только документы этого владельца, None - все
+            doc_id: только этот документ
+            include_patch: передавать ли patch в событиях
+        """
+        await self._listen()
+        subscription = Subscription(owner, doc_id, include_patch, self.queue_size)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscriptions.discard(subscription)
+
+    async def close(self) -> None:
+        """Закрывает соединение LISTEN при остановке процесса"""
+        connection, self.connection = self.connection, None
+        if connection is not None and not connection.is_closed():
+            connection.remove_termination_listener(self._on_termination)
+            await connection.close()
+        for subscription in self.subscriptions:
+            subscription.close("reset")
+        self.subscriptions.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "listening": self.connection is not None,
+            "subscribers": len(self.subscriptions),
+            "received": self.received,
+            "overflows": self.overflows,
+            "resets": self.resets,
+        }
+
+change_feed = ChangeFeed(
+    make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False),
+    queue_size=settings.CHANGE_FEED_QUEUE_SIZE,
+)
@@ -0,0 +1,125 @@
+"""
+Метрики Prometheus
+
+Задержки запросов, ожидание соединения из пула, время SQL-запросов
+и длительность периодической задачи собираются гистограммами в момент события. Счётчики кэшей, пула
+и периодической задачи уже ведутся в их объектах и читаются коллектором
+при каждом запросе /metrics
+"""
+
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+)
+DB_POOL_CHECKOUT = Histogram(
+    "db_pool_checkout_seconds",
+    "Ожидание соединения из пула БД",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Время выполнения SQL-запроса",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+PERIODIC_DURATION = Histogram(
+    "periodic_job_duration_seconds",
+    "Длительность запуска периодической задачи",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware, замеряющее время обработки запросов
+
+    Запрос помечается шаблоном пути маршрута (/api/v1/documents/{doc_id}),
+    а не фактическим путём, чтобы число рядов метрики не росло с числом документов
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            ).observe(time.perf_counter() - started)
+
+class StatsCollector(Collector):
+    """Переводит счётчики кэшей, пула БД и периодической задачи в метрики"""
+
+    def describe(self):
+        # Без describe регистрация вызывает collect, а модули с объектами
+        # в этот момент ещё не импортированы
+        return []
+
+    def collect(self):
+        # Импорт при сборе: модули с объектами сами импортируют metrics
+        from app.core.cache import diff_cache, document_cache
+        from app.core.database import async_engine
+        from app.core.security import token_cache
+        from app.services.periodic_task import periodic_stats
+
+        pool = async_engine.pool
+        pool_metrics = GaugeMetricFamily("db_pool_connections", "Соединения пула БД", labels=["state"])
+        pool_metrics.add_metric(["size"], pool.size())
+        pool_metrics.add_metric(["checked_out"], pool.checkedout())
+        pool_metrics.add_metric(["checked_in"], pool.checkedin())
+        pool_metrics.add_metric(["overflow"], pool.overflow())
+        yield pool_metrics
+
+        hits = CounterMetricFamily("cache_hits", "Попадания в кэш", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Промахи кэша", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Доля попаданий в кэш с запуска процесса", labels=["cache"])
+        document, diff, token = document_cache.stats(), diff_cache.stats(), token_cache.stats()
+        for name, hit_count, stats in (
+            ("document", document["hits"], document),
+            ("diff", diff["memory_hits"] + diff["redis_hits"], diff),
+            ("token", token["hits"], token),
+        ):
+            hits.add_metric([name], hit_count)
+            misses.add_metric([name], stats["misses"])
+            if stats["hit_ratio"] is not None:
+                ratio.add_metric([name], stats["hit_ratio"])
+        yield hits
+        yield misses
+        yield ratio
+
+        runs = CounterMetricFamily("periodic_job_runs", "Запуски периодической задачи", labels=["outcome"])
+        for outcome in ("applied", "skipped_not_leader", "skipped_not_modified", "skipped_unchanged", "failed"):
+            runs.add_metric([outcome], periodic_stats[outcome])
+        yield runs
+        yield CounterMetricFamily(
+            "periodic_documents_updated", "Документы, изменённые периодической задачей",
+            value=periodic_stats["documents_updated"],
+        )
+
+REGISTRY.register(StatsCollector())
+
+def render() -> tuple[bytes, str]:
+    """Метрики в текстовом формате Prometheus и их Content-Type"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,177 @@
+"""
+Профилирование отдельных запросов и учёт SQL
+
+Профилируются запросы, выбранные случайно с долей PROFILE_SAMPLE_RATE,
+и запросы администратора с заголовком PROFILE_HEADER. Для них собираются
+интервалы (spans) этапов: обработчик, функции crud и сервисов, помеченные
+traced, сериализация ответа, а также все SQL-запросы и, если включено,
+профиль CPU (cProfile).
+
+Профиль CPU включает всю работу цикла событий за время запроса, в том
+числе параллельных запросов. Результат пишется в лог, кратко отдаётся
+в заголовке Server-Timing и хранится в памяти процесса (последние
+PROFILE_KEEP профилей). Вне профилируемых запросов traced стоит одного
+обращения к ContextVar.
+
+Время каждого SQL-запроса учитывается всегда: гистограмма метрик
+и журнал медленных запросов дольше SLOW_QUERY_MS
+"""
+
+import asyncio
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import random
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from app.core.config import settings
+from app.core.metrics import DB_QUERY_DURATION
+from app.core.security import verify_token
+from app.core.tracing import RequestProfile, current_profile
+
+logger = logging.getLogger(__name__)
+
+CPU_STATS_LINES = 40
+
+recent_profiles: deque = deque(maxlen=settings.PROFILE_KEEP)
+# cProfile нельзя включить дважды, поэтому профиль CPU снимается
+# только с одного запроса одновременно
+cpu_profile_active = False
+
+class ProfiledRoute(APIRoute):
+    """
+    Маршрут, отмечающий интервал обработчика
+
+    Время от завершения обработчика до начала ответа middleware
+    записывает как сериализацию
+    """
+
+    def get_route_handler(self):
+        endpoint = self.dependant.call
+        name = f"endpoint.{endpoint.__name__}"
+
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def call(*args, **kwargs):
+                profile = current_profile.get()
+                if profile is None:
+                    return await endpoint(*args, **kwargs)
+                try:
+                    with profile.span(name):
+                        return await endpoint(*args, **kwargs)
+                finally:
+                    profile.endpoint_finished = time.perf_counter()
+        else:
+            @functools.wraps(endpoint)
+            def call(*args, **kwargs):
+                profile = current_profile.get()
+                if profile is None:
+                    return endpoint(*args, **kwargs)
+                try:
+                    with profile.span(name):
+                        return endpoint(*args, **kwargs)
+                finally:
+                    profile.endpoint_finished = time.perf_counter()
+
+        self.dependant.call = call
+        return super().get_route_handler()
+
+def requested_by_admin(scope) -> bool:
+    """Передан ли заголовок профилирования вместе с токеном администратора"""
+    headers = dict(scope["headers"])
+    if headers.get(settings.PROFILE_HEADER.lower().encode()) is None:
+        return False
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    return scheme.lower() == "bearer" and verify_token(token) == "admin"
+
+class ProfilingMiddleware:
+    """ASGI middleware, включающее профиль для выбранных запросов"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (
+            (settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE)
+            or requested_by_admin(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        global cpu_profile_active
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = current_profile.set(profile)
+        if settings.PROFILE_CPU and not cpu_profile_active:
+            cpu_profile_active = True
+            profile.profiler = cProfile.Profile()
+            profile.profiler.enable()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                if profile.endpoint_finished is not None:
+                    profile.add_span("serialize", profile.endpoint_finished, now)
+                profile.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", profile.server_timing().encode("latin-1")))
+                headers.append((b"x-profile-id", profile.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profile.profiler is not None:
+                profile.profiler.disable()
+                cpu_profile_active = False
+                output = io.StringIO()
+                pstats.Stats(profile.profiler, stream=output).sort_stats("cumulative").print_stats(CPU_STATS_LINES)
+                profile.cpu_stats = output.getvalue()
+                profile.profiler = None
+            current_profile.reset(token)
+            profile.total_ms = round((time.perf_counter() - profile.started) * 1000, 3)
+            recent_profiles.append(profile)
+            logger.info("Request profile %s", json.dumps({
+                **profile.summary(),
+                "spans": sorted(profile.spans, key=lambda span: span["start_ms"]),
+            }, ensure_ascii=False))
+
+def get_profile(profile_id: str) -> Optional[RequestProfile]:
+    for profile in recent_profiles:
+        if profile.id == profile_id:
+            return profile
+    return None
+
+def instrument_engine(engine) -> None:
+    """
+    Подписывается на события выполнения SQL движка
+
+    Для асинхронного движка передаётся async_engine.sync_engine
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_DURATION.observe(duration)
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            logger.warning("Slow query %.1f ms: %s", duration * 1000, statement[:1000])
+        profile = current_profile.get()
+        if profile is not None:
+            profile.add_query(statement, duration)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # after_cursor_execute для упавшего запроса не вызывается
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
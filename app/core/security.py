@@ -2,10 +2,14 @@
 Модуль аутентификации и работы с JWT.
 
 Содержит функции для создания и проверки JWT-токенов,
-а также схему OAuth2 для извлечения токена из запроса.
+кэш проверенных токенов, а также схему OAuth2 для извлечения
+токена из запроса.
 """
 
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Any, Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -13,6 +17,59 @@ from app.core.config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+class TokenCache:
+    """
+    Кэш проверенных токенов в памяти процесса
+
+    Запись живёт до истечения exp токена, но не дольше ttl, и вытесняется
+    по LRU. Кэшируются только успешно проверенные токены, поэтому поток
+    недействительных токенов не вытесняет записи
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: int = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[str]:
+        """Имя пользователя проверенного и ещё не истёкшего токена или None"""
+        entry = self.entries.get(token)
+        if entry is not None:
+            username, expires = entry
+            if expires > time.time():
+                self.entries.move_to_end(token)
+                self.hits += 1
+                return username
+            del self.entries[token]
+        self.misses += 1
+        return None
+
+    def set(self, token: str, username: str, exp: Optional[float]) -> None:
+        expires = time.time() + self.ttl
+        if exp is not None:
+            expires = min(expires, exp)
+        self.entries[token] = (username, expires)
+        self.entries.move_to_end(token)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        """Счётчики попаданий и промахов процесса"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+token_cache = TokenCache(
+    max_entries=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL_SECONDS,
+)
+
 def create_access_token(data: dict) -> str:
     """
     Создаёт JWT токен
@@ -27,10 +84,36 @@ def create_access_token(data: dict) -> str:
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
-def decode_token(token: str = Depends(oauth2_scheme)) -> str:
+def verify_token(token: str) -> Optional[str]:
+    """
+    Проверяет JWT токен с учётом token_cache
+
+    Args:
+        token: строка токена
+
+    Returns:
+        Optional[str]: имя пользователя или None, если токен недействителен
+    """
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if username is not None:
+        token_cache.set(token, username, payload.get("exp"))
+    return username
+
+async def decode_token(token: str = Depends(oauth2_scheme)) -> str:
     """
     Проверяет JWT токен
 
+    Повторные запросы с тем же токеном берут результат проверки из token_cache.
+    Проверка HS256 дешевле переключения в пул потоков, поэтому функция
+    асинхронная и выполняется прямо в цикле событий
+
     Args:
         token: строка токена
 
@@ -40,11 +123,7 @@ def decode_token(token: str = Depends(oauth2_scheme)) -> str:
     Raises:
         HTTPException 401: если токен недействителен, истёк или не содержит ключа имени пользователя
     """
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return username
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
+    username = verify_token(token)
+    if username is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return username
\ No newline at end of file
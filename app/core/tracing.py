@@ -0,0 +1,125 @@
+"""
+Интервалы профиля запроса
+
+Профиль текущего запроса хранится в ContextVar, поэтому его видят
+функции crud и сервисов без передачи через аргументы. Модуль не зависит
+от конфигурации и веб-фреймворка: сервисы помечаются traced, не подключая
+остальное приложение
+"""
+
+import asyncio
+import cProfile
+import functools
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+
+MAX_QUERIES = 50
+
+current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+class RequestProfile:
+    """Интервалы, SQL-запросы и профиль CPU одного запроса"""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: list[dict] = []
+        self.depth = 0
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.queries: list[dict] = []
+        self.endpoint_finished: Optional[float] = None
+        self.profiler: Optional[cProfile.Profile] = None
+        self.cpu_stats: Optional[str] = None
+        self.total_ms: Optional[float] = None
+        self.status: Optional[int] = None
+
+    def _offset_ms(self, moment: float) -> float:
+        return round((moment - self.started) * 1000, 3)
+
+    def add_span(self, name: str, started: float, finished: float, depth: int = 0) -> None:
+        self.spans.append({
+            "name": name,
+            "start_ms": self._offset_ms(started),
+            "duration_ms": round((finished - started) * 1000, 3),
+            "depth": depth,
+        })
+
+    @contextmanager
+    def span(self, name: str):
+        started = time.perf_counter()
+        depth = self.depth
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            self.add_span(name, started, time.perf_counter(), depth)
+
+    def add_query(self, statement: str, duration: float) -> None:
+        self.sql_count += 1
+        self.sql_ms += duration * 1000
+        self.queries.append({"statement": statement[:1000], "duration_ms": round(duration * 1000, 3)})
+        if len(self.queries) > MAX_QUERIES:
+            self.queries.sort(key=lambda query: query["duration_ms"], reverse=True)
+            self.queries.pop()
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing: итоговые интервалы верхнего уровня и SQL"""
+        parts = [
+            f'{span["name"].replace(".", "-")};dur={span["duration_ms"]}'
+            for span in self.spans if span["depth"] == 0
+        ]
+        parts.append(f"sql;dur={round(self.sql_ms, 3)};desc=\"{self.sql_count} queries\"")
+        return ", ".join(parts)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "total_ms": self.total_ms,
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_ms, 3),
+        }
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            **self.summary(),
+            "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+            "queries": self.queries,
+            "cpu": self.cpu_stats,
+        }
+
+def traced(func):
+    """
+    Помечает функцию интервалом профиля с именем вида crud.document.update_document
+
+    Вне профилируемого запроса вызывает функцию напрямую
+    """
+    name = f"{func.__module__.removeprefix('app.')}.{func.__qualname__}"
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None:
+                return await func(*args, **kwargs)
+            with profile.span(name):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        with profile.span(name):
+            return func(*args, **kwargs)
+    return wrapper
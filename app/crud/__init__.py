@@ -1,8 +1,30 @@
 from .document import (
     get_document,
+    get_document_json,
+    get_document_path,
+    get_document_meta,
+    get_documents_meta,
+    get_documents_content,
+    get_documents_batch,
     get_documents,
+    LIST_FIELDS,
     create_document,
+    create_documents,
+    stream_documents,
     update_document,
+    update_document_content,
+    set_document_path,
+    delete_document_path,
     delete_document,
     update_all_documents,
+    merge_into_all_documents,
+)
+from .revision import (
+    get_revision_at,
+    get_document_revision,
+    get_revisions,
+)
+from .transform_job import (
+    get_job_progress,
+    get_jobs_progress,
 )
\ No newline at end of file
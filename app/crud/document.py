@@ -2,42 +2,336 @@
 CRUD операции для модели Document
 
 Содержит функции для создания, чтения, обновления, удаления документов,
-а также массового обновления всех документов
+а также массового обновления всех документов. Каждое изменение content
+записывает ревизию и отправляет событие ленты изменений в той же транзакции
 """
 
-from sqlalchemy.orm import Session
-from app.models.document import Document
+import copy
+from sqlalchemy import Integer, Text, and_, bindparam, case, cast, delete, func, insert, literal, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, JSONPATH
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+from sqlalchemy.orm.attributes import flag_modified
+from app.core.config import settings
+from app.core.events import CHANNEL, MAX_PAYLOAD_BYTES, encode_event, notify_events
+from app.core.tracing import traced
+from app.crud.revision import add_revisions, revision_rows
+from app.models.document import Document, path_expression
+from app.models.revision import DocumentRevision
+from app.services import json_diff, json_patch, json_query
+from app.services.json_patch import format_pointer
 from app.schemas.document import DocumentCreate, DocumentUpdate
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, AsyncIterator, Sequence
 
-def get_document(db: Session, doc_id: int) -> Optional[Document]:
+async def _notify(db: AsyncSession, payloads: list[str]) -> None:
+    """Отправляет события ленты изменений, PostgreSQL доставит их после commit"""
+    if payloads:
+        await db.execute(notify_events, {"channel": CHANNEL, "payloads": payloads})
+
+def _created_event(doc_id: int, owner: str, title: str, content: Any) -> str:
+    return encode_event("created", doc_id, owner, 1, title, [{"op": "add", "path": "", "value": content}])
+
+@traced
+async def get_document(
+    db: AsyncSession, doc_id: int, content: bool = True, owner: Optional[str] = None
+) -> Optional[Document]:
     """
     Получает документ по его ID.
 
     Args:
         db: сессия базы данных
         doc_id: идентификатор документа
+        content: загружать ли content; без него обращение к doc.content - ошибка
+        owner: если задан, документ должен принадлежать этому пользователю
 
     Returns:
         Optional[Document]: объект документа или None, если не найден
+        или принадлежит другому пользователю
+    """
+    stmt = select(Document).where(Document.id == doc_id)
+    if owner is not None:
+        stmt = stmt.where(Document.owner == owner)
+    if content:
+        stmt = stmt.options(undefer(Document.content))
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
+
+@traced
+async def get_document_json(db: AsyncSession, doc_id: int, owner: Optional[str] = None):
+    """
+    Получает документ с content в виде текста JSON
+
+    content не разбирается ни драйвером, ни приложением и может быть
+    вставлен в ответ как есть
+
+    Args:
+        db: сессия базы данных
+        doc_id: идентификатор документа
+        owner: если задан, документ должен принадлежать этому пользователю
+
+    Returns:
+        Row с полями id, title, owner, created_at, updated_at, version,
+        content_size и content (str) или None, если документ не найден
+        или принадлежит другому пользователю
+    """
+    stmt = select(
+        Document.id, Document.title, Document.owner, Document.created_at,
+        Document.updated_at, Document.version, Document.content_size,
+        cast(Document.content, Text).label("content"),
+    ).where(Document.id == doc_id)
+    if owner is not None:
+        stmt = stmt.where(Document.owner == owner)
+    result = await db.execute(stmt)
+    return result.one_or_none()
+
+@traced
+async def get_document_path(
+    db: AsyncSession, doc_id: int, path: list[str], owner: Optional[str] = None
+):
+    """
+    Извлекает часть документа по пути на стороне БД (content #> path)
+
+    Из базы передаётся только запрошенное поддерево, владелец и версия документа
+
+    Args:
+        db: сессия базы данных
+        doc_id: идентификатор документа
+        path: список ключей пути
+        owner: если задан, документ должен принадлежать этому пользователю
+
+    Returns:
+        Row с полями owner, version, value и found или None, если документ не найден
+        или принадлежит другому пользователю. found ложно, если пути в документе нет:
+        value равно None и для отсутствующего пути, и для значения null
     """
-    return db.query(Document).filter(Document.id == doc_id).first()
+    value = Document.content[tuple(path)]
+    stmt = (
+        select(Document.owner, Document.version, value.label("value"), value.is_not(None).label("found"))
+        .where(Document.id == doc_id)
+    )
+    if owner is not None:
+        stmt = stmt.where(Document.owner == owner)
+    result = await db.execute(stmt)
+    return result.one_or_none()
 
-def get_documents(db: Session, skip: int = 0, limit: int = 100) -> list[Document]:
+@traced
+async def get_document_meta(db: AsyncSession, doc_id: int):
     """
-    Получить список документов
+    Получает владельца, версию, заголовок и время создания документа
+    без загрузки content
 
     Args:
         db: сессия базы данных
-        skip: количество пропускаемых записей / offset
+        doc_id: идентификатор документа
+
+    Returns:
+        Row с полями owner, version, title и created_at или None,
+        если документ не найден
+    """
+    result = await db.execute(
+        select(Document.owner, Document.version, Document.title, Document.created_at)
+        .where(Document.id == doc_id)
+    )
+    return result.one_or_none()
+
+@traced
+async def get_documents_meta(db: AsyncSession, doc_ids: list[int]) -> dict:
+    """
+    Получает владельцев, версии и отпечатки содержимого нескольких документов
+    одним запросом, без загрузки content
+
+    Args:
+        db: сессия базы данных
+        doc_ids: идентификаторы документов
+
+    Returns:
+        dict: id документа -> Row с полями id, owner, version, content_hash.
+        Ненайденных документов в словаре нет
+    """
+    result = await db.execute(
+        select(Document.id, Document.owner, Document.version, Document.content_hash)
+        .where(Document.id.in_(doc_ids))
+    )
+    return {row.id: row for row in result}
+
+@traced
+async def get_documents_content(db: AsyncSession, doc_ids: list[int]) -> dict:
+    """
+    Получает content нескольких документов одним запросом
+
+    Args:
+        db: сессия базы данных
+        doc_ids: идентификаторы документов
+
+    Returns:
+        dict: id документа -> content
+    """
+    result = await db.execute(
+        select(Document.id, Document.content).where(Document.id.in_(doc_ids))
+    )
+    return {row.id: row.content for row in result}
+
+_documents_batch = """
+    SELECT d.id, d.title, d.owner, d.created_at, d.updated_at, d.version, d.content_size,
+           CASE WHEN d.id = ANY(:whole_ids) THEN d.content::text END AS content,
+           (
+               SELECT jsonb_agg(CASE WHEN v.value IS NOT NULL THEN jsonb_build_array(v.value) END ORDER BY t.n)
+               FROM jsonb_array_elements(:paths -> d.id::text) WITH ORDINALITY AS t(path, n),
+                    LATERAL (SELECT d.content #> ARRAY(SELECT jsonb_array_elements_text(t.path)) AS value) AS v
+           ) AS path_values
+    FROM documents AS d
+    WHERE d.id = ANY(:ids)
+"""
+
+def _batch_statement(sql: str):
+    return text(sql).bindparams(
+        bindparam("ids", type_=ARRAY(Integer)),
+        bindparam("whole_ids", type_=ARRAY(Integer)),
+        bindparam("paths", type_=JSONB),
+    ).columns(path_values=JSONB)
+
+_get_documents_batch = _batch_statement(_documents_batch)
+_get_owned_documents_batch = _batch_statement(_documents_batch + "  AND d.owner = :owner")
+
+@traced
+async def get_documents_batch(
+    db: AsyncSession,
+    whole_ids: list[int],
+    paths: dict[int, list[str]],
+    owner: Optional[str] = None,
+) -> dict:
+    """
+    Читает несколько документов целиком или частями одним запросом
+
+    Части по путям извлекаются на стороне БД (content #> path), content
+    передаётся текстом JSON только для документов из whole_ids
+
+    Args:
+        db: сессия базы данных
+        whole_ids: документы, нужные целиком
+        paths: id документа -> точечные пути нужных частей
+        owner: если задан, документы должны принадлежать этому пользователю
+
+    Returns:
+        dict: id документа -> Row с полями id, title, owner, created_at,
+        updated_at, version, content_size, content (str или None)
+        и path_values (в порядке paths[id]: [значение] или None, если пути нет).
+        Ненайденных и чужих документов в словаре нет
+    """
+    params = {
+        "ids": list({*whole_ids, *paths}),
+        "whole_ids": list(whole_ids),
+        "paths": {
+            str(doc_id): [json_patch.split_path(path) for path in doc_paths]
+            for doc_id, doc_paths in paths.items()
+        },
+    }
+    if owner is None:
+        result = await db.execute(_get_documents_batch, params)
+    else:
+        result = await db.execute(_get_owned_documents_batch, {**params, "owner": owner})
+    return {row.id: row for row in result}
+
+def _predicate_clause(predicate: json_query.Predicate):
+    """
+    Условие поиска в SQL
+
+    @>, ? и @? проверяются по индексу GIN. Равенство дополнительно сравнивает
+    content #> path: это точнее @> для списков и объектов и позволяет
+    планировщику выбрать индекс по выражению, если путь есть в INDEXED_PATHS
+    """
+    path = predicate.path
+    if predicate.op == "exists":
+        if len(path) == 1 and json_query.indexable(path):
+            return Document.content.has_key(path[0])
+        return Document.content.op("@?")(cast(literal(json_query.to_jsonpath(path)), JSONPATH))
+    if predicate.op == "contains":
+        if json_query.indexable(path):
+            return Document.content.contains(json_query.nest(path, predicate.value))
+        return path_expression(path).contains(predicate.value)
+    clause = path_expression(path) == literal(predicate.value, JSONB)
+    if json_query.indexable(path):
+        clause = and_(Document.content.contains(json_query.nest(path, predicate.value)), clause)
+    return clause
+
+LIST_FIELDS = ("id", "title", "owner", "created_at", "updated_at", "version", "content_size", "content")
+
+@traced
+async def get_documents(
+    db: AsyncSession,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    owner: Optional[str] = None,
+    fields: tuple[str, ...] = LIST_FIELDS,
+    predicates: Sequence[json_query.Predicate] = (),
+) -> list:
+    """
+    Получить страницу документов, упорядоченных по id
+
+    Пагинация по ключу (id > after_id), поэтому стоимость страницы не зависит
+    от её номера. Фильтр по владельцу использует индекс (owner, id),
+    условия по содержимому - индекс GIN и индексы по путям (INDEXED_PATHS)
+
+    Args:
+        db: сессия базы данных
+        after_id: id последнего документа предыдущей страницы
         limit: максимальное количество возвращаемых записей
+        owner: если задан, только документы этого владельца
+        fields: выбираемые столбцы из LIST_FIELDS, id выбирается всегда
+        predicates: условия по content, должны выполняться все
 
     Returns:
-        list[Document]: список документов
+        list: строки с запрошенными полями
     """
-    return db.query(Document).offset(skip).limit(limit).all()
+    columns = [Document.id] + [getattr(Document, f) for f in fields if f != "id"]
+    stmt = select(*columns).order_by(Document.id).limit(limit)
+    if predicates:
+        stmt = stmt.where(*[_predicate_clause(p) for p in predicates])
+        # Общий план подготовленного запроса не видит значений условий и
+        # оценивает @> одинаково для любых, выбирая обход по id с фильтром
+        await db.execute(text("SET LOCAL plan_cache_mode = force_custom_plan"))
+    if after_id is not None:
+        stmt = stmt.where(Document.id > after_id)
+    if owner is not None:
+        stmt = stmt.where(Document.owner == owner)
+    result = await db.execute(stmt)
+    return list(result)
 
-def create_document(db: Session, doc: DocumentCreate, owner: str) -> Document:
+async def stream_documents(
+    db: AsyncSession, owner: Optional[str] = None, batch_size: int = 1000
+) -> AsyncIterator:
+    """
+    Потоково читает документы через серверный курсор
+
+    Ни приложение, ни PostgreSQL не материализуют весь результат: строки
+    забираются из курсора пачками по batch_size. content возвращается
+    текстом JSON, без разбора на стороне приложения
+
+    Args:
+        db: сессия базы данных
+        owner: если задан, только документы этого владельца
+        batch_size: количество строк, получаемых из курсора за раз
+
+    Yields:
+        Row с полями id, title, owner, created_at, updated_at, version, content
+    """
+    stmt = (
+        select(
+            Document.id, Document.title, Document.owner, Document.created_at,
+            Document.updated_at, Document.version,
+            cast(Document.content, Text).label("content"),
+        )
+        .order_by(Document.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if owner is not None:
+        stmt = stmt.where(Document.owner == owner)
+    result = await db.stream(stmt)
+    async for row in result:
+        yield row
+
+@traced
+async def create_document(db: AsyncSession, doc: DocumentCreate, owner: str) -> Document:
     """
     Создаёт новый документ
 
@@ -49,68 +343,479 @@ def create_document(db: Session, doc: DocumentCreate, owner: str) -> Document:
     Returns:
         Document: созданный документ с заполненными полями
     """
-    db_doc = Document(title=doc.title, content=doc.content, owner=owner)
-    db.add(db_doc)
-    db.commit()
-    db.refresh(db_doc)
+    stmt = (
+        insert(Document)
+        .values(title=doc.title, content=doc.content, owner=owner)
+        .returning(Document)
+        .options(undefer(Document.content))
+    )
+    db_doc = (await db.execute(stmt)).scalar_one()
+    await _notify(db, [_created_event(db_doc.id, owner, db_doc.title, db_doc.content)])
+    await db.commit()
     return db_doc
 
-def update_document(db: Session, doc_id: int, doc_update: DocumentUpdate) -> Optional[Document]:
+@traced
+async def create_documents(db: AsyncSession, docs: list[DocumentCreate], owner: str) -> list[int]:
+    """
+    Создаёт несколько документов одним многострочным INSERT ... RETURNING
+
+    Args:
+        db: сессия базы данных
+        docs: схемы с данными для создания
+        owner: имя владельца документов
+
+    Returns:
+        list[int]: идентификаторы созданных документов
+    """
+    rows = [{"title": doc.title, "content": doc.content, "owner": owner} for doc in docs]
+    result = await db.execute(insert(Document).returning(Document.id), rows)
+    ids = list(result.scalars())
+    await _notify(db, [
+        _created_event(doc_id, owner, doc.title, doc.content) for doc_id, doc in zip(ids, docs)
+    ])
+    await db.commit()
+    return ids
+
+def _guarded_update(doc_id: int, owner: Optional[str], expected_versions: Optional[list[int]], *columns):
+    """
+    UPDATE документа с проверкой владельца и версии в том же запросе
+
+    Строка блокируется в CTE old, через которую RETURNING может отдать
+    прежние значения (columns - выражения над Document). Если документ
+    ещё не менялся, ревизия 1 - снимок прежнего content - пишется тем же
+    запросом, и content не передаётся в приложение. Версия увеличивается
+    на единицу. Если условие не выполнено, запрос не изменяет ни одной строки
+
+    Returns:
+        UPDATE и CTE old со столбцами id, title, version, created_at, content и columns
+    """
+    old = select(
+        Document.id, Document.title, Document.version, Document.created_at, Document.content, *columns
+    ).where(Document.id == doc_id)
+    if owner is not None:
+        old = old.where(Document.owner == owner)
+    if expected_versions is not None:
+        old = old.where(Document.version.in_(expected_versions))
+    old = old.with_for_update().cte("old")
+    first_revision = insert(DocumentRevision).from_select(
+        ["document_id", "version", "title", "created_at", "snapshot"],
+        select(old.c.id, literal(1), old.c.title, old.c.created_at, old.c.content).where(old.c.version == 1),
+    ).cte("first_revision")
+    stmt = (
+        update(Document)
+        .where(Document.id == old.c.id)
+        .values(version=Document.version + 1)
+        .add_cte(first_revision)
+    )
+    return stmt, old
+
+@traced
+async def _guarded_write(db: AsyncSession, stmt, make_patch: Callable[[Any], list], *columns, content: bool = True):
+    """
+    Выполняет UPDATE из _guarded_update, записывает ревизию и событие, фиксирует транзакцию
+
+    Args:
+        make_patch: строит JSON Patch изменения по строке RETURNING
+        columns: столбцы CTE old, которые нужны make_patch
+        content: вернуть новый content; иначе он читается, только если
+                 ревизия должна быть снимком
+
+    Returns:
+        Row с полями документа (как DocumentInDB) и columns или None,
+        если условие не выполнено
+    """
+    new_content = Document.content
+    if not content:
+        new_content = case((Document.version % settings.REVISION_SNAPSHOT_EVERY == 0, Document.content))
+    stmt = stmt.returning(
+        Document.id, Document.title, Document.owner, Document.created_at, Document.updated_at,
+        Document.version, Document.content_size, new_content.label("content"), *columns,
+    ).execution_options(synchronize_session=False)
+    row = (await db.execute(stmt)).one_or_none()
+    if row is None:
+        await db.commit()
+        return None
+    patch = make_patch(row)
+    await add_revisions(db, revision_rows(
+        row.id, row.version, row.title, row.content, None, None, patch=patch, with_first=False,
+    ))
+    await _notify(db, [encode_event("updated", row.id, row.owner, row.version, row.title, patch)])
+    await db.commit()
+    return row
+
+def _path_probe(path: list[str]):
+    """
+    Тип и длина (для списков) узлов content по каждому префиксу пути, от корня
+
+    По пробе старого content изменение по пути восстанавливается
+    без передачи самого content в приложение
+    """
+    return func.jsonb_path_probe(Document.content, literal(path, ARRAY(Text)), type_=JSONB)
+
+def _array_index(key: str, length: int) -> int:
+    # PostgreSQL считает отрицательные индексы с конца списка
+    index = int(key)
+    return index + length if index < 0 else index
+
+def _set_path_patch(path: list[str], value: Any, probe: list) -> list[dict]:
+    """
+    JSON Patch изменения jsonb_set_deep(content, path, value) по пробе старого content
+
+    Повторяет правила функции: скалярный корень заменяется объектом,
+    отсутствующие или скалярные промежуточные узлы - объектами. Индекс
+    за пределами списка добавляет элемент в конец (отрицательный - в начало);
+    дальше по пути узлы создаются, только если тот же индекс указывает
+    на добавленный элемент в удлинённом списке
+    """
+    if probe[0][0] not in ("object", "array"):
+        return [{"op": "replace", "path": "", "value": json_query.nest(tuple(path), value) if path else {}}]
+    keys = []
+    for i, key in enumerate(path, 1):
+        kind, length = probe[i - 1]
+        last = i == len(path)
+        if not last and probe[i][0] in ("object", "array"):
+            keys.append(_array_index(key, length) if kind == "array" else key)
+            continue
+        new = value if last else json_query.nest(tuple(path[i:]), value)
+        if kind == "object":
+            return [{"op": "add", "path": format_pointer(keys + [key]), "value": new}]
+        index = _array_index(key, length)
+        if 0 <= index < length:
+            return [{"op": "replace", "path": format_pointer(keys + [index]), "value": new}]
+        position = length if index >= length else 0
+        if not last and _array_index(key, length + 1) != position:
+            # Добавленный элемент не находится по тому же индексу в удлинённом списке
+            new = {}
+        return [{"op": "add", "path": format_pointer(keys + [position]), "value": new}]
+    return []
+
+def _delete_path_patch(path: list[str], probe: list) -> list[dict]:
+    """JSON Patch изменения content #- path: удаление, если путь существовал"""
+    if not path or probe[len(path)][0] is None:
+        return []
+    keys = [
+        _array_index(key, length) if kind == "array" else key
+        for key, (kind, length) in zip(path, probe)
+    ]
+    return [{"op": "remove", "path": format_pointer(keys)}]
+
+@traced
+async def update_document(
+    db: AsyncSession,
+    doc_id: int,
+    doc_update: DocumentUpdate,
+    owner: Optional[str] = None,
+    expected_versions: Optional[list[int]] = None,
+):
     """
     Обновляет существующий документ
 
-    Обновляет только переданные поля
-    Если документ не найден, возвращает None
+    Обновляет только переданные поля одним запросом UPDATE ... RETURNING
+    Если документ не найден или не выполнено условие, возвращает None
 
     Args:
         db: сессия базы данных
         doc_id: идентификатор документа
         doc_update: схема с обновляемыми полями
+        owner: если задан, документ должен принадлежать этому пользователю
+        expected_versions: если заданы, текущая версия должна быть одной из них
 
     Returns:
-        Optional[Document]: обновлённый документ или None
+        Row с полями обновлённого документа или None
     """
-    db_doc = get_document(db, doc_id)
-    if not db_doc:
-        return None
+    values = {}
     if doc_update.title is not None:
-        db_doc.title = doc_update.title
-    if doc_update.content is not None:
-        db_doc.content = doc_update.content
-    db.commit()
-    db.refresh(db_doc)
-    return db_doc
+        values["title"] = doc_update.title
+    stmt, old = _guarded_update(doc_id, owner, expected_versions)
+    if doc_update.content is None:
+        return await _guarded_write(db, stmt.values(**values), lambda row: [])
+    return await _guarded_write(
+        db, stmt.values(**values, content=doc_update.content),
+        lambda row: json_diff.deep_diff(row.old_content, row.content, format="patch"),
+        old.c.content.label("old_content"),
+    )
+
+@traced
+async def set_document_path(
+    db: AsyncSession,
+    doc_id: int,
+    path: list[str],
+    value: Any,
+    owner: Optional[str] = None,
+    expected_versions: Optional[list[int]] = None,
+):
+    """
+    Устанавливает значение по пути на стороне БД (jsonb_set_deep)
+
+    Недостающие промежуточные ключи создаются. Изменение атомарно, поэтому
+    параллельные изменения разных путей одного документа не теряются
+
+    Args:
+        db: сессия базы данных
+        doc_id: идентификатор документа
+        path: список ключей пути
+        value: новое значение
+        owner: если задан, документ должен принадлежать этому пользователю
+        expected_versions: если заданы, текущая версия должна быть одной из них
+
+    Returns:
+        Row с полями обновлённого документа или None
+    """
+    new_content = func.jsonb_set_deep(
+        Document.content, literal(path, ARRAY(Text)), literal(value, JSONB), type_=JSONB
+    )
+    stmt, old = _guarded_update(doc_id, owner, expected_versions, _path_probe(path).label("probe"))
+    return await _guarded_write(
+        db, stmt.values(content=new_content),
+        lambda row: _set_path_patch(path, value, row.probe), old.c.probe,
+    )
 
-def delete_document(db: Session, doc_id: int) -> Optional[Document]:
+@traced
+async def delete_document_path(
+    db: AsyncSession,
+    doc_id: int,
+    path: list[str],
+    owner: Optional[str] = None,
+    expected_versions: Optional[list[int]] = None,
+) -> Optional[int]:
     """
-    Удаляет документ по ID.
+    Удаляет ключ по пути на стороне БД (content #- path)
 
     Args:
         db: сессия базы данных
         doc_id: идентификатор документа
+        path: список ключей пути
+        owner: если задан, документ должен принадлежать этому пользователю
+        expected_versions: если заданы, текущая версия должна быть одной из них
 
     Returns:
-        Optional[Document]: удалённый документ или None, если не найден
+        Optional[int]: новая версия документа или None, если изменение не выполнено
+    """
+    new_content = Document.content.op("#-", return_type=JSONB)(literal(path, ARRAY(Text)))
+    stmt, old = _guarded_update(doc_id, owner, expected_versions, _path_probe(path).label("probe"))
+    row = await _guarded_write(
+        db, stmt.values(content=new_content),
+        lambda row: _delete_path_patch(path, row.probe), old.c.probe, content=False,
+    )
+    return row.version if row is not None else None
+
+@traced
+async def update_document_content(
+    db: AsyncSession,
+    doc_id: int,
+    update_func: Callable[[Any], Any],
+    owner: Optional[str] = None,
+    expected_versions: Optional[list[int]] = None,
+) -> Optional[Document]:
     """
-    db_doc = get_document(db, doc_id)
-    if db_doc:
-        db.delete(db_doc)
-        db.commit()
+    Изменяет content функцией update_func в одной транзакции
+
+    Строка блокируется (SELECT ... FOR UPDATE), content читается один раз,
+    новый content записывается одним UPDATE и одним commit вместе с ревизией.
+    Если update_func выбрасывает исключение, транзакция откатывается
+    и документ не меняется. update_func не должна изменять content на месте,
+    иначе ревизия будет вычислена неверно
+
+    Args:
+        db: сессия базы данных
+        doc_id: идентификатор документа
+        update_func: функция, которая принимает текущий content
+                    и возвращает новый content
+        owner: если задан, документ должен принадлежать этому пользователю
+        expected_versions: если заданы, текущая версия должна быть одной из них
+
+    Returns:
+        Optional[Document]: обновлённый документ или None, если документ
+        не найден или не выполнено условие
+    """
+    stmt = select(Document.title, Document.content).where(Document.id == doc_id).with_for_update()
+    if owner is not None:
+        stmt = stmt.where(Document.owner == owner)
+    if expected_versions is not None:
+        stmt = stmt.where(Document.version.in_(expected_versions))
+    try:
+        row = (await db.execute(stmt)).one_or_none()
+        if row is None:
+            await db.rollback()
+            return None
+        new_content = update_func(row.content)
+    except Exception:
+        await db.rollback()
+        raise
+    stmt = (
+        update(Document)
+        .where(Document.id == doc_id)
+        .values(content=new_content, version=Document.version + 1)
+        .returning(Document)
+        .options(undefer(Document.content))
+    )
+    db_doc = (await db.execute(stmt)).scalar_one()
+    patch = json_diff.deep_diff(row.content, db_doc.content, format="patch")
+    await add_revisions(db, revision_rows(
+        db_doc.id, db_doc.version, db_doc.title, db_doc.content,
+        row.title, row.content, created_at=db_doc.created_at, patch=patch,
+    ))
+    await _notify(db, [encode_event("updated", db_doc.id, db_doc.owner, db_doc.version, db_doc.title, patch)])
+    await db.commit()
     return db_doc
 
-def update_all_documents(db: Session, update_func) -> None:
+@traced
+async def delete_document(db: AsyncSession, doc_id: int, owner: Optional[str] = None) -> bool:
+    """
+    Удаляет документ по ID одним запросом DELETE ... RETURNING
+
+    Args:
+        db: сессия базы данных
+        doc_id: идентификатор документа
+        owner: если задан, документ должен принадлежать этому пользователю
+
+    Returns:
+        bool: True, если документ удалён, False, если не найден
+        или принадлежит другому пользователю
+    """
+    stmt = delete(Document).where(Document.id == doc_id)
+    if owner is not None:
+        stmt = stmt.where(Document.owner == owner)
+    deleted = (await db.execute(stmt.returning(Document.id, Document.owner, Document.version))).one_or_none()
+    if deleted is not None:
+        await _notify(db, [encode_event("deleted", deleted.id, deleted.owner, deleted.version)])
+    await db.commit()
+    return deleted is not None
+
+@traced
+async def update_all_documents(db: AsyncSession, update_func, batch_size: int = 1000) -> None:
     """
     Применяет функцию update_func ко всем документам
 
-    Используется для массового обновления содержимого всех документов,
-    в периодической задаче для добавления новых данных из внешнего источника
+    Используется для массовых преобразований содержимого, которые нельзя
+    выразить в SQL. Документы читаются пачками по batch_size с пагинацией
+    по id, после каждой пачки выполняется commit вместе с ревизиями,
+    поэтому память процесса не зависит от размера таблицы. Для долгих
+    преобразований всей таблицы - задания app.services.transform_jobs:
+    несколько процессов и продолжение после сбоя
 
     Args:
         db: сессия базы данных
         update_func: функция, которая принимает текущий content
                     и возвращает новый content
+        batch_size: количество документов в одной транзакции
+    """
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(Document).options(undefer(Document.content))
+            .where(Document.id > last_id).order_by(Document.id).limit(batch_size)
+        )
+        documents = list(result.scalars())
+        if not documents:
+            break
+        revisions = []
+        events = []
+        for doc in documents:
+            # update_func может изменить словарь на месте, для ревизии нужна копия
+            old_content = copy.deepcopy(doc.content)
+            doc.content = update_func(doc.content)
+            flag_modified(doc, "content")
+            doc.version += 1
+            patch = json_diff.deep_diff(old_content, doc.content, format="patch")
+            revisions.extend(revision_rows(
+                doc.id, doc.version, doc.title, doc.content,
+                doc.title, old_content, created_at=doc.created_at, patch=patch,
+            ))
+            events.append(encode_event("updated", doc.id, doc.owner, doc.version, doc.title, patch))
+        await db.flush()
+        await add_revisions(db, revisions)
+        await _notify(db, events)
+        await db.commit()
+        last_id = documents[-1].id
+        db.expunge_all()
+
+_merge_batch = text("""
+    WITH batch AS (
+        SELECT id, content FROM documents
+        WHERE id > :last_id
+        ORDER BY id
+        LIMIT :batch_size
+        FOR UPDATE
+    ), updated AS (
+        UPDATE documents AS d
+        SET content = d.content || CAST(:payload AS jsonb),
+            version = d.version + 1,
+            updated_at = now()
+        FROM batch
+        WHERE d.id = batch.id
+          AND jsonb_typeof(d.content) = 'object'
+          AND d.content || CAST(:payload AS jsonb) <> d.content
+        RETURNING d.id, d.owner, d.version, d.title, d.content, d.created_at
+    ), revisions AS (
+        INSERT INTO document_revisions (document_id, version, title, created_at, snapshot, patch)
+        SELECT u.id, 1, u.title, u.created_at, batch.content, NULL
+        FROM updated AS u JOIN batch ON batch.id = u.id
+        WHERE u.version = 2
+        UNION ALL
+        SELECT u.id, u.version, u.title, now(),
+               CASE WHEN u.version % :snapshot_every = 0 THEN u.content END,
+               CASE WHEN u.version % :snapshot_every <> 0 THEN CAST(:patch AS jsonb) END
+        FROM updated AS u
+    ), events AS (
+        SELECT jsonb_build_object(
+            'type', 'merged', 'id', u.id, 'owner', u.owner, 'version', u.version,
+            'title', u.title, 'patch', CAST(:patch AS jsonb)
+        ) AS event
+        FROM updated AS u
+    ), notified AS (
+        SELECT pg_notify(:channel, CASE
+            WHEN octet_length(event::text) <= :max_payload THEN event::text
+            ELSE (event - 'patch' || '{"patch_omitted": true}')::text
+        END)
+        FROM events
+    )
+    SELECT (SELECT max(id) FROM batch) AS last_id,
+           (SELECT count(*) FROM updated) AS updated,
+           (SELECT count(*) FROM notified) AS notified
+""").bindparams(bindparam("payload", type_=JSONB), bindparam("patch", type_=JSONB))
+
+@traced
+async def merge_into_all_documents(
+    db: AsyncSession, payload: dict, batch_size: int = 1000, start_after: int = 0
+) -> int:
+    """
+    Добавляет/перезаписывает ключи payload в корне content всех документов
+
+    Слияние выполняется на стороне БД (content || payload) пачками по id
+    с commit после каждой пачки. Документы, которые слияние не меняет,
+    не перезаписываются. Ревизия каждого изменённого документа записывается
+    тем же запросом: её патч - операции add ключей payload в корень.
+    Событие merged с тем же патчем отправляется в ленту изменений
+
+    Args:
+        db: сессия базы данных
+        payload: словарь, ключи которого добавляются в каждый документ
+        batch_size: количество документов в одной транзакции
+        start_after: обрабатываются только документы с id больше этого значения
+
+    Returns:
+        int: количество изменённых документов
     """
-    documents = db.query(Document).all()
-    for doc in documents:
-        doc.content = update_func(doc.content)
-    db.commit()
\ No newline at end of file
+    patch = [
+        {"op": "add", "path": format_pointer((key,)), "value": value}
+        for key, value in payload.items()
+    ]
+    params = {
+        "batch_size": batch_size,
+        "payload": payload,
+        "patch": patch,
+        "snapshot_every": settings.REVISION_SNAPSHOT_EVERY,
+        "channel": CHANNEL,
+        "max_payload": MAX_PAYLOAD_BYTES,
+    }
+    last_id = start_after
+    total = 0
+    while True:
+        row = (await db.execute(_merge_batch, {**params, "last_id": last_id})).one()
+        await db.commit()
+        if row.last_id is None:
+            break
+        last_id = row.last_id
+        total += row.updated
+    return total
@@ -0,0 +1,168 @@
+"""
+CRUD операции для ревизий документов
+
+Ревизия N хранит JSON Patch от ревизии N-1, а каждая
+REVISION_SNAPSHOT_EVERY-я - полный снимок content. Поэтому восстановление
+любой ревизии читает один снимок и не больше REVISION_SNAPSHOT_EVERY - 1
+патчей после него.
+
+Ревизия 1 записывается лениво, при первом изменении документа: пока
+документ не менялся, его единственная ревизия - сама строка documents
+"""
+
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.tracing import traced
+from app.models.revision import DocumentRevision
+from app.services import json_diff, json_patch
+
+def revision_rows(
+    doc_id: int,
+    version: int,
+    title: str,
+    content: Any,
+    old_title: str,
+    old_content: Any,
+    created_at: Optional[datetime] = None,
+    patch: Optional[list] = None,
+    with_first: bool = True,
+) -> list[dict]:
+    """
+    Строки ревизий для изменения документа до версии version
+
+    Args:
+        doc_id: идентификатор документа
+        version: новая версия документа
+        title, content: новые заголовок и содержимое; content нужен
+                        только для ревизии-снимка
+        old_title, old_content: заголовок и содержимое до изменения
+        created_at: время создания документа, нужно для ревизии 1
+        patch: готовый JSON Patch от old_content к content,
+               если не задан - вычисляется сравнением
+        with_first: записать ревизию 1 при version == 2; False, если
+                    вызывающий уже записал её сам
+
+    Returns:
+        list[dict]: значения для insert(DocumentRevision)
+    """
+    rows = []
+    if version == 2 and with_first:
+        rows.append({
+            "document_id": doc_id, "version": 1, "title": old_title,
+            "created_at": created_at or func.now(), "snapshot": old_content, "patch": None,
+        })
+    row = {"document_id": doc_id, "version": version, "title": title, "created_at": func.now()}
+    if version % settings.REVISION_SNAPSHOT_EVERY == 0:
+        row.update(snapshot=content, patch=None)
+    else:
+        if patch is None:
+            patch = json_diff.deep_diff(old_content, content, format="patch")
+        row.update(snapshot=None, patch=patch)
+    rows.append(row)
+    return rows
+
+@traced
+async def add_revisions(db: AsyncSession, rows: list[dict]) -> None:
+    """Записывает ревизии одним многострочным INSERT, commit выполняет вызывающий"""
+    if rows:
+        await db.execute(insert(DocumentRevision).values(rows))
+
+@traced
+async def get_revision_at(db: AsyncSession, doc_id: int, as_of: datetime) -> Optional[int]:
+    """
+    Номер последней сохранённой ревизии, созданной не позже as_of
+
+    Returns:
+        Optional[int]: номер ревизии или None, если таких ревизий нет
+    """
+    return await db.scalar(
+        select(func.max(DocumentRevision.version))
+        .where(DocumentRevision.document_id == doc_id, DocumentRevision.created_at <= as_of)
+    )
+
+@traced
+async def get_document_revision(db: AsyncSession, doc_id: int, version: int) -> Optional[dict]:
+    """
+    Восстанавливает документ в состоянии ревизии version
+
+    Одним запросом читаются ближайший снимок не новее version и патчи
+    после него, патчи применяются по порядку
+
+    Args:
+        db: сессия базы данных
+        doc_id: идентификатор документа
+        version: номер ревизии
+
+    Returns:
+        Optional[dict]: version, title, content и created_at ревизии
+        или None, если ревизия не сохранена
+    """
+    base = (
+        select(func.max(DocumentRevision.version))
+        .where(
+            DocumentRevision.document_id == doc_id,
+            DocumentRevision.version <= version,
+            DocumentRevision.snapshot.isnot(None),
+        )
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(
+            DocumentRevision.version, DocumentRevision.title, DocumentRevision.created_at,
+            DocumentRevision.snapshot, DocumentRevision.patch,
+        )
+        .where(
+            DocumentRevision.document_id == doc_id,
+            DocumentRevision.version <= version,
+            DocumentRevision.version >= base,
+        )
+        .order_by(DocumentRevision.version)
+    )
+    rows = list(result)
+    if not rows or rows[-1].version != version or len(rows) != version - rows[0].version + 1:
+        return None
+    content = rows[0].snapshot
+    for row in rows[1:]:
+        content = json_patch.apply_patch(content, row.patch)
+    last = rows[-1]
+    return {"version": last.version, "title": last.title, "content": content, "created_at": last.created_at}
+
+@traced
+async def get_revisions(
+    db: AsyncSession, doc_id: int, before: Optional[int] = None, limit: int = 100
+) -> list:
+    """
+    Страница сохранённых ревизий документа, от новых к старым
+
+    Args:
+        db: сессия базы данных
+        doc_id: идентификатор документа
+        before: номер последней ревизии предыдущей страницы
+        limit: максимальное количество записей
+
+    Returns:
+        list: строки с полями version, title, created_at, snapshot (bool)
+        и size - размер хранимого снимка или патча в байтах
+    """
+    stmt = (
+        select(
+            DocumentRevision.version,
+            DocumentRevision.title,
+            DocumentRevision.created_at,
+            DocumentRevision.snapshot.isnot(None).label("snapshot"),
+            func.pg_column_size(
+                func.coalesce(DocumentRevision.snapshot, DocumentRevision.patch)
+            ).label("size"),
+        )
+        .where(DocumentRevision.document_id == doc_id)
+        .order_by(DocumentRevision.version.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        stmt = stmt.where(DocumentRevision.version < before)
+    result = await db.execute(stmt)
+    return list(result)
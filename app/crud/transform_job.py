@@ -0,0 +1,83 @@
+"""
+Чтение прогресса заданий массового преобразования
+
+Запрос и расчёт прогресса общие для эндпоинтов (асинхронная сессия)
+и исполнителя заданий app.services.transform_jobs (синхронная сессия)
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Optional
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.tracing import traced
+from app.models.transform_job import TransformJob, TransformJobRange
+
+def progress_query(job_id: Optional[int] = None):
+    """Задания с суммами по диапазонам, от новых к старым"""
+    stmt = (
+        select(
+            TransformJob,
+            func.count().label("ranges"),
+            func.count().filter(TransformJobRange.done).label("ranges_done"),
+            func.coalesce(func.sum(TransformJobRange.total), 0).label("total"),
+            func.coalesce(func.sum(TransformJobRange.processed), 0).label("processed"),
+            func.coalesce(func.sum(TransformJobRange.changed), 0).label("changed"),
+        )
+        .outerjoin(TransformJobRange, TransformJobRange.job_id == TransformJob.id)
+        .group_by(TransformJob.id)
+        .order_by(TransformJob.id.desc())
+    )
+    if job_id is not None:
+        stmt = stmt.where(TransformJob.id == job_id)
+    return stmt
+
+def job_progress(row) -> dict[str, Any]:
+    """
+    Прогресс задания по строке progress_query
+
+    Скорость считается по последнему запуску: документы, обработанные
+    с его начала, делённые на прошедшее время. Оставшееся время - по числу
+    документов при создании задания, поэтому удалённые за время работы
+    документы делают оценку завышенной
+    """
+    job = row.TransformJob
+    result = {
+        "id": job.id,
+        "transform": job.transform,
+        "owner": job.owner,
+        "status": job.status,
+        "batch_size": job.batch_size,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "error": job.error,
+        "ranges": row.ranges,
+        "ranges_done": row.ranges_done,
+        "total": row.total,
+        "processed": row.processed,
+        "changed": row.changed,
+        "docs_per_sec": None,
+        "eta_seconds": None,
+    }
+    if job.started_at is not None:
+        until = job.finished_at if job.status != "running" and job.finished_at else datetime.now(timezone.utc)
+        elapsed = (until - job.started_at).total_seconds()
+        done = row.processed - job.started_processed
+        if elapsed > 0 and done > 0:
+            rate = done / elapsed
+            result["docs_per_sec"] = round(rate, 1)
+            if job.status == "running":
+                result["eta_seconds"] = round(max(row.total - row.processed, 0) / rate, 1)
+    return result
+
+@traced
+async def get_job_progress(db: AsyncSession, job_id: int) -> Optional[dict]:
+    """Прогресс задания или None, если задания нет"""
+    row = (await db.execute(progress_query(job_id))).one_or_none()
+    return job_progress(row) if row is not None else None
+
+@traced
+async def get_jobs_progress(db: AsyncSession, limit: int = 50) -> list[dict]:
+    """Прогресс последних limit заданий, от новых к старым"""
+    result = await db.execute(progress_query().limit(limit))
+    return [job_progress(row) for row in result]
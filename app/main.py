@@ -1,14 +1,35 @@
-from fastapi import FastAPI
-from app.api.v1.endpoints import auth, documents, health
+from fastapi import FastAPI, Response
+from app.api.v1.endpoints import auth, debug, documents, health, jobs
+from app.core import metrics, profiling
 from app.core.config import settings
-from app.services.periodic_task import start_scheduler
+from app.core.database import async_engine
+from app.core.events import change_feed
+from app.services.periodic_task import start_scheduler, stop_scheduler
 
 app = FastAPI(title="Document Service")
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(documents.router, prefix="/api/v1/documents", tags=["documents"])
 app.include_router(health.router, prefix="/api/v1/health", tags=["health"])
+app.include_router(debug.router, prefix="/api/v1/debug", tags=["debug"])
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Метрики в текстовом формате Prometheus"""
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
 
 @app.on_event("startup")
 async def startup_event():
-    start_scheduler()
\ No newline at end of file
+    start_scheduler()
+    health.start_count_refresher()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await health.stop_count_refresher()
+    await stop_scheduler()
+    await change_feed.close()
+    await async_engine.dispose()
\ No newline at end of file
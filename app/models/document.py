@@ -1,15 +1,57 @@
 """Модель документа"""
 
-from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey
+import hashlib
+import re
+from sqlalchemy import Column, Computed, Index, Integer, String, DateTime, ForeignKey, Text, literal
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.core.database import Base
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # Постраничный вывод документов владельца по id
+        Index("ix_documents_owner", "owner", "id"),
+        # Поиск по содержимому: @>, ? и @? (класс операторов jsonb_ops)
+        Index("ix_documents_content", "content", postgresql_using="gin"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    content = Column(JSON)
-    owner = Column(String, index=True)
+    # Загружается только явно (undefer), обращение к незагруженному content - ошибка
+    content = deferred(Column(JSONB), raiseload=True)
+    owner = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Увеличивается при каждом изменении, используется для If-Match
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Отпечаток содержимого, вычисляется БД при каждой записи content
+    content_hash = Column(String(32), Computed("md5(content::text)", persisted=True))
+    # Размер content в байтах JSON, позволяет решать без загрузки content
+    content_size = Column(Integer, Computed("octet_length(content::text)", persisted=True))
+
+# Часто запрашиваемые пути: по каждому строится B-tree индекс по выражению
+# content #> path, которым планировщик проверяет равенство точнее, чем GIN.
+# После добавления пути: alembic revision --autogenerate -m "index path ..."
+INDEXED_PATHS: tuple[tuple[str, ...], ...] = ()
+
+def path_expression(path: tuple[str, ...]):
+    """
+    content #> path с путём в тексте запроса, а не в параметре
+
+    Только так выражение совпадает с индексом и при общем плане
+    подготовленного запроса
+    """
+    return Document.content.op("#>", return_type=JSONB)(
+        literal(list(path), ARRAY(Text), literal_execute=True)
+    )
+
+def path_index_name(path: tuple[str, ...]) -> str:
+    """Имя индекса по пути, не длиннее 63 символов"""
+    dotted = ".".join(path)
+    slug = re.sub(r"[^a-z0-9]+", "_", dotted.lower()).strip("_")[:32]
+    return f"ix_documents_path_{slug}_{hashlib.md5(dotted.encode()).hexdigest()[:8]}"
+
+for indexed_path in INDEXED_PATHS:
+    Index(path_index_name(indexed_path), path_expression(indexed_path))
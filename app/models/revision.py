@@ -0,0 +1,28 @@
+"""Модель ревизии документа"""
+
+from sqlalchemy import CheckConstraint, Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class DocumentRevision(Base):
+    """
+    Ревизия содержимого документа
+
+    Номер ревизии совпадает с версией документа. Ревизия хранит либо полный
+    снимок content, либо JSON Patch (RFC 6902) от предыдущей ревизии
+    """
+    __tablename__ = "document_revisions"
+    __table_args__ = (
+        CheckConstraint(
+            "(snapshot IS NULL) <> (patch IS NULL)", name="ck_document_revisions_snapshot_or_patch"
+        ),
+    )
+
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, primary_key=True)
+    title = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # None записывается как NULL, а не как JSON null: заполнено ровно одно поле
+    snapshot = Column(JSONB(none_as_null=True))
+    patch = Column(JSONB(none_as_null=True))
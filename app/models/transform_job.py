@@ -0,0 +1,48 @@
+"""Модели задания массового преобразования документов и его диапазонов"""
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class TransformJob(Base):
+    """
+    Задание массового преобразования content функцией transform
+
+    Документы задания делятся на диапазоны id, прогресс хранится в диапазонах.
+    started_at и started_processed относятся к последнему запуску и нужны
+    для расчёта скорости и оставшегося времени
+    """
+    __tablename__ = "transform_jobs"
+
+    id = Column(Integer, primary_key=True)
+    # Путь к функции вида "module:function"
+    transform = Column(String, nullable=False)
+    # Только документы этого владельца, NULL - все
+    owner = Column(String)
+    status = Column(String, nullable=False, default="pending", server_default="pending")
+    batch_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    started_processed = Column(Integer, nullable=False, default=0, server_default="0")
+    finished_at = Column(DateTime(timezone=True))
+    error = Column(Text)
+
+class TransformJobRange(Base):
+    """
+    Диапазон id документов задания [start_id, end_id]
+
+    last_id - контрольная точка: документы до него включительно обработаны.
+    Она сдвигается в той же транзакции, что и запись пачки документов
+    """
+    __tablename__ = "transform_job_ranges"
+
+    job_id = Column(Integer, ForeignKey("transform_jobs.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    start_id = Column(Integer, nullable=False)
+    end_id = Column(Integer, nullable=False)
+    last_id = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=False)
+    processed = Column(Integer, nullable=False, default=0, server_default="0")
+    changed = Column(Integer, nullable=False, default=0, server_default="0")
+    done = Column(Boolean, nullable=False, default=False, server_default="false")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
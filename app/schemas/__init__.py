@@ -3,5 +3,12 @@ from .document import (
     DocumentCreate,
     DocumentUpdate,
     DocumentInDB,
+    DocumentPage,
+    RevisionInfo,
+    RevisionPage,
+    BulkImportResult,
+    BatchGetItem,
+    BatchGetRequest,
     PathOperation,
+    JsonPatchOperation,
 )
\ No newline at end of file
@@ -1,7 +1,7 @@
 """Схемы документа"""
 
-from pydantic import BaseModel, ConfigDict
-from typing import Any, Dict, Optional
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime
 
 class DocumentBase(BaseModel):
@@ -23,6 +23,8 @@ class DocumentInDB(DocumentBase):
     owner: str
     created_at: datetime
     updated_at: Optional[datetime] = None
+    version: int
+    content_size: Optional[int] = None
 
     model_config = ConfigDict(
         from_attributes=True,
@@ -31,6 +33,63 @@ class DocumentInDB(DocumentBase):
         }
     )
 
+class DocumentPage(BaseModel):
+    """Страница списка документов"""
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[int] = None
+
+class RevisionInfo(BaseModel):
+    """Сохранённая ревизия документа"""
+    version: int
+    title: Optional[str] = None
+    created_at: Optional[datetime] = None
+    snapshot: bool
+    size: Optional[int] = None
+
+class RevisionPage(BaseModel):
+    """Страница списка ревизий, от новых к старым"""
+    items: List[RevisionInfo]
+    next_cursor: Optional[int] = None
+
+class BulkLineError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    """Итог загрузки NDJSON"""
+    inserted: int
+    failed: int
+    errors: List[BulkLineError]
+    errors_truncated: bool = False
+
+class BatchGetItem(BaseModel):
+    """Документ пакетного чтения: целиком или только части по путям"""
+    id: int
+    paths: Optional[List[str]] = None
+
+class BatchGetRequest(BaseModel):
+    items: List[BatchGetItem] = Field(..., min_length=1)
+
 class PathOperation(BaseModel):
     path: str
-    value: Any
\ No newline at end of file
+    value: Any
+
+class JsonPatchOperation(BaseModel):
+    """Операция JSON Patch (RFC 6902)"""
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str
+    value: Any = None
+    from_: Optional[str] = Field(None, alias="from")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    @model_validator(mode="after")
+    def check_members(self):
+        if self.op in ("add", "replace", "test") and "value" not in self.model_fields_set:
+            raise ValueError(f"'{self.op}' operation requires 'value'")
+        if self.op in ("move", "copy") and self.from_ is None:
+            raise ValueError(f"'{self.op}' operation requires 'from'")
+        return self
+
+    def as_dict(self) -> dict:
+        return self.model_dump(by_alias=True, exclude_unset=True)
@@ -1,30 +1,178 @@
-from typing import Dict, Any
+"""
+Сравнение JSON-документов
 
-def deep_diff(obj1: Dict, obj2: Dict, path: str = "") -> Dict:
+Обход итеративный, поэтому глубина документа не ограничена стеком вызовов.
+Перед спуском в пару узлов проверяется, не равны ли они. Общий узел
+(json_patch разделяет неизменённые поддеревья между версиями) узнаётся
+по идентичности за O(1). Остальные пары сравниваются на уровне C и затем
+строго, с учётом типов (true, 1 и 1.0 разные значения), то есть
+за O(размера поддерева): равные, но не общие ветви обходятся целиком.
+Хэши поддеревьев нужны для сопоставления элементов списков и для быстрого
+отказа - разные хэши означают различие. Совпадение хэшей равенства
+не доказывает, оно всегда подтверждается сравнением.
+"""
+
+from difflib import SequenceMatcher
+from typing import Any, Dict, Union
+
+from app.core.tracing import traced
+from app.services.json_patch import format_pointer, strict_equal
+
+def _subtree_hashes(root: Any, memo: dict[int, int]) -> None:
+    """Заполняет memo хэшами всех контейнеров дерева root (ключ - id узла)"""
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        if not isinstance(node, (dict, list)) or id(node) in memo:
+            continue
+        if ready:
+            if isinstance(node, dict):
+                memo[id(node)] = hash(("dict", frozenset(
+                    (key, _hash_of(value, memo)) for key, value in node.items()
+                )))
+            else:
+                memo[id(node)] = hash(("list", tuple(_hash_of(value, memo) for value in node)))
+            continue
+        stack.append((node, True))
+        children = node.values() if isinstance(node, dict) else node
+        for child in children:
+            if isinstance(child, (dict, list)) and id(child) not in memo:
+                stack.append((child, False))
+
+def _hash_of(value: Any, memo: dict[int, int]) -> int:
+    if isinstance(value, (dict, list)):
+        if id(value) not in memo:
+            _subtree_hashes(value, memo)
+        return memo[id(value)]
+    # Тип входит в хэш, чтобы true и 1 считались разными значениями
+    return hash((type(value).__name__, value))
+
+def _same(old: Any, new: Any, memo: dict[int, int]) -> bool:
     """
-    Сравнивает два словаря, возвращает структуру с added, removed, changed.
+    Одинаковы ли поддеревья
+
+    Общие узлы (после json_patch они разделяются между версиями) сравниваются
+    за O(1). Разные типы, разные хэши и неравенство на уровне C означают
+    различие сразу, равенство контейнеров подтверждается строгим сравнением
     """
+    if old is new:
+        return True
+    if type(old) is not type(new):
+        return False
+    if not isinstance(old, (dict, list)):
+        return old == new
+    if id(old) in memo and id(new) in memo and memo[id(old)] != memo[id(new)]:
+        return False
+    try:
+        if old != new:
+            return False
+    except RecursionError:
+        # Слишком глубокие деревья сравниваются только итеративно
+        pass
+    return strict_equal(old, new)
+
+def _list_opcodes(old: list, new: list, memo: dict[int, int]):
+    matcher = SequenceMatcher(
+        None,
+        [_hash_of(value, memo) for value in old],
+        [_hash_of(value, memo) for value in new],
+        autojunk=False,
+    )
+    return matcher.get_opcodes()
+
+def _join(prefix: str, key: Any) -> str:
+    return f"{prefix}.{key}" if prefix else str(key)
+
+def _diff_paths(obj1: Any, obj2: Any, path: str, memo: dict[int, int]) -> Dict:
     diff = {"added": {}, "removed": {}, "changed": {}}
-    keys1 = set(obj1.keys())
-    keys2 = set(obj2.keys())
-
-    for key in keys1 - keys2:
-        full_path = f"{path}.{key}" if path else key
-        diff["removed"][full_path] = obj1[key]
-
-    for key in keys2 - keys1:
-        full_path = f"{path}.{key}" if path else key
-        diff["added"][full_path] = obj2[key]
-
-    for key in keys1 & keys2:
-        full_path = f"{path}.{key}" if path else key
-        if isinstance(obj1[key], dict) and isinstance(obj2[key], dict):
-            sub_diff = deep_diff(obj1[key], obj2[key], full_path)
-            # объединяем поддиффы
-            diff["added"].update(sub_diff["added"])
-            diff["removed"].update(sub_diff["removed"])
-            diff["changed"].update(sub_diff["changed"])
-        elif obj1[key] != obj2[key]:
-            diff["changed"][full_path] = {"old": obj1[key], "new": obj2[key]}
-
-    return diff
\ No newline at end of file
+    stack = [(obj1, obj2, path)]
+    while stack:
+        old, new, prefix = stack.pop()
+        if _same(old, new, memo):
+            continue
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key in old:
+                if key not in new:
+                    diff["removed"][_join(prefix, key)] = old[key]
+            for key in new:
+                if key not in old:
+                    diff["added"][_join(prefix, key)] = new[key]
+                else:
+                    stack.append((old[key], new[key], _join(prefix, key)))
+        elif isinstance(old, list) and isinstance(new, list):
+            for tag, i1, i2, j1, j2 in _list_opcodes(old, new, memo):
+                # Элементы с равными хэшами сравниваются попарно: хэши могли совпасть
+                pairs = min(i2 - i1, j2 - j1) if tag in ("replace", "equal") else 0
+                for t in range(pairs):
+                    stack.append((old[i1 + t], new[j1 + t], _join(prefix, j1 + t)))
+                for i in range(i1 + pairs, i2):
+                    diff["removed"][_join(prefix, i)] = old[i]
+                for j in range(j1 + pairs, j2):
+                    diff["added"][_join(prefix, j)] = new[j]
+        else:
+            diff["changed"][prefix] = {"old": old, "new": new}
+    return diff
+
+def _diff_patch(obj1: Any, obj2: Any, memo: dict[int, int]) -> list[dict]:
+    """
+    Операции RFC 6902, переводящие obj1 в obj2
+
+    Стек содержит задания двух видов: ("emit", операция) и ("diff", old, new, путь).
+    Задания кладутся в обратном порядке, чтобы операции выходили в порядке
+    применения. Изменения списка идут с конца, поэтому индексы более ранних
+    операций остаются верными
+    """
+    operations = []
+    stack = [("diff", obj1, obj2, ())]
+    while stack:
+        task = stack.pop()
+        if task[0] == "emit":
+            operations.append(task[1])
+            continue
+        _, old, new, tokens = task
+        if _same(old, new, memo):
+            continue
+        tasks = []
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key in old:
+                if key not in new:
+                    tasks.append(("emit", {"op": "remove", "path": format_pointer(tokens + (key,))}))
+            for key in new:
+                if key not in old:
+                    tasks.append(("emit", {"op": "add", "path": format_pointer(tokens + (key,)), "value": new[key]}))
+                else:
+                    tasks.append(("diff", old[key], new[key], tokens + (key,)))
+        elif isinstance(old, list) and isinstance(new, list):
+            for tag, i1, i2, j1, j2 in reversed(_list_opcodes(old, new, memo)):
+                pairs = min(i2 - i1, j2 - j1) if tag in ("replace", "equal") else 0
+                for i in range(i2 - 1, i1 + pairs - 1, -1):
+                    tasks.append(("emit", {"op": "remove", "path": format_pointer(tokens + (i,))}))
+                for t in range(pairs, j2 - j1):
+                    tasks.append(("emit", {
+                        "op": "add", "path": format_pointer(tokens + (i1 + t,)), "value": new[j1 + t],
+                    }))
+                for t in range(pairs):
+                    tasks.append(("diff", old[i1 + t], new[j1 + t], tokens + (i1 + t,)))
+        else:
+            tasks.append(("emit", {"op": "replace", "path": format_pointer(tokens), "value": new}))
+        stack.extend(reversed(tasks))
+    return operations
+
+@traced
+def deep_diff(obj1: Dict, obj2: Dict, path: str = "", format: str = "paths") -> Union[Dict, list]:
+    """
+    Сравнивает два словаря
+
+    Args:
+        obj1: исходный документ
+        obj2: новый документ
+        path: префикс путей в результате
+        format: "paths" - структура с added, removed, changed по точечным путям,
+                "patch" - список операций JSON Patch (RFC 6902)
+    """
+    # Хэши поддеревьев считаются лениво - только для элементов различающихся списков,
+    # и служат для сопоставления элементов, а не для проверки равенства
+    memo: dict[int, int] = {}
+    if format == "patch":
+        return _diff_patch(obj1, obj2, memo)
+    return _diff_paths(obj1, obj2, path, memo)
@@ -1,21 +1,365 @@
-import dpath.util
+"""
+Работа с частями документа по точечному пути
 
-def get_value_by_path(data: dict, path: str):
-    """Извлечение значения по точечному пути"""
-    try:
-        return dpath.util.get(data, path, separator=".")
-    except KeyError:
+Путь разбирается один раз и кэшируется в ограниченном LRU. Ключи разделяются
+точкой, точку внутри ключа экранируют обратной косой чертой (a\\.b.c),
+элементы списков адресуются индексом (items.0.name). Точечный путь
+понимает индексы так же, как операторы PostgreSQL (#>, jsonb_set, #-),
+в том числе отрицательные (items.-1 - последний элемент). В JSON Pointer
+индекс - только неотрицательное число из цифр ASCII (RFC 6901).
+
+Изменяющие функции не трогают исходный документ: копируются только узлы
+вдоль изменяемого пути, остальные поддеревья переиспользуются.
+На тех же примитивах построено применение JSON Patch (RFC 6902).
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Optional
+
+import orjson
+
+from app.core.tracing import traced
+
+PATH_CACHE_SIZE = 4096
+
+_MISSING = object()
+
+# Индекс списка в пути #>: strtol с пробелами в начале и знаком, в пределах int4
+_PG_INDEX = re.compile(r"[ \t\n\v\f\r]*[+-]?[0-9]+")
+_PG_INT_MIN, _PG_INT_MAX = -2**31, 2**31 - 1
+
+class PathError(ValueError):
+    """Путь не может быть применён к документу"""
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def parse_path(path: str) -> tuple[str, ...]:
+    """Разбирает точечный путь в кортеж ключей с учётом экранирования"""
+    if "\\" not in path:
+        return tuple(path.split("."))
+    keys = []
+    buf = []
+    escaped = False
+    for ch in path:
+        if escaped:
+            buf.append(ch)
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == ".":
+            keys.append("".join(buf))
+            buf = []
+        else:
+            buf.append(ch)
+    if escaped:
+        buf.append("\\")
+    keys.append("".join(buf))
+    return tuple(keys)
+
+def split_path(path: str) -> list[str]:
+    """Разбивает точечный путь на ключи, например для JSONB-оператора #>"""
+    return list(parse_path(path))
+
+def _pg_int(key: str) -> Optional[int]:
+    """Ключ пути как целое число так, как его разбирает PostgreSQL, или None"""
+    if not _PG_INDEX.fullmatch(key):
         return None
+    index = int(key)
+    return index if _PG_INT_MIN <= index <= _PG_INT_MAX else None
+
+def _path_index(key: str, length: int) -> Optional[int]:
+    """Позиция элемента списка длины length по ключу пути, как её находит #>"""
+    index = _pg_int(key)
+    if index is None:
+        return None
+    if index < 0:
+        index += length
+    return index if 0 <= index < length else None
+
+def _path_position(key: str, length: int) -> int:
+    """
+    Позиция в списке длины length для записи по ключу пути, как у jsonb_set и #-
+
+    Отрицательный индекс считается с конца, результат может выйти за пределы списка
+    """
+    index = _pg_int(key)
+    if index is None:
+        raise PathError(f"List index expected, got {key!r}")
+    return index + length if index < 0 else index
+
+def _path_child(node: Any, key: str) -> Any:
+    if isinstance(node, dict):
+        return node.get(key, _MISSING)
+    if isinstance(node, list):
+        index = _path_index(key, len(node))
+        if index is not None:
+            return node[index]
+    return _MISSING
+
+def _with_child(node: Any, key, child: Any) -> Any:
+    """Копия узла node, в которой по ключу key лежит child, в списке key - позиция"""
+    if isinstance(node, dict):
+        new = dict(node)
+        new[key] = child
+        return new
+    if isinstance(node, list):
+        new = list(node)
+        if key < 0:
+            new.insert(0, child)
+        elif key < len(new):
+            new[key] = child
+        else:
+            new.append(child)
+        return new
+    # Отсутствующий или скалярный узел заменяется новым объектом
+    return {key: child}
+
+def get_value_by_path_keys(data: Any, keys: tuple[str, ...], default: Any = None) -> Any:
+    """
+    Извлечение значения по уже разобранному пути, default если пути нет
+
+    Результат совпадает с content #> keys. Значение null по существующему
+    пути отличается от отсутствующего пути только при default, отличном от None
+    """
+    node = data
+    for key in keys:
+        node = _path_child(node, key)
+        if node is _MISSING:
+            return default
+    return node
+
+def get_value_by_path(data: dict, path: str, default: Any = None):
+    """Извлечение значения по точечному пути"""
+    return get_value_by_path_keys(data, parse_path(path), default)
+
+def set_value_by_path_keys(data: Any, keys: tuple[str, ...], value: Any) -> Any:
+    """
+    Установка значения по уже разобранному пути, возвращает новый корень
+
+    Индексы списков понимаются как в jsonb_set: отрицательный считается с конца,
+    за пределами списка элемент добавляется в конец (отрицательный - в начало)
+
+    Raises:
+        PathError: если ключ списка не является целым числом
+    """
+    parents = []
+    node = data
+    for key in keys:
+        if isinstance(node, list):
+            key = _path_position(key, len(node))
+            child = node[key] if 0 <= key < len(node) else _MISSING
+        else:
+            child = node.get(key, _MISSING) if isinstance(node, dict) else _MISSING
+        parents.append((node, key))
+        node = child
+    new = value
+    for parent, key in reversed(parents):
+        new = _with_child(parent, key, new)
+    return new
 
 def set_value_by_path(data: dict, path: str, value):
-    """Установка значения по пути, создаёт промежуточные ключи"""
-    dpath.util.new(data, path, value, separator=".")
-    return data
+    """Установка значения по пути, создаёт промежуточные ключи. Возвращает новый документ"""
+    return set_value_by_path_keys(data, parse_path(path), value)
+
+def delete_value_by_path_keys(data: Any, keys: tuple[str, ...]) -> Any:
+    """
+    Удаление по уже разобранному пути, возвращает новый корень или data, если пути нет
+
+    Индексы списков понимаются как в операторе #-
+
+    Raises:
+        PathError: если ключ списка не является целым числом
+    """
+    parents = []
+    node = data
+    for key in keys:
+        if isinstance(node, list):
+            key = _path_position(key, len(node))
+            child = node[key] if 0 <= key < len(node) else _MISSING
+        elif isinstance(node, dict):
+            child = node.get(key, _MISSING)
+        else:
+            return data
+        if child is _MISSING:
+            return data
+        parents.append((node, key))
+        node = child
+    if not parents:
+        return data
+    parent, last = parents.pop()
+    if isinstance(parent, dict):
+        new = dict(parent)
+        del new[last]
+    else:
+        new = parent[:last] + parent[last + 1:]
+    for parent, key in reversed(parents):
+        new = _with_child(parent, key, new)
+    return new
 
 def delete_value_by_path(data: dict, path: str):
-    """Удаление ключа по пути"""
+    """Удаление ключа по пути. Возвращает новый документ"""
+    return delete_value_by_path_keys(data, parse_path(path))
+
+def strict_equal(old: Any, new: Any) -> bool:
+    """Строгое структурное равенство JSON-значений: типы должны совпадать, true != 1 != 1.0"""
     try:
-        dpath.util.delete(data, path, separator=".")
-    except KeyError:
+        # orjson пишет true, 1 и 1.0 по-разному, а ключи сортирует
+        return orjson.dumps(old, option=orjson.OPT_SORT_KEYS) == orjson.dumps(new, option=orjson.OPT_SORT_KEYS)
+    except orjson.JSONEncodeError:
+        # Вложенность глубже предела orjson или целые вне 64 бит
         pass
-    return data
\ No newline at end of file
+    stack = [(old, new)]
+    while stack:
+        a, b = stack.pop()
+        if a is b:
+            continue
+        if type(a) is not type(b):
+            return False
+        if isinstance(a, dict):
+            if a.keys() != b.keys():
+                return False
+            stack.extend((value, b[key]) for key, value in a.items())
+        elif isinstance(a, list):
+            if len(a) != len(b):
+                return False
+            stack.extend(zip(a, b))
+        elif a != b:
+            return False
+    return True
+
+class PatchError(PathError):
+    """Операция JSON Patch не может быть применена к документу"""
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def parse_pointer(pointer: str) -> tuple[str, ...]:
+    """Разбирает JSON Pointer (RFC 6901) в кортеж ключей"""
+    if pointer == "":
+        return ()
+    if not pointer.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer {pointer!r}")
+    return tuple(token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/"))
+
+def format_pointer(keys) -> str:
+    """Собирает JSON Pointer (RFC 6901) из последовательности ключей"""
+    return "".join("/" + str(key).replace("~", "~0").replace("/", "~1") for key in keys)
+
+def _list_index(key: str) -> int:
+    """Индекс списка в JSON Pointer: только цифры ASCII, отрицательных RFC 6901 не допускает"""
+    if not (key.isascii() and key.isdigit()):
+        raise PatchError(f"Invalid list index {key!r}")
+    return int(key)
+
+def _child(node: Any, key: str) -> Any:
+    if isinstance(node, dict):
+        return node.get(key, _MISSING)
+    if isinstance(node, list):
+        index = _list_index(key)
+        if index < len(node):
+            return node[index]
+    return _MISSING
+
+def _get_strict(data: Any, keys: tuple[str, ...]) -> Any:
+    node = data
+    for key in keys:
+        node = _child(node, key)
+        if node is _MISSING:
+            raise PatchError(f"Path {'/'.join(keys)!r} does not exist")
+    return node
+
+def _update_at(data: Any, keys: tuple[str, ...], func) -> Any:
+    """Заменяет существующий узел по пути keys на func(узел), копируя только путь"""
+    parents = []
+    node = data
+    for key in keys:
+        child = _child(node, key)
+        if child is _MISSING:
+            raise PatchError(f"Path {'/'.join(keys)!r} does not exist")
+        parents.append((node, int(key) if isinstance(node, list) else key))
+        node = child
+    new = func(node)
+    for parent, key in reversed(parents):
+        new = _with_child(parent, key, new)
+    return new
+
+def _add(data: Any, keys: tuple[str, ...], value: Any) -> Any:
+    if not keys:
+        return value
+    last = keys[-1]
+
+    def add_to(parent):
+        if isinstance(parent, dict):
+            new = dict(parent)
+            new[last] = value
+            return new
+        if isinstance(parent, list):
+            index = len(parent) if last == "-" else _list_index(last)
+            if index > len(parent):
+                raise PatchError(f"Invalid list index {last!r}")
+            return parent[:index] + [value] + parent[index:]
+        raise PatchError(f"Cannot add {last!r} to a scalar value")
+
+    return _update_at(data, keys[:-1], add_to)
+
+def _remove(data: Any, keys: tuple[str, ...]) -> Any:
+    if not keys:
+        raise PatchError("Cannot remove the document root")
+    last = keys[-1]
+
+    def remove_from(parent):
+        if isinstance(parent, dict) and last in parent:
+            new = dict(parent)
+            del new[last]
+            return new
+        if isinstance(parent, list) and _list_index(last) < len(parent):
+            index = _list_index(last)
+            return parent[:index] + parent[index + 1:]
+        raise PatchError(f"Path element {last!r} does not exist")
+
+    return _update_at(data, keys[:-1], remove_from)
+
+def _replace(data: Any, keys: tuple[str, ...], value: Any) -> Any:
+    return _update_at(data, keys, lambda node: value)
+
+@traced
+def apply_patch(data: Any, operations: list[dict]) -> Any:
+    """
+    Применяет операции JSON Patch (RFC 6902) по порядку
+
+    Поддерживаются add, remove, replace, move, copy и test. test сравнивает
+    значения строго (strict_equal): true, 1 и 1.0 не равны. Исходный документ
+    не изменяется, поэтому при ошибке в любой операции он остаётся прежним
+
+    Args:
+        data: исходный документ
+        operations: список операций вида {"op": ..., "path": ..., ...}
+
+    Returns:
+        новый документ
+
+    Raises:
+        PatchError: если операция неприменима или test не прошёл
+    """
+    for operation in operations:
+        op = operation["op"]
+        keys = parse_pointer(operation["path"])
+        if op == "add":
+            data = _add(data, keys, operation["value"])
+        elif op == "remove":
+            data = _remove(data, keys)
+        elif op == "replace":
+            data = _replace(data, keys, operation["value"])
+        elif op == "move":
+            source = parse_pointer(operation["from"])
+            if keys[:len(source)] == source and keys != source:
+                raise PatchError("Cannot move a value into its own child")
+            value = _get_strict(data, source)
+            data = _add(_remove(data, source), keys, value)
+        elif op == "copy":
+            value = _get_strict(data, parse_pointer(operation["from"]))
+            data = _add(data, keys, value)
+        elif op == "test":
+            if not strict_equal(_get_strict(data, keys), operation["value"]):
+                raise PatchError(f"Test failed at {operation['path']!r}")
+        else:
+            raise PatchError(f"Unknown operation {op!r}")
+    return data
@@ -0,0 +1,70 @@
+"""
+Условия поиска документов по содержимому
+
+Условие - строка с точечным путём (как в json_patch) и оператором:
+- path=value - значение по пути равно value,
+- path@>json - значение по пути содержит json (как JSONB @>),
+- path? - путь существует.
+value и json разбираются как JSON; value, не являющееся JSON, считается
+строкой, поэтому address.city=Москва и address.city="Москва" равнозначны,
+а строку из цифр нужно брать в кавычки: zip="101000".
+
+Модуль только разбирает условия и строит значения для SQL, сами запросы
+собирает crud. Ключ из цифр - индекс элемента списка в jsonpath и
+не выражается через @>, такие условия проверяются без индекса GIN
+"""
+
+import json
+from typing import Any, NamedTuple
+
+from app.services.json_patch import parse_path
+
+OPERATORS = ("@>", "=")
+
+class QueryError(ValueError):
+    """Условие поиска не разобрано"""
+
+class Predicate(NamedTuple):
+    op: str
+    path: tuple[str, ...]
+    value: Any = None
+
+def parse_value(raw: str, strict: bool) -> Any:
+    try:
+        return json.loads(raw)
+    except ValueError:
+        if strict:
+            raise QueryError(f"Invalid JSON: {raw!r}")
+        return raw
+
+def parse_predicate(expr: str) -> Predicate:
+    """Разбирает условие по первому вхождению оператора"""
+    found = [(expr.find(op), op) for op in OPERATORS if op in expr]
+    if found:
+        index, op = min(found)
+        path, raw = expr[:index], expr[index + len(op):]
+        predicate = Predicate("eq" if op == "=" else "contains", parse_path(path), parse_value(raw, op == "@>"))
+    elif expr.endswith("?"):
+        predicate = Predicate("exists", parse_path(expr[:-1]))
+    else:
+        raise QueryError(f"Expected path=value, path@>json or path?, got {expr!r}")
+    if not all(predicate.path):
+        raise QueryError(f"Empty key in path of {expr!r}")
+    return predicate
+
+def indexable(path: tuple[str, ...]) -> bool:
+    """Можно ли выразить путь через @>: в нём нет индексов списков"""
+    return not any(key.isdigit() for key in path)
+
+def nest(path: tuple[str, ...], value: Any) -> Any:
+    """Объект, который содержит value по пути path: a.b, 1 -> {"a": {"b": 1}}"""
+    for key in reversed(path):
+        value = {key: value}
+    return value
+
+def to_jsonpath(path: tuple[str, ...]) -> str:
+    """Путь в синтаксисе SQL/JSON path, ключи из цифр - индексы списков"""
+    return "$" + "".join(
+        f"[{key}]" if key.isdigit() else "." + json.dumps(key, ensure_ascii=False)
+        for key in path
+    )
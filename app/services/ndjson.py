@@ -0,0 +1,140 @@
+"""
+Потоковое чтение и запись NDJSON
+
+Строки собираются из фрагментов тела запроса по мере поступления,
+поэтому память зависит от длины строки, а не от размера загрузки.
+Поддерживается gzip: распаковка идёт кусками ограниченного размера.
+Запись собирает строки во фрагменты ответа и при необходимости сжимает их.
+"""
+
+import zlib
+from typing import AsyncIterator, Optional
+
+import orjson
+
+INFLATE_PIECE_BYTES = 1024 * 1024
+
+class LineSplitter:
+    """
+    Делит поток байтов на строки
+
+    Строки длиннее max_line_bytes не накапливаются: вместо них
+    возвращается None, чтобы вызывающий код сообщил об ошибке
+    """
+
+    def __init__(self, max_line_bytes: int):
+        self.max_line_bytes = max_line_bytes
+        self.buffer = bytearray()
+        self.overflow = False
+        self.line_no = 0
+
+    def _append(self, part: bytes) -> None:
+        if self.overflow:
+            return
+        if len(self.buffer) + len(part) > self.max_line_bytes:
+            self.overflow = True
+            self.buffer.clear()
+        else:
+            self.buffer += part
+
+    def _emit(self) -> tuple[int, Optional[bytes]]:
+        self.line_no += 1
+        line = None if self.overflow else bytes(self.buffer)
+        self.buffer.clear()
+        self.overflow = False
+        return self.line_no, line
+
+    def feed(self, data: bytes) -> list[tuple[int, Optional[bytes]]]:
+        """Возвращает строки, завершённые в этом фрагменте, как (номер, байты)"""
+        lines = []
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end == -1:
+                self._append(data[start:])
+                return lines
+            self._append(data[start:end])
+            lines.append(self._emit())
+            start = end + 1
+
+    def close(self) -> list[tuple[int, Optional[bytes]]]:
+        """Возвращает последнюю строку, если поток не закончился переводом строки"""
+        if self.buffer or self.overflow:
+            return [self._emit()]
+        return []
+
+async def read_lines(
+    chunks: AsyncIterator[bytes],
+    gzip: bool = False,
+    max_line_bytes: int = 16 * 1024 * 1024,
+) -> AsyncIterator[tuple[int, Optional[bytes]]]:
+    """
+    Читает строки NDJSON из асинхронного потока фрагментов
+
+    Yields:
+        (номер строки, байты строки или None, если строка слишком длинная)
+
+    Raises:
+        zlib.error: если gzip-поток повреждён
+    """
+    splitter = LineSplitter(max_line_bytes)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzip else None
+    async for chunk in chunks:
+        if decompressor is None:
+            for item in splitter.feed(chunk):
+                yield item
+            continue
+        data = chunk
+        while data:
+            piece = decompressor.decompress(data, INFLATE_PIECE_BYTES)
+            for item in splitter.feed(piece):
+                yield item
+            data = decompressor.unconsumed_tail
+    if decompressor is not None:
+        for item in splitter.feed(decompressor.flush()):
+            yield item
+    for item in splitter.close():
+        yield item
+
+def splice_json(fields: dict, key: str, raw_json: Optional[str]) -> bytes:
+    """
+    Сериализует fields и добавляет в объект ключ key с уже готовым текстом JSON
+
+    Позволяет отдать content в том виде, в каком его вернула БД, без разбора
+    и повторной сериализации. Даты сериализуются в ISO 8601
+    """
+    head = orjson.dumps(fields)
+    value = b"null" if raw_json is None else raw_json.encode()
+    if head == b"{}":
+        return b"{" + orjson.dumps(key) + b":" + value + b"}"
+    return head[:-1] + b"," + orjson.dumps(key) + b":" + value + b"}"
+
+async def write_lines(
+    lines: AsyncIterator[bytes],
+    gzip: bool = False,
+    flush_bytes: int = 64 * 1024,
+) -> AsyncIterator[bytes]:
+    """
+    Собирает строки NDJSON во фрагменты ответа примерно по flush_bytes,
+    при gzip сжимает их потоково
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if gzip else None
+    buffer = []
+    size = 0
+    async for line in lines:
+        data = line + b"\n"
+        buffer.append(data)
+        size += len(data)
+        if size >= flush_bytes:
+            chunk = b"".join(buffer)
+            buffer.clear()
+            size = 0
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    chunk = b"".join(buffer)
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
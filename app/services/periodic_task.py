@@ -1,35 +1,234 @@
+"""
+Периодическая задача слияния внешних данных в документы
+
+Данные запрашиваются условным запросом (ETag / Last-Modified) через общий
+пул соединений. Если ответ не изменился, слияние пропускается, а новые
+документы, появившиеся после прошлого слияния, догоняются отдельно.
+Одновременно задачу выполняет только один процесс: лидер выбирается
+блокировкой с арендой в Redis, а без Redis - advisory lock в PostgreSQL.
+Пока лидер выполняет слияние, аренда продлевается
+"""
+
 import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+
 import httpx
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import func, select, text
+from app.core.cache import document_cache, redis_client
 from app.core.config import settings
-from app.core.database import SessionLocal
-from app.crud.document import update_all_documents
+from app.core.database import AsyncSessionLocal, async_engine
+from app.core.metrics import PERIODIC_DURATION
+from app.crud.document import merge_into_all_documents
+from app.models.document import Document
+
+logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()
 
-async def fetch_and_merge():
-    """Запрашивает URL и добавляет полученный JSON в корень каждого документа"""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(settings.PERIODIC_URL, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-    except Exception as e:
-        print(f"Periodic fetch failed: {e}")
+LEADER_LOCK_KEY = "periodic:leader"
+STATE_KEY = "periodic:state"
+# Ключ advisory lock: "docs" в ASCII
+ADVISORY_LOCK_KEY = 0x646F6373
+
+# Снимает блокировку, только если она всё ещё принадлежит этому процессу
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Продлевает аренду, только если блокировка всё ещё принадлежит этому процессу
+RENEW_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+http_client: Optional[httpx.AsyncClient] = None
+local_state: dict = {}
+
+periodic_stats = {
+    "runs": 0,
+    "applied": 0,
+    "skipped_not_leader": 0,
+    "skipped_not_modified": 0,
+    "skipped_unchanged": 0,
+    "failed": 0,
+    "documents_updated": 0,
+    "last_duration_sec": None,
+}
+
+def get_http_client() -> httpx.AsyncClient:
+    """Общий клиент с пулом соединений, создаётся при первом обращении"""
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            timeout=settings.PERIODIC_TIMEOUT,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+        )
+    return http_client
+
+async def renew_lease(token: str) -> None:
+    """Продлевает аренду лидера каждую треть PERIODIC_LEASE_SECONDS, пока не отменена"""
+    lease_ms = settings.PERIODIC_LEASE_SECONDS * 1000
+    while True:
+        await asyncio.sleep(settings.PERIODIC_LEASE_SECONDS / 3)
+        try:
+            renewed = await redis_client.eval(RENEW_LOCK_SCRIPT, 1, LEADER_LOCK_KEY, token, lease_ms)
+        except Exception as e:
+            logger.warning("Periodic leader lease renewal failed: %s", e)
+            continue
+        if not renewed:
+            logger.warning("Periodic leader lease lost before the merge finished")
+            return
+
+@asynccontextmanager
+async def leader_lock():
+    """
+    Пытается стать лидером на время одного запуска задачи
+
+    Аренда в Redis продлевается в фоне, пока блокировка удерживается
+
+    Yields:
+        bool: True, если блокировка получена
+    """
+    if redis_client is not None:
+        token = uuid.uuid4().hex
+        acquired = await redis_client.set(
+            LEADER_LOCK_KEY, token, nx=True, px=settings.PERIODIC_LEASE_SECONDS * 1000
+        )
+        renewal = asyncio.create_task(renew_lease(token)) if acquired else None
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                renewal.cancel()
+                await asyncio.gather(renewal, return_exceptions=True)
+                await redis_client.eval(RELEASE_LOCK_SCRIPT, 1, LEADER_LOCK_KEY, token)
         return
 
-    def merge_func(content):
-        #Добавляет/перезаписывает ключи в data
-        if isinstance(content, dict):
-            content.update(data)
-        return content
+    # Сессионная блокировка снимается сама при обрыве соединения. Соединение
+    # в autocommit, чтобы не держать открытую транзакцию всё время слияния
+    async with async_engine.execution_options(isolation_level="AUTOCOMMIT").connect() as conn:
+        acquired = await conn.scalar(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+        )
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                await conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY}
+                )
+
+async def load_state() -> dict:
+    """Состояние прошлого слияния: валидаторы HTTP, хэш данных, максимальный id"""
+    if redis_client is not None:
+        return await redis_client.hgetall(STATE_KEY)
+    return dict(local_state)
+
+async def save_state(state: dict) -> None:
+    if redis_client is not None:
+        await redis_client.hset(STATE_KEY, mapping=state)
+    else:
+        local_state.update(state)
+
+def payload_hash(data: dict) -> str:
+    """Хэш канонического представления JSON"""
+    raw = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+async def run_merge() -> None:
+    """Один запуск задачи под блокировкой лидера"""
+    state = await load_state()
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    response = await get_http_client().get(settings.PERIODIC_URL, headers=headers)
+    new_hash = None
+    not_modified = response.status_code == 304
+    if not not_modified:
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, dict):
+            raise ValueError("Periodic fetch returned non-object JSON")
+        new_hash = payload_hash(data)
+        state.update({
+            "etag": response.headers.get("etag", ""),
+            "last_modified": response.headers.get("last-modified", ""),
+        })
+    unchanged = not_modified or new_hash == state.get("payload_hash")
 
-    db = SessionLocal()
+    async with AsyncSessionLocal() as db:
+        max_id = await db.scalar(select(func.max(Document.id))) or 0
+        if unchanged:
+            # Данные те же - догоняем только документы, созданные после прошлого слияния
+            start_after = int(state.get("max_id") or 0)
+            if start_after >= max_id or not state.get("payload"):
+                updated = 0
+            else:
+                updated = await merge_into_all_documents(
+                    db, json.loads(state["payload"]), settings.PERIODIC_BATCH_SIZE,
+                    start_after=start_after,
+                )
+        else:
+            updated = await merge_into_all_documents(db, data, settings.PERIODIC_BATCH_SIZE)
+            state.update({
+                "payload_hash": new_hash,
+                "payload": json.dumps(data, ensure_ascii=False),
+            })
+
+    state["max_id"] = max_id
+    await save_state(state)
+
+    if updated:
+        await document_cache.invalidate_all()
+    periodic_stats["documents_updated"] += updated
+    if not_modified:
+        periodic_stats["skipped_not_modified"] += 1
+    elif unchanged:
+        periodic_stats["skipped_unchanged"] += 1
+    else:
+        periodic_stats["applied"] += 1
+
+async def fetch_and_merge():
+    """Запрашивает URL и добавляет полученный JSON в корень каждого документа"""
+    started = time.perf_counter()
+    periodic_stats["runs"] += 1
     try:
-        update_all_documents(db, merge_func)
+        async with leader_lock() as leader:
+            if not leader:
+                periodic_stats["skipped_not_leader"] += 1
+                return
+            await run_merge()
+    except Exception as e:
+        periodic_stats["failed"] += 1
+        logger.warning("Periodic merge failed: %s", e)
     finally:
-        db.close()
+        duration = time.perf_counter() - started
+        periodic_stats["last_duration_sec"] = round(duration, 3)
+        PERIODIC_DURATION.observe(duration)
 
 def start_scheduler():
     scheduler.add_job(fetch_and_merge, 'interval', seconds=settings.PERIODIC_INTERVAL)
-    scheduler.start()
\ No newline at end of file
+    scheduler.start()
+
+async def stop_scheduler():
+    """Останавливает планировщик и закрывает пул HTTP-соединений"""
+    global http_client
+    scheduler.shutdown(wait=False)
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
@@ -0,0 +1,366 @@
+"""
+Возобновляемые параллельные задания массового преобразования документов
+
+update_all_documents выполняет преобразование в одном процессе и после
+сбоя начинает сначала. Задание делит id документов на диапазоны примерно
+равного размера и обрабатывает их в пуле процессов: каждый процесс читает
+пачку документов диапазона, применяет функцию преобразования и записывает
+изменённые документы, ревизии, события ленты изменений и контрольную точку
+диапазона в одной транзакции. После перезапуска обработка продолжается
+с контрольных точек, повторно документ не преобразуется.
+
+Функция преобразования задаётся путём "module:function", чтобы её мог
+импортировать каждый процесс пула. Она получает content документа
+и возвращает новый; документы, content которых не изменился, не записываются.
+
+    python -m app.services.transform_jobs start mypackage.backfills:fill_tags --workers 8
+    python -m app.services.transform_jobs resume 3
+    python -m app.services.transform_jobs status 3
+
+Задание покрывает документы, существовавшие при его создании. Один запуск
+задания держит advisory lock, второй запуск того же задания завершается
+ошибкой. Кэш документов сбрасывается увеличением эпохи при каждом отчёте
+о прогрессе, если с прошлого отчёта были изменения
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from typing import Any, Callable, Optional
+
+import orjson
+import redis
+from sqlalchemy import Integer, Text, bindparam, cast, func, insert, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+from app.core.cache import DocumentCache
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.core.events import CHANNEL, encode_event, notify_events
+from app.crud.revision import revision_rows
+from app.crud.transform_job import job_progress, progress_query
+from app.models.document import Document
+from app.models.revision import DocumentRevision
+from app.models.transform_job import TransformJob, TransformJobRange
+from app.services import json_diff, json_patch
+
+logger = logging.getLogger(__name__)
+
+# Первый ключ advisory lock запуска задания: "xfrm" в ASCII, второй - id задания
+ADVISORY_LOCK_KEY = 0x7866726D
+
+_write_batch = text("""
+    UPDATE documents AS d
+    SET content = v.content, version = d.version + 1, updated_at = now()
+    FROM unnest(:ids, CAST(:contents AS jsonb[])) AS v(id, content)
+    WHERE d.id = v.id
+""").bindparams(bindparam("ids", type_=ARRAY(Integer)), bindparam("contents", type_=ARRAY(Text)))
+
+# Флаг остановки, общий для процессов пула; задаётся в init_worker
+stop_event = None
+
+def load_transform(path: str) -> Callable[[Any], Any]:
+    """Импортирует функцию преобразования по пути "module:function" """
+    module_name, _, name = path.partition(":")
+    if not module_name or not name:
+        raise ValueError(f"Transform must be 'module:function', got {path!r}")
+    transform = getattr(importlib.import_module(module_name), name, None)
+    if not callable(transform):
+        raise ValueError(f"Transform {path!r} is not callable")
+    return transform
+
+def create_job(
+    transform: str,
+    owner: Optional[str] = None,
+    ranges: Optional[int] = None,
+    batch_size: Optional[int] = None,
+) -> int:
+    """
+    Создаёт задание и делит документы на диапазоны
+
+    Args:
+        transform: путь к функции преобразования "module:function"
+        owner: только документы этого владельца, None - все
+        ranges: число диапазонов, по умолчанию TRANSFORM_RANGES_PER_WORKER на процесс
+        batch_size: документов в одной транзакции
+
+    Returns:
+        int: id задания
+    """
+    load_transform(transform)
+    ranges = ranges or worker_count() * settings.TRANSFORM_RANGES_PER_WORKER
+    numbered = select(Document.id, func.ntile(ranges).over(order_by=Document.id).label("shard"))
+    if owner is not None:
+        numbered = numbered.where(Document.owner == owner)
+    numbered = numbered.subquery()
+
+    with SessionLocal() as db:
+        job = TransformJob(
+            transform=transform, owner=owner, batch_size=batch_size or settings.TRANSFORM_BATCH_SIZE
+        )
+        db.add(job)
+        db.flush()
+        # Диапазоны с равным числом документов, а не равной шириной по id
+        shards = db.execute(
+            select(
+                numbered.c.shard, func.min(numbered.c.id), func.max(numbered.c.id), func.count()
+            ).group_by(numbered.c.shard).order_by(numbered.c.shard)
+        ).all()
+        if shards:
+            db.execute(insert(TransformJobRange), [
+                {
+                    "job_id": job.id, "shard": shard, "start_id": start_id, "end_id": end_id,
+                    "last_id": start_id - 1, "total": total,
+                }
+                for shard, start_id, end_id, total in shards
+            ])
+        db.commit()
+        return job.id
+
+def worker_count() -> int:
+    return settings.TRANSFORM_WORKERS or os.cpu_count() or 1
+
+def init_worker(event) -> None:
+    """Инициализация процесса пула: остановкой управляет родитель через event"""
+    global stop_event
+    stop_event = event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def process_batch(
+    db: Session, job_id: int, shard: int, transform: Callable, owner: Optional[str], batch_size: int
+) -> int:
+    """
+    Преобразует следующую пачку диапазона и сдвигает контрольную точку
+
+    Returns:
+        int: число прочитанных документов, 0 - диапазон завершён
+    """
+    rng = db.scalars(
+        select(TransformJobRange)
+        .where(TransformJobRange.job_id == job_id, TransformJobRange.shard == shard)
+        .with_for_update()
+    ).one()
+    if rng.done:
+        db.rollback()
+        return 0
+    stmt = (
+        select(
+            Document.id, Document.owner, Document.title, Document.version,
+            Document.created_at, cast(Document.content, Text).label("content"),
+        )
+        .where(Document.id > rng.last_id, Document.id <= rng.end_id)
+        .order_by(Document.id)
+        .limit(batch_size)
+        .with_for_update()
+    )
+    if owner is not None:
+        stmt = stmt.where(Document.owner == owner)
+    rows = db.execute(stmt).all()
+    if not rows:
+        rng.done = True
+        rng.updated_at = func.now()
+        db.commit()
+        return 0
+
+    ids, contents, revisions, events = [], [], [], []
+    for row in rows:
+        # Разбор дважды дешевле deepcopy, а transform может изменить значение на месте
+        old_content = orjson.loads(row.content) if row.content is not None else None
+        try:
+            content = transform(orjson.loads(row.content) if row.content is not None else None)
+        except Exception as e:
+            raise RuntimeError(f"Transform failed on document {row.id}: {e!r}") from e
+        # Сравнение строгое: замена 1 на true или 1.0 - тоже изменение
+        if json_patch.strict_equal(content, old_content):
+            continue
+        version = row.version + 1
+        patch = json_diff.deep_diff(old_content, content, format="patch")
+        ids.append(row.id)
+        contents.append(orjson.dumps(content).decode())
+        revisions.extend(revision_rows(
+            row.id, version, row.title, content,
+            row.title, old_content, created_at=row.created_at, patch=patch,
+        ))
+        events.append(encode_event("updated", row.id, row.owner, version, row.title, patch))
+    if ids:
+        db.execute(_write_batch, {"ids": ids, "contents": contents})
+        db.execute(insert(DocumentRevision).values(revisions))
+        db.execute(notify_events, {"channel": CHANNEL, "payloads": events})
+    rng.last_id = rows[-1].id
+    rng.processed += len(rows)
+    rng.changed += len(ids)
+    rng.updated_at = func.now()
+    db.commit()
+    return len(rows)
+
+def run_range(job_id: int, shard: int, transform: str, owner: Optional[str], batch_size: int) -> int:
+    """
+    Обрабатывает диапазон в процессе пула до конца или до остановки
+
+    Returns:
+        int: число обработанных документов за этот вызов
+    """
+    transform_func = load_transform(transform)
+    processed = 0
+    with SessionLocal() as db:
+        while stop_event is None or not stop_event.is_set():
+            count = process_batch(db, job_id, shard, transform_func, owner, batch_size)
+            if not count:
+                break
+            processed += count
+    return processed
+
+def get_progress(job_id: int) -> Optional[dict]:
+    with SessionLocal() as db:
+        row = db.execute(progress_query(job_id)).one_or_none()
+        return job_progress(row) if row is not None else None
+
+def invalidate_cache(client) -> None:
+    """Увеличивает эпоху кэша документов, как после периодического слияния"""
+    if client is None:
+        return
+    try:
+        client.incr(DocumentCache.EPOCH_KEY)
+    except Exception as e:
+        logger.warning("Document cache epoch bump failed: %s", e)
+
+def run_job(job_id: int, workers: Optional[int] = None) -> dict:
+    """
+    Запускает или возобновляет задание и ждёт его завершения
+
+    Необработанные диапазоны распределяются по пулу из workers процессов.
+    Каждые TRANSFORM_PROGRESS_SECONDS прогресс пишется в лог. При ошибке
+    в одном диапазоне остальные останавливаются после текущей пачки,
+    задание получает статус failed; при прерывании - stopped. В обоих
+    случаях его можно возобновить
+
+    Returns:
+        dict: прогресс задания после запуска
+    """
+    # Сессионная блокировка снимается сама, если процесс запуска упал. Соединение
+    # в autocommit, чтобы не держать открытую транзакцию всё время задания
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        if not lock_conn.scalar(
+            text("SELECT pg_try_advisory_lock(:key, :job_id)"), {"key": ADVISORY_LOCK_KEY, "job_id": job_id}
+        ):
+            raise RuntimeError(f"Transform job {job_id} is already running")
+        try:
+            return _run_locked(job_id, workers or worker_count())
+        finally:
+            lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:key, :job_id)"), {"key": ADVISORY_LOCK_KEY, "job_id": job_id}
+            )
+
+def _run_locked(job_id: int, workers: int) -> dict:
+    """Выполняет задание под advisory lock запуска"""
+    cache_client = redis.Redis.from_url(settings.REDIS_URL) if settings.REDIS_URL else None
+    with SessionLocal() as db:
+        job = db.get(TransformJob, job_id)
+        if job is None:
+            raise ValueError(f"Transform job {job_id} not found")
+        shards = db.scalars(
+            select(TransformJobRange.shard)
+            .where(TransformJobRange.job_id == job_id, TransformJobRange.done.is_(False))
+            .order_by(TransformJobRange.shard)
+        ).all()
+        job.started_processed = db.scalar(
+            select(func.coalesce(func.sum(TransformJobRange.processed), 0))
+            .where(TransformJobRange.job_id == job_id)
+        )
+        job.status = "running"
+        job.started_at = func.now()
+        job.finished_at = None
+        job.error = None
+        args = (job.transform, job.owner, job.batch_size)
+        db.commit()
+
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    status, error = "done", None
+    changed = get_progress(job_id)["changed"]
+    pool = ProcessPoolExecutor(
+        max_workers=max(min(workers, len(shards)), 1), mp_context=context,
+        initializer=init_worker, initargs=(stop,),
+    )
+    try:
+        pending = {pool.submit(run_range, job_id, shard, *args) for shard in shards}
+        while pending:
+            finished, pending = wait(
+                pending, timeout=settings.TRANSFORM_PROGRESS_SECONDS, return_when=FIRST_EXCEPTION
+            )
+            # exception() отменённого future сам бросает CancelledError; его диапазон
+            # остаётся незавершённым, и задание получит статус stopped
+            failed = [
+                future.exception() for future in finished
+                if not future.cancelled() and future.exception() is not None
+            ]
+            if failed:
+                status, error = "failed", str(failed[0])
+                stop.set()
+                break
+            progress = get_progress(job_id)
+            logger.info(
+                "Transform job %d: %d/%d documents, %s docs/s, ETA %s s",
+                job_id, progress["processed"], progress["total"],
+                progress["docs_per_sec"], progress["eta_seconds"],
+            )
+            if progress["changed"] != changed:
+                changed = progress["changed"]
+                invalidate_cache(cache_client)
+    except BaseException:
+        status, error = "stopped", "interrupted"
+        stop.set()
+        raise
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        with SessionLocal() as db:
+            job = db.get(TransformJob, job_id)
+            remaining = db.scalar(
+                select(func.count())
+                .where(TransformJobRange.job_id == job_id, TransformJobRange.done.is_(False))
+            )
+            if status == "done" and remaining:
+                status = "stopped"
+            job.status = status
+            job.error = error
+            job.finished_at = func.now()
+            db.commit()
+        invalidate_cache(cache_client)
+    return get_progress(job_id)
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    start = commands.add_parser("start", help="создать и запустить задание")
+    start.add_argument("transform", help="функция преобразования module:function")
+    start.add_argument("--owner", help="только документы этого владельца")
+    start.add_argument("--ranges", type=int, help="число диапазонов id")
+    start.add_argument("--batch-size", type=int)
+    start.add_argument("--workers", type=int)
+    resume = commands.add_parser("resume", help="продолжить задание с контрольных точек")
+    resume.add_argument("job_id", type=int)
+    resume.add_argument("--workers", type=int)
+    status = commands.add_parser("status", help="прогресс задания или последних заданий")
+    status.add_argument("job_id", type=int, nargs="?")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "status":
+        with SessionLocal() as db:
+            result = [job_progress(row) for row in db.execute(progress_query(args.job_id).limit(20))]
+    else:
+        if args.command == "start":
+            job_id = create_job(args.transform, args.owner, args.ranges, args.batch_size)
+            logger.info("Created transform job %d", job_id)
+        else:
+            job_id = args.job_id
+        result = run_job(job_id, args.workers)
+    print(json.dumps(result, ensure_ascii=False, default=str, indent=2))
+
+if __name__ == "__main__":
+    main()
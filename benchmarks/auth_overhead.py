@@ -0,0 +1,59 @@
+"""
+Накладные расходы аутентификации на один запрос
+
+Запускается в процессе, без сервиса и БД (нужны переменные окружения конфига):
+
+    python -m benchmarks.auth_overhead --iterations 100000
+
+Печатает по строке JSON со средним временем в микросекундах для:
+полной проверки HS256 через python-jose, той же проверки в пуле потоков
+(так FastAPI выполняет синхронные зависимости), decode_token с промахом
+и с попаданием в token_cache.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from jose import jwt
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.security import create_access_token, decode_token, token_cache
+
+def verify(token: str) -> str:
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])["sub"]
+
+async def measure(name: str, call, iterations: int) -> None:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await call()
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"case": name, "iterations": iterations, "us_per_call": round(elapsed / iterations * 1e6, 2)}))
+
+async def main(args) -> None:
+    token = create_access_token({"sub": "bench"})
+
+    async def inline():
+        verify(token)
+
+    async def threadpool():
+        await run_in_threadpool(verify, token)
+
+    async def cache_miss():
+        token_cache.entries.clear()
+        await decode_token(token)
+
+    async def cache_hit():
+        await decode_token(token)
+
+    await measure("verify_inline", inline, args.iterations)
+    await measure("verify_threadpool", threadpool, args.iterations)
+    await measure("decode_token_miss", cache_miss, args.iterations)
+    await measure("decode_token_hit", cache_hit, args.iterations)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100_000)
+    asyncio.run(main(parser.parse_args()))
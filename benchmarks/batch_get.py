@@ -0,0 +1,117 @@
+"""
+Чтение нескольких документов: отдельные запросы против batch-get и compare
+
+    python -m benchmarks.batch_get --counts 1 10 30 100 --output batch_get.jsonl
+
+По умолчанию приложение вызывается в процессе через ASGI-транспорт
+(база из DATABASE_URL), с --base-url - поднятый сервис. Создаются
+документы из benchmarks.stats.make_document, затем для каждого числа
+документов замеряются:
+- get_each / get_batch: GET /{doc_id} по очереди и один POST /batch-get,
+- path_each / path_batch: GET /{doc_id}?path=... и batch-get с paths,
+- compare_each / compare_batch: GET /compare/{base}/{id} по очереди
+  и один GET /compare/{base}?with=...
+Кэш документов и сравнений отключается, если сервис вызывается в процессе,
+чтобы замерять чтение из БД. Печатает строку JSON на операцию.
+Ключ сравнения для benchmarks.compare - op и width (число документов).
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.load import make_client
+from benchmarks.stats import emit, make_document, percentiles
+
+URL = "/api/v1/documents"
+
+async def timed(repeat: int, call) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+def checked(response):
+    response.raise_for_status()
+    return response
+
+async def main(args) -> None:
+    if not args.base_url:
+        from app.core.cache import diff_cache, document_cache
+
+        document_cache.client = diff_cache.client = None
+        diff_cache.max_entries = 0
+    async with make_client(args) as client:
+        response = checked(await client.post("/auth/token", data={"username": "bench", "password": "any"}))
+        auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        ids = []
+        path = None
+        try:
+            for seed in range(max(args.counts) + 1):
+                content, keys = make_document(args.width, args.depth, seed)
+                path = ".".join(keys)
+                response = checked(await client.post(f"{URL}/", json={"title": "batch", "content": content}, headers=auth))
+                ids.append(response.json()["id"])
+            base, others = ids[0], ids[1:]
+
+            for count in args.counts:
+                batch = others[:count]
+
+                async def get_each():
+                    for doc_id in batch:
+                        checked(await client.get(f"{URL}/{doc_id}", headers=auth))
+
+                async def get_batch():
+                    checked(await client.post(f"{URL}/batch-get", json={"items": [{"id": i} for i in batch]}, headers=auth))
+
+                async def path_each():
+                    for doc_id in batch:
+                        checked(await client.get(f"{URL}/{doc_id}", params={"path": path}, headers=auth))
+
+                async def path_batch():
+                    items = [{"id": i, "paths": [path]} for i in batch]
+                    checked(await client.post(f"{URL}/batch-get", json={"items": items}, headers=auth))
+
+                async def compare_each():
+                    for doc_id in batch:
+                        checked(await client.get(f"{URL}/compare/{base}/{doc_id}", headers=auth))
+
+                async def compare_batch():
+                    params = [("with", doc_id) for doc_id in batch]
+                    checked(await client.get(f"{URL}/compare/{base}", params=params, headers=auth))
+
+                for op, call in (
+                    ("get_each", get_each), ("get_batch", get_batch),
+                    ("path_each", path_each), ("path_batch", path_batch),
+                    ("compare_each", compare_each), ("compare_batch", compare_batch),
+                ):
+                    emit({
+                        "benchmark": "batch_get",
+                        "op": op,
+                        "width": count,
+                        "label": args.label,
+                        **await timed(args.repeat, call),
+                    }, args.output)
+        finally:
+            for doc_id in ids:
+                await client.delete(f"{URL}/{doc_id}", headers=auth)
+
+    if not args.base_url:
+        from app.core.database import async_engine
+
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="адрес поднятого сервиса вместо вызова в процессе")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 10, 30, 100])
+    parser.add_argument("--width", type=int, default=20, help="ключей на уровень документа")
+    parser.add_argument("--depth", type=int, default=4, help="вложенность документа")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--label", default="current")
+    parser.add_argument("--output")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,76 @@
+"""
+Сравнение пакетного JSON Patch с отдельными запросами PATCH /{id}/path
+
+Запускается против поднятого сервиса:
+
+    python -m benchmarks.batch_patch --fields 50 --repeat 20
+
+Одни и те же fields изменений отправляются одним запросом
+application/json-patch+json и fields запросами по одному пути.
+Печатает JSON со временем и числом изменений в секунду для обоих способов.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.http_throughput import get_token
+
+async def main(args) -> None:
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        token = await get_token(client, "bench")
+        headers = {"Authorization": f"Bearer {token}"}
+        content = {f"field{i}": 0 for i in range(args.fields)}
+        content["payload"] = "x" * args.payload_bytes
+        response = await client.post(
+            "/api/v1/documents/", json={"title": "batch", "content": content}, headers=headers
+        )
+        response.raise_for_status()
+        url = f"/api/v1/documents/{response.json()['id']}"
+
+        try:
+            started = time.perf_counter()
+            for round_ in range(args.repeat):
+                for i in range(args.fields):
+                    r = await client.patch(
+                        f"{url}/path", json={"path": f"field{i}", "value": round_}, headers=headers
+                    )
+                    r.raise_for_status()
+            single = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for round_ in range(args.repeat):
+                patch = [
+                    {"op": "replace", "path": f"/field{i}", "value": round_}
+                    for i in range(args.fields)
+                ]
+                r = await client.patch(
+                    url,
+                    content=json.dumps(patch),
+                    headers={**headers, "Content-Type": "application/json-patch+json"},
+                )
+                r.raise_for_status()
+            batch = time.perf_counter() - started
+        finally:
+            await client.delete(url, headers=headers)
+
+    edits = args.fields * args.repeat
+    print(json.dumps({
+        "fields": args.fields,
+        "repeat": args.repeat,
+        "single_path_sec": round(single, 3),
+        "single_path_edits_per_sec": round(edits / single, 1),
+        "json_patch_sec": round(batch, 3),
+        "json_patch_edits_per_sec": round(edits / batch, 1),
+    }))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--fields", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--payload-bytes", type=int, default=100_000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""
+Пропускная способность заданий массового преобразования
+
+Запускается против базы из DATABASE_URL (нужны применённые миграции):
+
+    python -m benchmarks.bulk_transform --rows 1000000 --workers 1 2 4 8 --output bulk.jsonl
+
+Для каждого числа процессов создаётся rows документов отдельного владельца,
+задание app.services.transform_jobs с функцией enrich (хэширование
+и пересчёт полей - нагрузка на CPU в Python) выполняется до конца,
+после чего документы удаляются. Печатает строку JSON с временем задания
+и числом документов в секунду. Ключ сравнения для benchmarks.compare -
+op, width (число документов) и concurrency (число процессов).
+"""
+
+import argparse
+import hashlib
+import time
+
+from sqlalchemy import text
+
+from app.core.database import engine
+from app.services.transform_jobs import create_job, run_job
+from benchmarks.stats import emit
+
+OWNER = "bench-transform"
+
+def enrich(content: dict) -> dict:
+    """Преобразование для замера: контрольные суммы элементов и итог"""
+    total = 0
+    for item in content["items"]:
+        digest = item["text"].encode()
+        for _ in range(20):
+            digest = hashlib.sha256(digest).digest()
+        item["checksum"] = digest.hex()[:16]
+        item["value"] = round(item["value"] * 1.1, 4)
+        total += item["value"]
+    content["total"] = round(total, 4)
+    content["revision"] = content.get("revision", 0) + 1
+    return content
+
+def seed(rows: int) -> None:
+    """Документы владельца OWNER одним INSERT ... SELECT"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO documents (title, owner, content)
+            SELECT 'bulk ' || g, :owner, jsonb_build_object(
+                'n', g,
+                'items', (
+                    SELECT jsonb_agg(jsonb_build_object('text', md5((g * 10 + i)::text), 'value', i))
+                    FROM generate_series(1, 10) AS i
+                )
+            )
+            FROM generate_series(1, :rows) AS g
+        """), {"owner": OWNER, "rows": rows})
+
+def cleanup() -> None:
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM documents WHERE owner = :owner"), {"owner": OWNER})
+
+def main(args) -> None:
+    cleanup()
+    for workers in args.workers:
+        seed(args.rows)
+        try:
+            job_id = create_job(
+                "benchmarks.bulk_transform:enrich", owner=OWNER,
+                ranges=workers * args.ranges_per_worker, batch_size=args.batch_size,
+            )
+            started = time.perf_counter()
+            progress = run_job(job_id, workers)
+            elapsed = time.perf_counter() - started
+            if progress["status"] != "done":
+                raise RuntimeError(f"Transform job {job_id} ended with {progress['status']}: {progress['error']}")
+            emit({
+                "benchmark": "bulk_transform",
+                "op": "transform",
+                "width": args.rows,
+                "concurrency": workers,
+                "batch_size": args.batch_size,
+                "label": args.label,
+                "elapsed_sec": round(elapsed, 3),
+                "changed": progress["changed"],
+                "ops_per_sec": round(progress["processed"] / elapsed, 1),
+            }, args.output)
+        finally:
+            cleanup()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ranges-per-worker", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--label", default="current")
+    parser.add_argument("--output")
+    main(parser.parse_args())
@@ -0,0 +1,52 @@
+"""
+Сравнение двух прогонов бенчмарков
+
+    python -m benchmarks.compare before.jsonl after.jsonl --threshold 10
+
+Строки файлов сопоставляются по benchmark, op и параметрам размера
+(width, depth, concurrency). Для каждой пары печатается строка JSON
+с отношением after/before по перцентилям и пропускной способности.
+Завершается с кодом 1, если p95 хотя бы одной операции вырос больше
+чем на threshold процентов.
+"""
+
+import argparse
+import json
+import sys
+
+KEY_FIELDS = ("benchmark", "op", "width", "depth", "concurrency")
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "ops_per_sec", "requests_per_sec")
+
+def load(path: str) -> dict[tuple, dict]:
+    results = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                result = json.loads(line)
+                # При повторных прогонах в один файл берётся последний
+                results[tuple(result.get(field) for field in KEY_FIELDS)] = result
+    return results
+
+def main(args) -> int:
+    before, after = load(args.before), load(args.after)
+    regressions = 0
+    for key, new in after.items():
+        old = before.get(key)
+        if old is None:
+            continue
+        row = {field: value for field, value in zip(KEY_FIELDS, key) if value is not None}
+        for metric in METRICS:
+            if old.get(metric) and new.get(metric) is not None:
+                row[metric] = {"before": old[metric], "after": new[metric], "ratio": round(new[metric] / old[metric], 3)}
+        ratio = row.get("p95_ms", {}).get("ratio")
+        row["regression"] = ratio is not None and ratio > 1 + args.threshold / 100
+        regressions += row["regression"]
+        print(json.dumps(row, ensure_ascii=False))
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="допустимый рост p95, %%")
+    sys.exit(main(parser.parse_args()))
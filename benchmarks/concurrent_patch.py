@@ -0,0 +1,91 @@
+"""
+Проверка атомарности изменений по пути под конкурентной нагрузкой
+
+Запускается против поднятого сервиса:
+
+    python -m benchmarks.concurrent_patch --clients 100 --rounds 20
+
+1. Каждый клиент пишет свой ключ counters.c{N} rounds раз. После прогона
+   в документе должны оказаться все ключи с последним значением - ни одно
+   изменение не потеряно.
+2. Все клиенты увеличивают общий счётчик shared через If-Match. Итоговое
+   значение должно совпасть с числом ответов 200, остальные получают 412.
+
+Печатает JSON с результатами и завершается с кодом 1 при потерянных изменениях.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+import httpx
+
+from benchmarks.http_throughput import get_token
+
+async def distinct_keys(client, url, headers, clients: int, rounds: int) -> dict:
+    async def worker(n: int):
+        for i in range(rounds):
+            response = await client.patch(
+                f"{url}/path", json={"path": f"counters.c{n}", "value": i}, headers=headers
+            )
+            response.raise_for_status()
+
+    await asyncio.gather(*(worker(n) for n in range(clients)))
+    content = (await client.get(url, headers=headers)).json()["content"]
+    counters = content.get("counters", {})
+    lost = [n for n in range(clients) if counters.get(f"c{n}") != rounds - 1]
+    return {"clients": clients, "rounds": rounds, "lost_keys": len(lost)}
+
+async def shared_counter(client, url, headers, clients: int, rounds: int) -> dict:
+    applied = 0
+    conflicts = 0
+
+    async def worker():
+        nonlocal applied, conflicts
+        for _ in range(rounds):
+            current = (await client.get(url, headers=headers)).json()
+            value = current["content"].get("shared", 0)
+            response = await client.patch(
+                f"{url}/path",
+                json={"path": "shared", "value": value + 1},
+                headers={**headers, "If-Match": f'"{current["version"]}"'},
+            )
+            if response.status_code == 412:
+                conflicts += 1
+            else:
+                response.raise_for_status()
+                applied += 1
+
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    final = (await client.get(url, headers=headers)).json()["content"]["shared"]
+    return {"applied": applied, "conflicts": conflicts, "final": final, "lost_updates": applied - final}
+
+async def main(args) -> int:
+    limits = httpx.Limits(max_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        token = await get_token(client, "bench")
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await client.post(
+            "/api/v1/documents/", json={"title": "concurrency", "content": {}}, headers=headers
+        )
+        response.raise_for_status()
+        url = f"/api/v1/documents/{response.json()['id']}"
+        try:
+            result = {
+                "distinct_keys": await distinct_keys(client, url, headers, args.clients, args.rounds),
+                "shared_counter": await shared_counter(client, url, headers, args.clients, args.rounds),
+            }
+        finally:
+            await client.delete(url, headers=headers)
+
+    print(json.dumps(result))
+    failed = result["distinct_keys"]["lost_keys"] or result["shared_counter"]["lost_updates"]
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=10)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,95 @@
+"""
+Экономия трафика и задержки от условных запросов (If-None-Match / 304)
+
+    python -m benchmarks.conditional_read --sizes 1000 100000 5000000 --output conditional.jsonl
+
+По умолчанию приложение вызывается в процессе через ASGI-транспорт
+(база из DATABASE_URL), с --base-url - поднятый сервис. Для каждого размера
+документа повторно читаются документ целиком и часть по пути: без заголовка
+и с If-None-Match из полученного ETag. Печатает строку JSON на каждое
+сочетание с байтами ответа (тело и заголовки) и перцентилями задержки.
+Ключ сравнения для benchmarks.compare - op и width (размер документа).
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.load import make_client
+from benchmarks.stats import emit, percentiles
+
+URL = "/api/v1/documents"
+
+def make_content(size: int) -> dict:
+    """Документ примерно заданного размера с листом address.city"""
+    content = {"address": {"city": "Москва"}}
+    for i in range(max(size // 1010, 1)):
+        content[f"key{i}"] = "x" * 1000
+    return content
+
+def response_bytes(response) -> int:
+    headers = sum(len(name) + len(value) + 4 for name, value in response.headers.raw)
+    return len(response.content) + headers
+
+async def run(client, url: str, params: dict, headers: dict, repeat: int, expected: int) -> dict:
+    samples = []
+    transferred = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.get(url, params=params, headers=headers)
+        samples.append(time.perf_counter() - started)
+        if response.status_code != expected:
+            raise RuntimeError(f"{url} {params}: expected {expected}, got {response.status_code}")
+        transferred += response_bytes(response)
+    return {"bytes_per_request": transferred // repeat, **percentiles(samples)}
+
+async def main(args) -> None:
+    async with make_client(args) as client:
+        response = await client.post("/auth/token", data={"username": "bench", "password": "any"})
+        response.raise_for_status()
+        auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        for size in args.sizes:
+            response = await client.post(
+                f"{URL}/", json={"title": "conditional", "content": make_content(size)}, headers=auth
+            )
+            response.raise_for_status()
+            url = f"{URL}/{response.json()['id']}"
+            try:
+                for target, params in (("document", {}), ("path", {"path": "address.city"})):
+                    etag = (await client.get(url, params=params, headers=auth)).headers["ETag"]
+                    full = await run(client, url, params, auth, args.repeat, 200)
+                    cached = await run(client, url, params, {**auth, "If-None-Match": etag}, args.repeat, 304)
+                    for op, result in ((f"{target}_200", full), (f"{target}_304", cached)):
+                        emit({
+                            "benchmark": "conditional_read",
+                            "op": op,
+                            "width": size,
+                            "label": args.label,
+                            **result,
+                        }, args.output)
+                    emit({
+                        "benchmark": "conditional_read",
+                        "op": f"{target}_saved",
+                        "width": size,
+                        "label": args.label,
+                        "bytes_saved_ratio": round(1 - cached["bytes_per_request"] / full["bytes_per_request"], 4),
+                        "p50_saved_ms": round(full["p50_ms"] - cached["p50_ms"], 4),
+                    }, args.output)
+            finally:
+                await client.delete(url, headers=auth)
+
+    if not args.base_url:
+        from app.core.database import async_engine
+
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="адрес поднятого сервиса вместо вызова в процессе")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 5_000_000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--label", default="current")
+    parser.add_argument("--output")
+    asyncio.run(main(parser.parse_args()))
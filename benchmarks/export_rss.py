@@ -0,0 +1,75 @@
+"""
+Потоковый экспорт большой таблицы с ограничением памяти процесса
+
+Запускается против базы из DATABASE_URL (нужны применённые миграции):
+
+    python -m benchmarks.export_rss --seed 1000000 --max-rss-growth-mb 64
+
+Экспорт читается тем же генератором, что и GET /api/v1/documents/export.
+Память процесса измеряется так же, как в health_check, через psutil.
+Печатает JSON с числом строк, байтами и пиковым ростом RSS; завершается
+с кодом 1, если рост превысил --max-rss-growth-mb.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import psutil
+
+from app.api.v1.endpoints.documents import export_lines
+from app.core.database import AsyncSessionLocal, async_engine
+from app.services import ndjson
+from benchmarks.list_pages import OWNER, seed
+
+def rss_mb() -> float:
+    return psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024
+
+async def main(args) -> int:
+    if args.seed:
+        async with AsyncSessionLocal() as db:
+            await seed(db, args.seed)
+
+    rows = 0
+
+    async def counted(lines):
+        nonlocal rows
+        async for line in lines:
+            rows += 1
+            yield line
+
+    baseline = rss_mb()
+    peak = baseline
+    chunks = 0
+    size = 0
+    started = time.perf_counter()
+    async for chunk in ndjson.write_lines(counted(export_lines(OWNER, args.batch_size)), gzip=args.gzip):
+        chunks += 1
+        size += len(chunk)
+        if chunks % 16 == 0:
+            peak = max(peak, rss_mb())
+    elapsed = time.perf_counter() - started
+    await async_engine.dispose()
+
+    growth = peak - baseline
+    print(json.dumps({
+        "rows": rows,
+        "bytes": size,
+        "gzip": args.gzip,
+        "elapsed_sec": round(elapsed, 2),
+        "baseline_rss_mb": round(baseline, 2),
+        "peak_rss_mb": round(peak, 2),
+        "rss_growth_mb": round(growth, 2),
+    }))
+    return 1 if growth > args.max_rss_growth_mb else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64)
+    sys.exit(asyncio.run(main(parser.parse_args())))
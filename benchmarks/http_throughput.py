@@ -0,0 +1,87 @@
+"""
+Замер пропускной способности чтения документов под конкурентной нагрузкой
+
+Запускается против поднятого сервиса (например, docker-compose up) до и после
+изменения, результаты сравниваются по полю requests_per_sec:
+
+    python -m benchmarks.http_throughput --base-url http://localhost:8000 --label async
+
+Для каждого уровня конкурентности (по умолчанию 50, 200 и 1000 клиентов)
+печатает одну строку JSON с перцентилями задержки.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.stats import percentiles
+
+async def get_token(client: httpx.AsyncClient, username: str) -> str:
+    response = await client.post("/auth/token", data={"username": username, "password": "any"})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def run_level(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: dict,
+    concurrency: int,
+    requests_per_client: int,
+) -> dict:
+    """Запускает concurrency клиентов, каждый делает requests_per_client запросов подряд"""
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                response = await client.get(url, headers=headers)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_sec": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        **percentiles(latencies),
+    }
+
+async def main(args) -> None:
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        token = await get_token(client, "bench")
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await client.post(
+            "/api/v1/documents/",
+            json={"title": "bench", "content": {"name": "bench", "address": {"city": "Москва"}}},
+            headers=headers,
+        )
+        response.raise_for_status()
+        url = f"/api/v1/documents/{response.json()['id']}"
+
+        for concurrency in args.concurrency:
+            result = await run_level(client, url, headers, concurrency, args.requests_per_client)
+            result["label"] = args.label
+            print(json.dumps(result))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--label", default="current")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--requests-per-client", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""
+Бенчмарк json_diff.deep_diff против прежней рекурсивной реализации
+
+    python -m benchmarks.json_diff_engine
+
+Сценарии: плоский документ на 10 000 ключей с несколькими изменениями
+и документ глубиной 10 уровней с ветвлением. Печатает строку JSON на сценарий
+со средним временем в миллисекундах для обоих форматов нового движка
+и для прежней реализации.
+"""
+
+import argparse
+import copy
+import json
+import timeit
+
+from app.services import json_diff
+
+def legacy_deep_diff(obj1, obj2, path=""):
+    """Прежняя рекурсивная реализация, списки сравниваются целиком"""
+    diff = {"added": {}, "removed": {}, "changed": {}}
+    keys1 = set(obj1.keys())
+    keys2 = set(obj2.keys())
+    for key in keys1 - keys2:
+        diff["removed"][f"{path}.{key}" if path else key] = obj1[key]
+    for key in keys2 - keys1:
+        diff["added"][f"{path}.{key}" if path else key] = obj2[key]
+    for key in keys1 & keys2:
+        full_path = f"{path}.{key}" if path else key
+        if isinstance(obj1[key], dict) and isinstance(obj2[key], dict):
+            sub_diff = legacy_deep_diff(obj1[key], obj2[key], full_path)
+            diff["added"].update(sub_diff["added"])
+            diff["removed"].update(sub_diff["removed"])
+            diff["changed"].update(sub_diff["changed"])
+        elif obj1[key] != obj2[key]:
+            diff["changed"][full_path] = {"old": obj1[key], "new": obj2[key]}
+    return diff
+
+def flat_case(keys: int) -> tuple[dict, dict]:
+    old = {f"key{i}": {"value": i, "tags": [i, i + 1]} for i in range(keys)}
+    new = copy.deepcopy(old)
+    for i in range(0, keys, max(keys // 10, 1)):
+        new[f"key{i}"]["value"] = -i
+    return old, new
+
+def deep_case(depth: int, fanout: int) -> tuple[dict, dict]:
+    def build(level):
+        if level == depth:
+            return {"leaf": level, "items": list(range(10))}
+        return {f"n{i}": build(level + 1) for i in range(fanout)}
+    old = build(0)
+    new = copy.deepcopy(old)
+    node = new
+    for _ in range(depth):
+        node = node["n0"]
+    node["leaf"] = "changed"
+    node["items"].insert(3, 99)
+    return old, new
+
+def bench(func, number: int) -> float:
+    return round(min(timeit.repeat(func, number=number, repeat=3)) / number * 1000, 3)
+
+def main(args) -> None:
+    cases = {
+        "flat_10k_keys": flat_case(args.keys),
+        "deep_10_levels": deep_case(args.depth, args.fanout),
+    }
+    for name, (old, new) in cases.items():
+        print(json.dumps({
+            "case": name,
+            "paths_ms": bench(lambda: json_diff.deep_diff(old, new), args.number),
+            "patch_ms": bench(lambda: json_diff.deep_diff(old, new, format="patch"), args.number),
+            "legacy_ms": bench(lambda: legacy_deep_diff(old, new), args.number),
+        }))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=10_000)
+    parser.add_argument("--depth", type=int, default=10)
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument("--number", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,92 @@
+"""
+Микробенчмарк путевого движка json_patch против прежней реализации на dpath
+
+    pip install dpath==2.1.6
+    python -m benchmarks.json_patch_engine --keys 1000 --depth 6
+
+Печатает строку JSON на каждую операцию со средним временем в микросекундах.
+Прежняя реализация изменяла документ на месте после поверхностной копии,
+так же она и измеряется.
+"""
+
+import argparse
+import json
+import timeit
+
+from app.services import json_patch
+
+try:
+    import dpath.util
+except ImportError:
+    dpath = None
+
+def make_document(keys: int, depth: int) -> tuple[dict, str]:
+    """Документ с keys ключами на каждом уровне и путём глубины depth"""
+    doc = {}
+    node = doc
+    path = []
+    for level in range(depth):
+        for i in range(keys):
+            node[f"k{i}"] = i
+        node["next"] = {}
+        path.append("next")
+        node = node["next"]
+    node["leaf"] = "value"
+    path.append("leaf")
+    return doc, ".".join(path)
+
+def dpath_get(data, path):
+    try:
+        return dpath.util.get(data, path, separator=".")
+    except KeyError:
+        return None
+
+def dpath_set(data, path, value):
+    data = data.copy()
+    dpath.util.new(data, path, value, separator=".")
+    return data
+
+def dpath_delete(data, path):
+    data = data.copy()
+    try:
+        dpath.util.delete(data, path, separator=".")
+    except KeyError:
+        pass
+    return data
+
+def bench(func, number: int) -> float:
+    return round(min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6, 3)
+
+def main(args) -> None:
+    doc, path = make_document(args.keys, args.depth)
+    new_path = path.rsplit(".", 1)[0] + ".created.leaf"
+    cases = {
+        "get": (
+            lambda: json_patch.get_value_by_path(doc, path),
+            lambda: dpath_get(doc, path),
+        ),
+        "set_existing": (
+            lambda: json_patch.set_value_by_path(doc, path, 1),
+            lambda: dpath_set(doc, path, 1),
+        ),
+        "set_new": (
+            lambda: json_patch.set_value_by_path(doc, new_path, 1),
+            lambda: dpath_set(doc, new_path, 1),
+        ),
+        "delete": (
+            lambda: json_patch.delete_value_by_path(doc, path),
+            lambda: dpath_delete(doc, path),
+        ),
+    }
+    for name, (engine, baseline) in cases.items():
+        result = {"op": name, "keys": args.keys, "depth": args.depth, "engine_us": bench(engine, args.number)}
+        if dpath is not None:
+            result["dpath_us"] = bench(baseline, args.number)
+        print(json.dumps(result))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--number", type=int, default=200)
+    main(parser.parse_args())
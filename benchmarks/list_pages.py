@@ -0,0 +1,88 @@
+"""
+Задержка страницы списка документов: курсор по id против OFFSET
+
+Запускается против базы из DATABASE_URL (нужны применённые миграции):
+
+    python -m benchmarks.list_pages --seed 1000000 --pages 1 10 100 1000 10000
+
+--seed добавляет документы владельца bench пачками перед замером
+и обновляет статистику таблицы (ANALYZE), чтобы планы не зависели
+от того, успел ли её обновить autovacuum.
+Для каждого номера страницы печатает строку JSON со средним временем
+выборки страницы через crud.get_documents и через OFFSET.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy import insert, select, text
+
+from app.core.database import AsyncSessionLocal, async_engine
+from app.crud.document import get_documents
+from app.models.document import Document
+
+OWNER = "bench"
+FIELDS = ("id", "title", "owner", "created_at", "updated_at", "version")
+
+async def seed(db, count: int, batch: int = 10_000) -> None:
+    for start in range(0, count, batch):
+        rows = [
+            {"title": f"doc {i}", "content": {"n": i}, "owner": OWNER}
+            for i in range(start, min(start + batch, count))
+        ]
+        await db.execute(insert(Document), rows)
+        await db.commit()
+    if count:
+        await db.execute(text("ANALYZE documents"))
+        await db.commit()
+
+async def timed(coro_factory, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await coro_factory()
+    return (time.perf_counter() - started) / repeat * 1000
+
+async def main(args) -> None:
+    async with AsyncSessionLocal() as db:
+        if args.seed:
+            await seed(db, args.seed)
+
+        columns = [getattr(Document, f) for f in FIELDS]
+        for page in args.pages:
+            offset = (page - 1) * args.limit
+            # Курсор страницы - id последнего документа предыдущей страницы
+            cursor = None
+            if offset:
+                cursor = await db.scalar(
+                    select(Document.id).where(Document.owner == OWNER)
+                    .order_by(Document.id).offset(offset - 1).limit(1)
+                )
+                if cursor is None:
+                    break
+
+            async def keyset():
+                await get_documents(db, after_id=cursor, limit=args.limit, owner=OWNER, fields=FIELDS)
+
+            async def by_offset():
+                result = await db.execute(
+                    select(*columns).where(Document.owner == OWNER)
+                    .order_by(Document.id).offset(offset).limit(args.limit)
+                )
+                result.all()
+
+            print(json.dumps({
+                "page": page,
+                "keyset_ms": round(await timed(keyset, args.repeat), 3),
+                "offset_ms": round(await timed(by_offset, args.repeat), 3),
+            }))
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,201 @@
+"""
+Нагрузочный прогон смеси операций с документами
+
+По умолчанию приложение вызывается в том же процессе через ASGI-транспорт
+httpx, без сети и без событий запуска (планировщик не стартует). Документы
+пишутся в базу из DATABASE_URL (нужны применённые миграции, например
+локальный Postgres). Если установлен fakeredis, кэши документов и сравнений
+работают поверх него, иначе Redis отключается:
+
+    pip install fakeredis
+    python -m benchmarks.load --requests 5000 --concurrency 50 --output load.jsonl
+
+С --base-url нагрузка идёт на поднятый сервис, и кэш определяется его
+настройками. Смесь задаётся весами операций, например
+--mix read=60,path_patch=20,create=10,compare=5,delete=5.
+
+Печатает строку JSON на каждую операцию (число запросов, ошибки,
+p50/p95/p99) и итоговую строку с общей пропускной способностью.
+Ключ сравнения для benchmarks.compare - op.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.stats import emit, make_document, percentiles
+
+URL = "/api/v1/documents"
+OPERATIONS = ("create", "read", "path_read", "path_patch", "compare", "delete")
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        op, _, weight = part.partition("=")
+        if op not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {op!r}, expected one of {OPERATIONS}")
+        mix[op] = int(weight)
+    return mix
+
+def use_fake_redis() -> bool:
+    """Подменяет клиент кэшей на fakeredis, если он установлен"""
+    try:
+        from fakeredis import aioredis
+    except ImportError:
+        return False
+    from app.core.cache import diff_cache, document_cache
+    from app.core.config import settings
+
+    client = aioredis.FakeRedis(decode_responses=True)
+    document_cache.client = client
+    if settings.DIFF_CACHE_REDIS:
+        diff_cache.client = client
+    return True
+
+def make_client(args) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=None)
+    if args.base_url:
+        return httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60)
+    from app.main import app
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://load", limits=limits, timeout=60
+    )
+
+class Load:
+    """Состояние прогона: пул id документов и замеры по операциям"""
+
+    def __init__(self, client: httpx.AsyncClient, headers: dict, args):
+        self.client = client
+        self.headers = headers
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.document, keys = make_document(args.width, args.depth, args.seed)
+        self.path = ".".join(keys)
+        self.ids: list[int] = []
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def create(self) -> httpx.Response:
+        response = await self.client.post(
+            f"{URL}/", json={"title": "load", "content": self.document}, headers=self.headers
+        )
+        if response.status_code == 200:
+            self.ids.append(response.json()["id"])
+        return response
+
+    async def read(self) -> httpx.Response:
+        return await self.client.get(f"{URL}/{self.rng.choice(self.ids)}", headers=self.headers)
+
+    async def path_read(self) -> httpx.Response:
+        return await self.client.get(
+            f"{URL}/{self.rng.choice(self.ids)}", params={"path": self.path}, headers=self.headers
+        )
+
+    async def path_patch(self) -> httpx.Response:
+        return await self.client.patch(
+            f"{URL}/{self.rng.choice(self.ids)}/path",
+            json={"path": self.path, "value": self.rng.randrange(1_000_000)},
+            headers=self.headers,
+        )
+
+    async def compare(self) -> httpx.Response:
+        id1, id2 = self.rng.choice(self.ids), self.rng.choice(self.ids)
+        return await self.client.get(f"{URL}/compare/{id1}/{id2}", headers=self.headers)
+
+    async def delete(self) -> httpx.Response:
+        # Пул не опустошается, чтобы остальным операциям было с чем работать
+        if len(self.ids) <= self.args.concurrency:
+            return await self.create()
+        doc_id = self.ids.pop(self.rng.randrange(len(self.ids)))
+        return await self.client.delete(f"{URL}/{doc_id}", headers=self.headers)
+
+    async def run(self, mix: dict[str, int]) -> float:
+        ops, weights = list(mix), list(mix.values())
+        remaining = self.args.requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                op = self.rng.choices(ops, weights)[0]
+                started = time.perf_counter()
+                try:
+                    response = await getattr(self, op)()
+                    # Документ мог удалить параллельный запрос
+                    failed = response.status_code >= 400 and response.status_code != 404
+                except httpx.HTTPError:
+                    failed = True
+                self.latencies[op].append(time.perf_counter() - started)
+                if failed:
+                    self.errors[op] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        return time.perf_counter() - started
+
+async def main(args) -> None:
+    fake_redis = False if args.base_url else use_fake_redis()
+    async with make_client(args) as client:
+        response = await client.post("/auth/token", data={"username": "load", "password": "any"})
+        response.raise_for_status()
+        load = Load(client, {"Authorization": f"Bearer {response.json()['access_token']}"}, args)
+
+        for _ in range(args.documents):
+            (await load.create()).raise_for_status()
+        elapsed = await load.run(args.mix)
+
+        for op, samples in sorted(load.latencies.items()):
+            emit({
+                "benchmark": "load",
+                "op": op,
+                "label": args.label,
+                "requests": len(samples),
+                "errors": load.errors[op],
+                "requests_per_sec": round(len(samples) / elapsed, 1),
+                **percentiles(samples),
+            }, args.output)
+        samples = [sample for op_samples in load.latencies.values() for sample in op_samples]
+        emit({
+            "benchmark": "load",
+            "op": "total",
+            "label": args.label,
+            "transport": args.base_url or "asgi",
+            "fake_redis": fake_redis,
+            "concurrency": args.concurrency,
+            "requests": len(samples),
+            "errors": sum(load.errors.values()),
+            "elapsed_sec": round(elapsed, 3),
+            "requests_per_sec": round(len(samples) / elapsed, 1),
+            **percentiles(samples),
+        }, args.output)
+
+        if args.cleanup:
+            for doc_id in load.ids:
+                await client.delete(f"{URL}/{doc_id}", headers=load.headers)
+
+    if not args.base_url:
+        from app.core.database import async_engine
+
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="адрес поднятого сервиса вместо вызова в процессе")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(
+        "create=10,read=40,path_read=15,path_patch=20,compare=10,delete=5"
+    ))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--documents", type=int, default=100, help="документов до начала замера")
+    parser.add_argument("--width", type=int, default=20, help="ключей на уровень документа")
+    parser.add_argument("--depth", type=int, default=4, help="вложенность документа")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default="current")
+    parser.add_argument("--output")
+    parser.add_argument("--no-cleanup", dest="cleanup", action="store_false")
+    asyncio.run(main(parser.parse_args()))
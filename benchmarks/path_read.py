@@ -0,0 +1,77 @@
+"""
+Сравнение чтения части документа: весь content против content #> path
+
+Запускается против базы из DATABASE_URL (нужны применённые миграции):
+
+    python -m benchmarks.path_read --sizes 10000 1000000 5000000
+
+Для каждого размера документа печатает строку JSON со средней задержкой
+и объёмом данных, переданных из БД, для обоих способов.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy import Text, cast, delete, select
+
+from app.core.database import AsyncSessionLocal, async_engine
+from app.models.document import Document
+from app.services import json_patch
+
+PATH = "address.city"
+
+def make_content(size: int) -> dict:
+    """Документ примерно заданного размера с листом address.city"""
+    filler = "x" * 1000
+    content = {"address": {"city": "Москва"}}
+    for i in range(max(size // 1010, 1)):
+        content[f"key{i}"] = filler
+    return content
+
+async def run_size(size: int, repeat: int) -> dict:
+    async with AsyncSessionLocal() as db:
+        doc = Document(title="bench", content=make_content(size), owner="bench")
+        db.add(doc)
+        await db.commit()
+        try:
+            # Читаем текст, чтобы считать байты ответа БД, а разбор JSON делать явно
+            full = select(cast(Document.content, Text)).where(Document.id == doc.id)
+            part = select(
+                cast(Document.content[tuple(json_patch.split_path(PATH))], Text)
+            ).where(Document.id == doc.id)
+
+            started = time.perf_counter()
+            for _ in range(repeat):
+                raw_full = (await db.execute(full)).scalar_one()
+                json_patch.get_value_by_path(json.loads(raw_full), PATH)
+            full_time = (time.perf_counter() - started) / repeat
+
+            started = time.perf_counter()
+            for _ in range(repeat):
+                raw_part = (await db.execute(part)).scalar_one()
+                json.loads(raw_part)
+            part_time = (time.perf_counter() - started) / repeat
+        finally:
+            await db.execute(delete(Document).where(Document.id == doc.id))
+            await db.commit()
+
+    return {
+        "document_bytes": len(raw_full.encode()),
+        "full_ms": round(full_time * 1000, 3),
+        "full_bytes": len(raw_full.encode()),
+        "path_ms": round(part_time * 1000, 3),
+        "path_bytes": len(raw_part.encode()),
+    }
+
+async def main(args) -> None:
+    for size in args.sizes:
+        print(json.dumps(await run_size(size, args.repeat)))
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
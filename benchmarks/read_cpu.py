@@ -0,0 +1,108 @@
+"""
+Время CPU на чтение документа: готовый текст JSON из БД против модели
+
+Запускается против базы из DATABASE_URL (нужны применённые миграции):
+
+    python -m benchmarks.read_cpu --sizes 1000 100000 5000000 --output read_cpu.jsonl
+
+Для каждого размера документа замеряется время CPU процесса на один запрос:
+- http: GET /api/v1/documents/{id} через ASGI-транспорт, кэш документов
+  отключается, чтобы каждый запрос шёл в БД,
+- splice: crud.get_document_json и splice_json - то, что делает эндпоинт,
+- model: прежний путь - ORM-объект с разобранным content, проверка
+  DocumentInDB, повторная проверка модели ответа и json.dumps.
+Ключ сравнения для benchmarks.compare - op и width (размер документа).
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Union
+
+import httpx
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import delete
+
+from app.core.cache import document_cache
+from app.core.database import AsyncSessionLocal, async_engine
+from app.core.security import create_access_token
+from app.crud.document import get_document, get_document_json
+from app.main import app
+from app.models.document import Document
+from app.schemas.document import DocumentInDB, DocumentPart
+from app.services import ndjson
+from benchmarks.stats import emit
+
+OWNER = "bench"
+RESPONSE = TypeAdapter(Union[DocumentInDB, DocumentPart])
+
+def make_content(size: int) -> dict:
+    """Документ примерно заданного размера из записей разных типов"""
+    item = {"name": "item", "value": 12345.678, "active": True, "tags": ["a", "b", "c"], "text": "x" * 40}
+    return {"items": [dict(item, id=i) for i in range(max(size // 110, 1))]}
+
+async def measure(func, repeat: int) -> dict:
+    await func()
+    cpu, wall = time.process_time(), time.perf_counter()
+    for _ in range(repeat):
+        await func()
+    return {
+        "cpu_ms": round((time.process_time() - cpu) / repeat * 1000, 3),
+        "wall_ms": round((time.perf_counter() - wall) / repeat * 1000, 3),
+    }
+
+async def run_size(client: httpx.AsyncClient, headers: dict, size: int, args) -> None:
+    async with AsyncSessionLocal() as db:
+        doc = Document(title="bench", content=make_content(size), owner=OWNER)
+        db.add(doc)
+        await db.commit()
+        doc_id = doc.id
+        try:
+            async def http():
+                response = await client.get(f"/api/v1/documents/{doc_id}", headers=headers)
+                response.raise_for_status()
+
+            async def splice():
+                row = await get_document_json(db, doc_id)
+                ndjson.splice_json({
+                    "id": row.id, "title": row.title, "owner": row.owner,
+                    "created_at": row.created_at, "updated_at": row.updated_at,
+                    "version": row.version, "content_size": row.content_size,
+                }, "content", row.content)
+
+            async def model():
+                db.expunge_all()
+                data = DocumentInDB.model_validate(await get_document(db, doc_id)).model_dump(mode="json")
+                value = RESPONSE.validate_python(DocumentInDB.model_validate(data))
+                JSONResponse(RESPONSE.dump_python(value, mode="json"))
+
+            body = (await client.get(f"/api/v1/documents/{doc_id}", headers=headers)).content
+            for op, func in (("http", http), ("splice", splice), ("model", model)):
+                emit({
+                    "benchmark": "read_cpu",
+                    "op": op,
+                    "width": size,
+                    "response_bytes": len(body),
+                    "label": args.label,
+                    **await measure(func, args.repeat),
+                }, args.output)
+        finally:
+            await db.execute(delete(Document).where(Document.id == doc_id))
+            await db.commit()
+
+async def main(args) -> None:
+    document_cache.client = None
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': OWNER})}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for size in args.sizes:
+            await run_size(client, headers, size, args)
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 5_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--label", default="current")
+    parser.add_argument("--output")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,94 @@
+"""
+Размер истории ревизий и время восстановления ревизии от её глубины
+
+Запускается против базы из DATABASE_URL (нужны применённые миграции):
+
+    python -m benchmarks.revision_history --keys 2000 --revisions 1000
+
+Создаёт документ из --keys ключей и изменяет по одному ключу --revisions раз
+через crud.update_document_content. Печатает строку JSON с размером
+хранимой истории и размером полных копий всех ревизий, затем для ревизий
+разной глубины - среднее время восстановления через crud.get_document_revision.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, async_engine
+from app.crud.document import create_document, delete_document, update_document_content
+from app.crud.revision import get_document_revision
+from app.models.revision import DocumentRevision
+from app.schemas.document import DocumentCreate
+
+def make_content(keys: int) -> dict:
+    return {f"key{i}": {"value": i, "tags": ["a", "b", "c"], "text": "x" * 64} for i in range(keys)}
+
+def patches_applied(version: int) -> int:
+    """Число патчей после ближайшего снимка: снимки - ревизия 1 и кратные N"""
+    every = settings.REVISION_SNAPSHOT_EVERY
+    return version - 1 if version < every else version % every
+
+async def main(args) -> None:
+    rng = random.Random(args.seed)
+    async with AsyncSessionLocal() as db:
+        doc = await create_document(db, DocumentCreate(title="revisions", content=make_content(args.keys)), "bench")
+        doc_id = doc.id
+
+        def change(content):
+            key = f"key{rng.randrange(args.keys)}"
+            return {**content, key: {**content[key], "value": rng.random()}}
+
+        started = time.perf_counter()
+        for _ in range(args.revisions):
+            await update_document_content(db, doc_id, change)
+        write_ms = (time.perf_counter() - started) / args.revisions * 1000
+
+        history = await db.scalar(
+            select(func.sum(func.pg_column_size(
+                func.coalesce(DocumentRevision.snapshot, DocumentRevision.patch)
+            ))).where(DocumentRevision.document_id == doc_id)
+        )
+        # Полная копия каждой ревизии занимала бы примерно столько же, сколько снимок
+        snapshot = await db.scalar(
+            select(func.avg(func.pg_column_size(DocumentRevision.snapshot)))
+            .where(DocumentRevision.document_id == doc_id, DocumentRevision.snapshot.isnot(None))
+        )
+        print(json.dumps({
+            "keys": args.keys,
+            "revisions": args.revisions + 1,
+            "snapshot_every": settings.REVISION_SNAPSHOT_EVERY,
+            "write_ms": round(write_ms, 3),
+            "history_bytes": int(history),
+            "full_copies_bytes": int(snapshot * (args.revisions + 1)),
+        }))
+
+        for depth in args.depths:
+            if depth > args.revisions:
+                break
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                await get_document_revision(db, doc_id, depth)
+            elapsed = (time.perf_counter() - started) / args.repeat * 1000
+            print(json.dumps({
+                "revision": depth,
+                "patches_applied": patches_applied(depth),
+                "reconstruct_ms": round(elapsed, 3),
+            }))
+
+        await delete_document(db, doc_id)
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=2000)
+    parser.add_argument("--revisions", type=int, default=1000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 2, 16, 31, 32, 63, 100, 500, 999])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,115 @@
+"""
+Задержка поиска по содержимому без индексов, с GIN и с индексом по пути
+
+Запускается против отдельной базы из DATABASE_URL (нужны применённые
+миграции): на время замера удаляется индекс ix_documents_content.
+
+    python -m benchmarks.search --rows 1000000 --output search.jsonl
+
+Создаётся rows документов отдельного владельца. Каждый запрос из QUERIES
+выполняется через crud.get_documents (страница из limit документов)
+в трёх состояниях индексов:
+- none: без индексов по content,
+- gin: индекс GIN из миграции,
+- gin_path: GIN и индекс по выражению для address.city, как для пути
+  из INDEXED_PATHS.
+Печатает строку JSON на запрос и состояние с перцентилями задержки.
+Ключ сравнения для benchmarks.compare - op (запрос_состояние) и width.
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import Index, text
+from sqlalchemy.schema import CreateIndex
+
+from app.core.database import AsyncSessionLocal, async_engine, engine
+from app.crud.document import get_documents
+from app.models.document import path_expression, path_index_name
+from app.services.json_query import parse_predicate
+from benchmarks.stats import emit, percentiles
+
+OWNER = "bench-search"
+PATH = ("address", "city")
+PATH_INDEX = Index(path_index_name(PATH), path_expression(PATH))
+
+QUERIES = {
+    "eq_city": ["address.city=city42"],
+    "eq_city_tag": ["address.city=city42", 'tags@>["u3"]'],
+    "contains_tag": ['tags@>["t7"]'],
+    "exists_flag": ["flag?"],
+    "eq_unique": ["n=123457"],
+    "eq_missing": ["address.city=nowhere"],
+}
+
+def seed(rows: int) -> None:
+    """Документы владельца OWNER: 1000 городов, 50 и 7 тегов, флаг у 1%"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO documents (title, owner, content)
+            SELECT 'search ' || g, :owner, jsonb_build_object(
+                'address', jsonb_build_object('city', 'city' || (g % 1000), 'zip', lpad((g % 100000)::text, 6, '0')),
+                'tags', jsonb_build_array('t' || (g % 50), 'u' || (g % 7)),
+                'n', g,
+                'active', g % 2 = 0
+            ) || CASE WHEN g % 100 = 0 THEN '{"flag": true}'::jsonb ELSE '{}'::jsonb END
+            FROM generate_series(1, :rows) AS g
+        """), {"owner": OWNER, "rows": rows})
+        conn.execute(text("ANALYZE documents"))
+
+def set_indexes(state: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX IF EXISTS {PATH_INDEX.name}"))
+        if state == "none":
+            conn.execute(text("DROP INDEX IF EXISTS ix_documents_content"))
+        else:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_content ON documents USING gin (content)"))
+        if state == "gin_path":
+            conn.execute(CreateIndex(PATH_INDEX))
+        conn.execute(text("ANALYZE documents"))
+
+async def run(predicates: list, limit: int, repeat: int) -> dict:
+    samples = []
+    async with AsyncSessionLocal() as db:
+        found = len(await get_documents(db, limit=limit, fields=("id",), predicates=predicates))
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await get_documents(db, limit=limit, fields=("id",), predicates=predicates)
+            samples.append(time.perf_counter() - started)
+    return {"found": found, **percentiles(samples)}
+
+async def main(args) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM documents WHERE owner = :owner"), {"owner": OWNER})
+    seed(args.rows)
+    try:
+        for state in args.states:
+            set_indexes(state)
+            for name, query in QUERIES.items():
+                predicates = [parse_predicate(expr) for expr in query]
+                emit({
+                    "benchmark": "search",
+                    "op": f"{name}_{state}",
+                    "width": args.rows,
+                    "query": query,
+                    "label": args.label,
+                    **await run(predicates, args.limit, args.repeat),
+                }, args.output)
+    finally:
+        set_indexes("gin")
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text("DELETE FROM documents WHERE owner = :owner"), {"owner": OWNER})
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--states", nargs="+", default=["none", "gin", "gin_path"])
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="не удалять созданные документы")
+    parser.add_argument("--label", default="current")
+    parser.add_argument("--output")
+    asyncio.run(main(parser.parse_args()))
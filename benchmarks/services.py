@@ -0,0 +1,76 @@
+"""
+Микробенчмарки json_diff и json_patch на документах разного размера и глубины
+
+    python -m benchmarks.services --widths 10 100 1000 --depths 1 5 20 --output services.jsonl
+
+Для каждого сочетания ширины (ключей на уровень) и глубины документа
+замеряются deep_diff в обоих форматах, apply_patch с полученным патчем
+и функции доступа по пути к самому глубокому листу. На каждую операцию
+печатается строка JSON с перцентилями времени одного вызова и числом
+вызовов в секунду. Ключ сравнения для benchmarks.compare - op, width, depth.
+"""
+
+import argparse
+import time
+
+from app.services import json_diff, json_patch
+from benchmarks.stats import emit, make_document, mutate, percentiles
+
+def measure(func, number: int) -> dict:
+    """Замеряет number вызовов func по отдельности после одного прогрева"""
+    func()
+    samples = []
+    for _ in range(number):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    total = sum(samples)
+    return {
+        "calls": number,
+        "ops_per_sec": round(number / total, 1) if total else None,
+        **percentiles(samples),
+    }
+
+def cases(width: int, depth: int, changes: int, seed: int) -> dict:
+    old, keys = make_document(width, depth, seed)
+    new = mutate(old, changes, seed)
+    patch = json_diff.deep_diff(old, new, format="patch")
+    path = ".".join(keys)
+    missing = ".".join(keys[:-1] + ["created", "leaf"])
+    return {
+        "diff_paths": lambda: json_diff.deep_diff(old, new),
+        "diff_patch": lambda: json_diff.deep_diff(old, new, format="patch"),
+        "diff_equal": lambda: json_diff.deep_diff(old, old),
+        "apply_patch": lambda: json_patch.apply_patch(old, patch),
+        "get_path": lambda: json_patch.get_value_by_path(old, path),
+        "set_path": lambda: json_patch.set_value_by_path(old, path, 1),
+        "set_new_path": lambda: json_patch.set_value_by_path(old, missing, 1),
+        "delete_path": lambda: json_patch.delete_value_by_path(old, path),
+    }
+
+def main(args) -> None:
+    for width in args.widths:
+        for depth in args.depths:
+            for op, func in cases(width, depth, args.changes, args.seed).items():
+                if args.ops and op not in args.ops:
+                    continue
+                emit({
+                    "benchmark": "services",
+                    "op": op,
+                    "width": width,
+                    "depth": depth,
+                    "label": args.label,
+                    **measure(func, args.number),
+                }, args.output)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--widths", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--changes", type=int, default=10, help="изменений между документами для diff")
+    parser.add_argument("--ops", nargs="*", help="ограничить набор операций")
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default="current")
+    parser.add_argument("--output")
+    main(parser.parse_args())
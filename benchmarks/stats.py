@@ -0,0 +1,88 @@
+"""
+Общие части бенчмарков: генерация документов, перцентили и вывод результатов
+
+Результаты печатаются строками JSON и при заданном --output дописываются
+в файл в том же виде, чтобы прогоны до и после изменения можно было
+сравнить через benchmarks.compare
+"""
+
+import copy
+import json
+import random
+from typing import Any, Optional
+
+def make_document(width: int, depth: int, seed: int = 0) -> tuple[dict, list[str]]:
+    """
+    Документ из width ключей на каждом уровне и вложенностью depth
+
+    На каждом уровне есть скаляры, строка, короткий список и ветвь next
+    со следующим уровнем. Возвращает документ и путь (список ключей)
+    к самому глубокому листу.
+    """
+    rng = random.Random(seed)
+    doc: dict = {}
+    node = doc
+    path = []
+    for level in range(depth):
+        for i in range(width):
+            kind = i % 4
+            if kind == 0:
+                node[f"k{i}"] = rng.randrange(1_000_000)
+            elif kind == 1:
+                node[f"k{i}"] = f"value {level}.{i}"
+            elif kind == 2:
+                node[f"k{i}"] = [rng.randrange(100) for _ in range(5)]
+            else:
+                node[f"k{i}"] = {"id": i, "flag": bool(rng.randrange(2))}
+        if level < depth - 1:
+            node["next"] = {}
+            path.append("next")
+            node = node["next"]
+    node["leaf"] = "value"
+    path.append("leaf")
+    return doc, path
+
+def mutate(doc: dict, changes: int, seed: int = 0) -> dict:
+    """Копия документа с changes изменёнными, добавленными и удалёнными ключами"""
+    rng = random.Random(seed)
+    new = copy.deepcopy(doc)
+    levels = []
+    node = new
+    while isinstance(node, dict):
+        levels.append(node)
+        node = node.get("next")
+    for n in range(changes):
+        node = rng.choice(levels)
+        keys = [key for key in node if key != "next"]
+        action = n % 3
+        if action == 0 and keys:
+            node[rng.choice(keys)] = rng.randrange(1_000_000)
+        elif action == 1:
+            node[f"added{n}"] = {"n": n}
+        elif keys:
+            del node[rng.choice(keys)]
+    return new
+
+def percentiles(samples: list[float]) -> dict[str, Optional[float]]:
+    """p50, p95, p99 и среднее в миллисекундах по замерам в секундах"""
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    ordered = sorted(samples)
+
+    def at(q: float) -> float:
+        return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000, 4)
+
+    return {
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4),
+    }
+
+def emit(result: dict[str, Any], output: Optional[str] = None) -> None:
+    """Печатает результат строкой JSON и дописывает её в файл output"""
+    line = json.dumps(result, ensure_ascii=False)
+    print(line)
+    if output:
+        with open(output, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
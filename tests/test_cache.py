@@ -0,0 +1,129 @@
+"""
+Кэш документов поверх Redis в памяти (fakeredis)
+"""
+
+import asyncio
+import os
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("PERIODIC_URL", "http://127.0.0.1:1/")
+
+from fakeredis import aioredis
+
+from app.core.cache import CachedDocument, DocumentCache
+
+DOC_ID = 1
+
+def run(scenario, **options):
+    """Выполняет сценарий с кэшем над пустым Redis в своём цикле событий"""
+    async def main():
+        client = aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        try:
+            await scenario(DocumentCache(client, **options), client)
+        finally:
+            await client.aclose()
+    asyncio.run(main())
+
+class Loader:
+    """Загрузчик документа с подсчётом обращений к «БД»"""
+
+    def __init__(self, version: int = 1, body: str = '{"content": {}}', delay: float = 0):
+        self.version = version
+        self.body = body
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return CachedDocument("u", self.version, self.body)
+
+def test_hit_after_load():
+    async def scenario(cache, client):
+        loader = Loader()
+        assert (await cache.get_or_load(DOC_ID, loader)).version == 1
+        cached = await cache.get(DOC_ID)
+        assert cached.owner == "u" and cached.version == 1 and cached.body == '{"content": {}}'
+        await cache.get_or_load(DOC_ID, loader)
+        assert loader.calls == 1
+        assert cache.stats()["hits"] == 2
+
+    run(scenario)
+
+def test_invalidate_rejects_entry_stored_by_stale_read():
+    async def scenario(cache, client):
+        # Чтение началось до первого изменения документа, а сохранило запись после него
+        stale = await cache._lookup(DOC_ID)
+        await cache.invalidate(DOC_ID)
+        await cache._store(DOC_ID, CachedDocument("u", 1, "old"), stale)
+        assert await cache.get(DOC_ID) is None
+
+        # Поколение не истекает раньше записи, иначе она снова станет действительной
+        key, generation_key = cache._key(DOC_ID), cache._generation_key(DOC_ID)
+        assert await client.pttl(generation_key) >= await client.pttl(key) > 0
+        await client.persist(key)
+        await client.delete(generation_key)
+        await cache._store(DOC_ID, CachedDocument("u", 2, "new"), await cache._lookup(DOC_ID))
+        assert (await cache.get(DOC_ID)).version == 2
+
+        loader = Loader(version=3)
+        await cache.invalidate(DOC_ID)
+        assert (await cache.get_or_load(DOC_ID, loader)).version == 3
+        assert loader.calls == 1
+
+    run(scenario)
+
+def test_epoch_invalidates_all_documents():
+    async def scenario(cache, client):
+        loader = Loader()
+        for doc_id in (1, 2):
+            await cache.get_or_load(doc_id, loader)
+        await cache.invalidate_all()
+        assert await cache.get(1) is None and await cache.get(2) is None
+        await cache.get_or_load(1, loader)
+        assert loader.calls == 3
+        assert (await cache.get(1)).version == 1
+
+    run(scenario)
+
+def test_stampede_lock_loads_once():
+    async def scenario(cache, client):
+        loader = Loader(delay=0.1)
+        results = await asyncio.gather(*(cache.get_or_load(DOC_ID, loader) for _ in range(10)))
+        assert loader.calls == 1
+        assert all(doc.version == 1 for doc in results)
+        assert await client.get(cache._lock_key(DOC_ID)) is None
+
+    run(scenario, lock_wait_ms=1000)
+
+def test_lock_wait_is_bounded():
+    async def scenario(cache, client):
+        # Блокировку держит другой процесс, который не сохранит запись
+        await client.set(cache._lock_key(DOC_ID), "1", px=10_000)
+        loader = Loader()
+        assert (await cache.get_or_load(DOC_ID, loader)).version == 1
+        assert loader.calls == 1
+
+    run(scenario, lock_wait_ms=50)
+
+def test_oversized_document_leaves_marker():
+    async def scenario(cache, client):
+        loader = Loader(body="x" * 100)
+        assert (await cache.get_or_load(DOC_ID, loader)).body == "x" * 100
+        assert await cache.get(DOC_ID) is None
+        assert cache.stats()["oversized"] == 1
+        assert 0 < await client.ttl(cache._key(DOC_ID)) <= DocumentCache.UNCACHEABLE_TTL_SECONDS
+
+        # По отметке БД читается сразу, без блокировки и ожидания
+        lookup = await cache._lookup(DOC_ID)
+        assert lookup.uncacheable and lookup.doc is None
+        await client.set(cache._lock_key(DOC_ID), "1", px=10_000)
+        await asyncio.wait_for(cache.get_or_load(DOC_ID, loader), timeout=cache.LOCK_POLL_SECONDS)
+        assert loader.calls == 2
+
+    run(scenario, max_payload_bytes=10, lock_wait_ms=5000)
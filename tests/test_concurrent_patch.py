@@ -0,0 +1,102 @@
+"""
+Конкурентные изменения одного документа по пути через API
+
+Нужна БД с применёнными миграциями в DATABASE_URL. Сервис вызывается
+в процессе через ASGI-транспорт, запросы клиентов выполняются параллельно
+"""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+
+if not os.environ.get("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("PERIODIC_URL", "http://127.0.0.1:1/")
+
+import httpx
+
+from app.core.database import async_engine
+from app.core.security import create_access_token
+from app.main import app
+
+URL = "/api/v1/documents"
+CLIENTS = 20
+ROUNDS = 5
+
+def run(scenario):
+    """Выполняет сценарий с клиентом API в своём цикле событий"""
+    async def main():
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': f'patch-{uuid.uuid4().hex}'})}"}
+        limits = httpx.Limits(max_connections=CLIENTS)
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", limits=limits) as client:
+                response = await client.post(f"{URL}/", json={"title": "concurrency", "content": {}}, headers=headers)
+                response.raise_for_status()
+                url = f"{URL}/{response.json()['id']}"
+                try:
+                    await scenario(client, url, headers)
+                finally:
+                    await client.delete(url, headers=headers)
+        finally:
+            await async_engine.dispose()
+    asyncio.run(main())
+
+def test_if_match_counter_has_no_lost_updates():
+    async def scenario(client, url, headers):
+        applied = []
+        conflicts = 0
+
+        async def worker():
+            nonlocal conflicts
+            for _ in range(ROUNDS):
+                current = (await client.get(url, headers=headers)).json()
+                response = await client.patch(
+                    f"{url}/path",
+                    json={"path": "shared", "value": current["content"].get("shared", 0) + 1},
+                    headers={**headers, "If-Match": f'"{current["version"]}"'},
+                )
+                if response.status_code == 412:
+                    conflicts += 1
+                    assert response.headers["ETag"] != f'"{current["version"]}"'
+                    continue
+                assert response.status_code == 200, response.text
+                applied.append(response.json()["version"])
+
+        await asyncio.gather(*(worker() for _ in range(CLIENTS)))
+        final = (await client.get(url, headers=headers)).json()
+
+        assert len(applied) + conflicts == CLIENTS * ROUNDS
+        # Каждая успешная запись получила свою версию и осталась в content
+        assert sorted(applied) == list(range(2, len(applied) + 2))
+        assert final["version"] == len(applied) + 1
+        assert final["content"]["shared"] == len(applied)
+
+        stale = await client.patch(
+            f"{url}/path", json={"path": "shared", "value": 0}, headers={**headers, "If-Match": '"1"'}
+        )
+        assert stale.status_code == 412
+        assert stale.headers["ETag"] == f'"{final["version"]}"'
+        assert (await client.get(url, headers=headers)).json()["content"]["shared"] == len(applied)
+
+    run(scenario)
+
+def test_distinct_paths_are_all_kept():
+    async def scenario(client, url, headers):
+        async def worker(n: int):
+            for i in range(ROUNDS):
+                response = await client.patch(
+                    f"{url}/path", json={"path": f"counters.c{n}", "value": i}, headers=headers
+                )
+                assert response.status_code == 200, response.text
+
+        await asyncio.gather(*(worker(n) for n in range(CLIENTS)))
+        final = (await client.get(url, headers=headers)).json()
+
+        assert final["version"] == CLIENTS * ROUNDS + 1
+        assert final["content"]["counters"] == {f"c{n}": ROUNDS - 1 for n in range(CLIENTS)}
+
+    run(scenario)
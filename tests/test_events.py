@@ -0,0 +1,38 @@
+import os
+import random
+
+import orjson
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("PERIODIC_URL", "http://127.0.0.1:1/")
+
+from app.core.events import MAX_PAYLOAD_BYTES, encode_event, json_size_exceeds
+
+def random_value(rng: random.Random, depth: int):
+    roll = rng.random()
+    if depth <= 0 or roll < 0.4:
+        return rng.choice([0, -1, 12345, 1.5, True, False, None, "", "ключ", 'a"b\n', "x" * rng.randint(0, 50)])
+    if roll < 0.7:
+        return [random_value(rng, depth - 1) for _ in range(rng.randint(0, 6))]
+    return {f"k{rng.randint(0, 99)}": random_value(rng, depth - 1) for _ in range(rng.randint(0, 6))}
+
+@pytest.mark.parametrize("seed", range(5))
+def test_size_estimate_is_lower_bound(seed):
+    rng = random.Random(seed)
+    for _ in range(2000):
+        value = random_value(rng, 5)
+        size = len(orjson.dumps(value))
+        for limit in (0, 1, size // 2, size - 1, size, size + 1):
+            if json_size_exceeds(value, limit):
+                assert size > limit
+
+def test_large_created_patch_is_omitted():
+    content = {"items": [{"id": i, "name": f"item {i}"} for i in range(100_000)]}
+    assert json_size_exceeds(content, MAX_PAYLOAD_BYTES)
+    event = orjson.loads(encode_event("created", 1, "u", 1, "t", [{"op": "add", "path": "", "value": content}]))
+    assert event["patch_omitted"] and "patch" not in event
+
+    small = [{"op": "add", "path": "", "value": {"a": 1}}]
+    assert orjson.loads(encode_event("created", 1, "u", 1, "t", small))["patch"] == small
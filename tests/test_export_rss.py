@@ -0,0 +1,67 @@
+"""
+Потоковый экспорт большой таблицы с ограничением памяти процесса
+
+Нужна БД с применёнными миграциями в DATABASE_URL. Тест добавляет
+EXPORT_TEST_ROWS документов (по умолчанию 1 000 000) своего владельца,
+экспортирует их тем же генератором, что и GET /api/v1/documents/export,
+и удаляет. Память процесса измеряется так же, как в health_check, через psutil
+"""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+
+if not os.environ.get("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("PERIODIC_URL", "http://127.0.0.1:1/")
+
+import orjson
+import psutil
+from sqlalchemy import text
+
+from app.api.v1.endpoints.documents import export_lines
+from app.core.database import AsyncSessionLocal, async_engine
+from app.services import ndjson
+
+ROWS = int(os.environ.get("EXPORT_TEST_ROWS", 1_000_000))
+MAX_RSS_GROWTH_MB = 64
+
+def rss_mb() -> float:
+    return psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024
+
+def test_export_keeps_rss_flat():
+    owner = f"export-{uuid.uuid4().hex}"
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(text(
+                "INSERT INTO documents (title, content, owner) "
+                "SELECT 'doc ' || i, jsonb_build_object('n', i, 'text', repeat('x', 100)), :owner "
+                "FROM generate_series(1, :rows) AS i"
+            ), {"owner": owner, "rows": ROWS})
+            await db.commit()
+        try:
+            baseline = peak = rss_mb()
+            rows = chunks = 0
+            last = None
+            async for chunk in ndjson.write_lines(export_lines(owner, 1000)):
+                chunks += 1
+                rows += chunk.count(b"\n")
+                last = chunk
+                if chunks % 16 == 0:
+                    peak = max(peak, rss_mb())
+            peak = max(peak, rss_mb())
+
+            assert rows == ROWS
+            assert orjson.loads(last.splitlines()[-1])["content"]["n"] == ROWS
+            assert peak - baseline < MAX_RSS_GROWTH_MB
+        finally:
+            async with AsyncSessionLocal() as db:
+                await db.execute(text("DELETE FROM documents WHERE owner = :owner"), {"owner": owner})
+                await db.commit()
+            await async_engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+import copy
+import json
+import random
+
+import pytest
+
+from app.services.json_diff import deep_diff
+from app.services.json_patch import apply_patch
+
+# Значения, которые равны в Python или имеют одинаковый hash: hash(-1) == hash(-2)
+SCALARS = [-2, -1, 0, 1, 2, True, False, 1.0, 0.0, None, "", "x", "y"]
+KEYS = ["a", "b", "c", "d"]
+
+def strict(value) -> str:
+    """Представление, в котором true, 1 и 1.0 различаются"""
+    return json.dumps(value, sort_keys=True)
+
+def random_value(rng: random.Random, depth: int):
+    roll = rng.random()
+    if depth <= 0 or roll < 0.5:
+        return rng.choice(SCALARS)
+    if roll < 0.75:
+        return [random_value(rng, depth - 1) for _ in range(rng.randint(0, 4))]
+    return {key: random_value(rng, depth - 1) for key in rng.sample(KEYS, rng.randint(0, len(KEYS)))}
+
+def mutate(rng: random.Random, value, depth: int):
+    """Копия value с несколькими точечными изменениями"""
+    if isinstance(value, dict):
+        value = dict(value)
+        for key in list(value):
+            if rng.random() < 0.3:
+                value[key] = mutate(rng, value[key], depth - 1)
+            elif rng.random() < 0.1:
+                del value[key]
+        if rng.random() < 0.2:
+            value[rng.choice(KEYS)] = random_value(rng, depth - 1)
+        return value
+    if isinstance(value, list):
+        value = [mutate(rng, item, depth - 1) if rng.random() < 0.3 else item for item in value]
+        if value and rng.random() < 0.2:
+            del value[rng.randrange(len(value))]
+        if rng.random() < 0.2:
+            value.insert(rng.randint(0, len(value)), random_value(rng, depth - 1))
+        return value
+    return rng.choice(SCALARS) if rng.random() < 0.7 else random_value(rng, depth)
+
+@pytest.mark.parametrize("old, new", [
+    ({"a": [-1]}, {"a": [-2]}),
+    ({"a": [{"x": -1}]}, {"a": [{"x": -2}]}),
+    ({"b": 1}, {"b": True}),
+    ({"b": 1}, {"b": 1.0}),
+    ({"b": [0]}, {"b": [False]}),
+    ({"b": {"c": [1, True]}}, {"b": {"c": [True, 1]}}),
+])
+def test_collisions_and_types_are_changes(old, new):
+    patch = deep_diff(old, new, format="patch")
+    assert patch
+    assert strict(apply_patch(old, patch)) == strict(new)
+    assert deep_diff(old, new) != {"added": {}, "removed": {}, "changed": {}}
+
+def test_equal_documents_have_empty_diff():
+    old = {"a": [1, {"b": [True, None, 1.0]}], "c": "x"}
+    assert deep_diff(old, copy.deepcopy(old), format="patch") == []
+    assert deep_diff(old, copy.deepcopy(old)) == {"added": {}, "removed": {}, "changed": {}}
+
+def test_patch_round_trip_fuzz():
+    rng = random.Random(20240)
+    for case in range(20000):
+        old = {key: random_value(rng, 4) for key in rng.sample(KEYS, rng.randint(0, len(KEYS)))}
+        new = mutate(rng, old, 4) if rng.random() < 0.8 else {"a": random_value(rng, 4)}
+        before = strict(old)
+        patch = deep_diff(old, new, format="patch")
+        assert strict(apply_patch(old, patch)) == strict(new), (case, old, new, patch)
+        assert strict(old) == before
@@ -0,0 +1,75 @@
+import pytest
+
+from app.services.json_patch import (
+    PatchError, PathError, apply_patch, delete_value_by_path, get_value_by_path, set_value_by_path,
+)
+
+MISSING = object()
+DOC = {"items": [10, 20, {"x": None}], "n": None, "a.b": {"c": 0}}
+
+# Ожидаемые значения проверены оператором #> в PostgreSQL 16
+@pytest.mark.parametrize("path, expected", [
+    ("items.0", 10),
+    ("items.01", 20),
+    ("items.+1", 20),
+    ("items. 1", 20),
+    ("items.-0", 10),
+    ("items.-1", {"x": None}),
+    ("items.-3", 10),
+    ("items.-1.x", None),
+    ("n", None),
+    ("a\\.b.c", 0),
+    ("items.-4", MISSING),
+    ("items.3", MISSING),
+    ("items.1 ", MISSING),
+    ("items.²", MISSING),
+    ("items.1_0", MISSING),
+    ("items.1e0", MISSING),
+    ("items.", MISSING),
+    ("items.2147483648", MISSING),
+    ("n.x", MISSING),
+    ("missing", MISSING),
+])
+def test_get_matches_postgres_path_operator(path, expected):
+    value = get_value_by_path(DOC, path, MISSING)
+    if expected is MISSING:
+        assert value is MISSING
+    else:
+        assert value == expected
+
+def test_missing_path_defaults_to_none():
+    assert get_value_by_path(DOC, "missing") is None
+
+# jsonb_set_deep и #- в PostgreSQL 16 дают те же результаты
+@pytest.mark.parametrize("path, after_set, after_delete", [
+    ("items.-1", [10, 20, 9], [10, 20]),
+    ("items.-5", [9, 10, 20, {"x": None}], [10, 20, {"x": None}]),
+    ("items.7", [10, 20, {"x": None}, 9], [10, 20, {"x": None}]),
+    ("items. +1", [10, 9, {"x": None}], [10, {"x": None}]),
+])
+def test_set_and_delete_follow_postgres_indexes(path, after_set, after_delete):
+    assert set_value_by_path(DOC, path, 9)["items"] == after_set
+    assert delete_value_by_path(DOC, path)["items"] == after_delete
+    assert DOC["items"] == [10, 20, {"x": None}]
+
+@pytest.mark.parametrize("func", [lambda: set_value_by_path(DOC, "items.x", 1), lambda: delete_value_by_path(DOC, "items.²")])
+def test_non_integer_list_key_is_rejected(func):
+    with pytest.raises(PathError):
+        func()
+
+@pytest.mark.parametrize("operation", [
+    {"op": "replace", "path": "/items/-1", "value": 0},
+    {"op": "add", "path": "/items/-1", "value": 0},
+    {"op": "remove", "path": "/items/²"},
+    {"op": "test", "path": "/items/١", "value": 10},
+    {"op": "copy", "from": "/items/+1", "path": "/n"},
+])
+def test_pointer_accepts_only_ascii_non_negative_indexes(operation):
+    with pytest.raises(PatchError, match="Invalid list index"):
+        apply_patch(DOC, [operation])
+
+@pytest.mark.parametrize("actual, expected", [(1, True), (True, 1), (1.0, 1), (0, False), ([1], [1.0]), ({"a": 1}, {"a": True})])
+def test_test_op_compares_types(actual, expected):
+    with pytest.raises(PatchError, match="Test failed"):
+        apply_patch({"v": actual}, [{"op": "test", "path": "/v", "value": expected}])
+    assert apply_patch({"v": actual}, [{"op": "test", "path": "/v", "value": actual}]) == {"v": actual}
@@ -0,0 +1,145 @@
+"""
+Периодическая задача против локального HTTP-сервера
+
+Нужна БД с применёнными миграциями в DATABASE_URL. Слияние ограничено
+документами, которые создаёт тест, остальные документы БД не меняются
+"""
+
+import asyncio
+import json
+import os
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+if not os.environ.get("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("PERIODIC_URL", "http://127.0.0.1:1/")
+
+from sqlalchemy import select
+
+from app import crud
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, async_engine
+from app.models.document import Document
+from app.schemas.document import DocumentCreate
+from app.services import periodic_task
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Отдаёт server.payload с ETag server.etag, на совпавший If-None-Match - 304"""
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(self.server.payload).encode()
+        self.send_response(200)
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(settings, "PERIODIC_URL", f"http://127.0.0.1:{server.server_port}/data")
+    monkeypatch.setattr(periodic_task, "local_state", {})
+    monkeypatch.setattr(periodic_task, "periodic_stats", dict.fromkeys(periodic_task.periodic_stats, 0))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def run(scenario):
+    """Выполняет сценарий в своём цикле событий и закрывает соединения этого цикла"""
+    async def main():
+        if periodic_task.redis_client is not None:
+            await periodic_task.redis_client.delete(periodic_task.STATE_KEY)
+        try:
+            await scenario()
+        finally:
+            if periodic_task.http_client is not None:
+                await periodic_task.http_client.aclose()
+                periodic_task.http_client = None
+            await async_engine.dispose()
+    asyncio.run(main())
+
+async def create(owner: str) -> int:
+    async with AsyncSessionLocal() as db:
+        doc = await crud.create_document(db, DocumentCreate(title="periodic", content={"own": 1}), owner=owner)
+        return doc.id
+
+async def content(doc_id: int) -> dict:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(Document.content).where(Document.id == doc_id))
+
+def test_outcomes(server, monkeypatch):
+    stats = periodic_task.periodic_stats
+    owner = f"periodic-{uuid.uuid4().hex}"
+    tag = uuid.uuid4().hex
+    merge = periodic_task.merge_into_all_documents
+
+    async def scenario():
+        ids = [await create(owner)]
+
+        async def merge_own(db, payload, batch_size, start_after=0):
+            # Документы, созданные до теста, имеют меньшие id и не затрагиваются
+            return await merge(db, payload, batch_size, start_after=max(start_after, ids[0] - 1))
+
+        monkeypatch.setattr(periodic_task, "merge_into_all_documents", merge_own)
+        try:
+            server.etag, server.payload = f'"{tag}-1"', {"periodic_test": 1}
+            await periodic_task.fetch_and_merge()
+            assert stats["applied"] == 1
+            assert await content(ids[0]) == {"own": 1, "periodic_test": 1}
+
+            # Тот же ETag: сервер отвечает 304, слияние не выполняется
+            await periodic_task.fetch_and_merge()
+            assert stats["skipped_not_modified"] == 1
+            assert server.requests[-1] == f'"{tag}-1"'
+
+            # Новый ETag с теми же данными: догоняется только новый документ
+            ids.append(await create(owner))
+            server.etag = f'"{tag}-2"'
+            await periodic_task.fetch_and_merge()
+            assert stats["skipped_unchanged"] == 1
+            assert stats["documents_updated"] == 2
+            assert await content(ids[1]) == {"own": 1, "periodic_test": 1}
+
+            server.etag, server.payload = f'"{tag}-3"', {"periodic_test": 2}
+            await periodic_task.fetch_and_merge()
+            assert stats["applied"] == 2
+            for doc_id in ids:
+                assert await content(doc_id) == {"own": 1, "periodic_test": 2}
+            assert stats["documents_updated"] == 4
+            assert stats["failed"] == 0
+        finally:
+            async with AsyncSessionLocal() as db:
+                for doc_id in ids:
+                    await crud.delete_document(db, doc_id)
+
+    run(scenario)
+
+def test_not_leader_skips(server):
+    stats = periodic_task.periodic_stats
+    server.etag, server.payload = '"leader"', {"periodic_test": 1}
+
+    async def scenario():
+        async with periodic_task.leader_lock() as leader:
+            assert leader
+            await periodic_task.fetch_and_merge()
+        assert stats["skipped_not_leader"] == 1
+        assert server.requests == []
+
+    run(scenario)